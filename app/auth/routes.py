@@ -3,6 +3,8 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
 from app.extensions import db
 from app.models import User, PreCadastro
+from app.documentos.matcher import invalidar_indice_nomes
+from app.ponto.ferias import garantir_periodos
 import re
 import random
 import string
@@ -123,7 +125,11 @@ def auto_cadastro():
             
             db.session.add(novo_user)
             db.session.delete(pre) 
+            db.session.flush()
+            # Ledger de férias desde a admissão (depois o fechamento noturno mantém)
+            garantir_periodos([novo_user])
             db.session.commit()
+            invalidar_indice_nomes(novo_user.empresa_id)
             
             return render_template('auth/auto_cadastro_sucesso.html', username=cpf, nome=pre.nome_previsto)
         else:
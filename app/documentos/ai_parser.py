@@ -25,9 +25,8 @@ def extrair_dados_holerite(pdf_bytes, lista_nomes_banco=None):
     """
     Abordagem de MATCH EXATO E COMPLETO.
     Sem margem para "adivinhação" ou envios errados.
+    `lista_nomes_banco` pode ser a lista de nomes normalizados ou um IndiceNomes já montado.
     """
-    dados_retorno = {"nome": "", "mes_referencia": "2026-02", "origem": "falha"}
-    
     texto_raw = ""
     try:
         reader = PdfReader(io.BytesIO(pdf_bytes))
@@ -35,7 +34,17 @@ def extrair_dados_holerite(pdf_bytes, lista_nomes_banco=None):
             texto_raw = reader.pages[0].extract_text()
     except Exception as e:
         print(f"ERRO DE LEITURA PDF: {e}")
-        return dados_retorno
+        return {"nome": "", "mes_referencia": "2026-02", "origem": "falha"}
+
+    indice = lista_nomes_banco
+    if lista_nomes_banco and isinstance(lista_nomes_banco, (list, tuple, set)):
+        from app.documentos.matcher import IndiceNomes
+        indice = IndiceNomes({nome: None for nome in lista_nomes_banco})
+    return extrair_dados_do_texto(texto_raw, indice)
+
+def extrair_dados_do_texto(texto_raw, indice=None):
+    """Mês de referência e nome do colaborador a partir do texto já extraído da página."""
+    dados_retorno = {"nome": "", "mes_referencia": "2026-02", "origem": "falha", "texto_limpo": ""}
 
     if not texto_raw:
         return dados_retorno
@@ -50,24 +59,15 @@ def extrair_dados_holerite(pdf_bytes, lista_nomes_banco=None):
             dados_retorno["mes_referencia"] = f"{ano}-{mes}"
 
     # 2. Busca de Nome (RIGOROSA E EXATA)
-    if lista_nomes_banco:
-        # Limpa o texto inteiro da página do PDF
-        texto_pdf_limpo = limpar_texto_pdf_para_busca(texto_raw)
-        
-        # ORDENA OS NOMES POR TAMANHO (Do maior para o menor)
-        # Motivo: Se tivermos "João Marcos Silva" e "João Marcos", 
-        # o sistema testa o nome mais longo primeiro. Isso impede 
-        # que nomes curtos roubem o holerite de nomes compostos.
-        nomes_ordenados = sorted(lista_nomes_banco, key=len, reverse=True)
-        
-        for nome_banco in nomes_ordenados:
-            # Adiciona espaços ao redor (f" {nome} ") para garantir a busca da palavra exata.
-            # Impede que o sistema ache "ANA" no meio da palavra "JULIANA".
-            if f" {nome_banco} " in f" {texto_pdf_limpo} ":
-                print(f"MATCH EXATO COMPLETO: '{nome_banco}' encontrado no PDF.")
-                dados_retorno["nome"] = nome_banco
-                dados_retorno["origem"] = "python_exato"
-                break  # Para a busca no primeiro match perfeito
+    # Uma varredura do texto no autômato de nomes da empresa. Vale o nome mais longo encontrado:
+    # se tivermos "João Marcos Silva" e "João Marcos", o nome curto não rouba o holerite do composto.
+    # A busca é por palavra inteira: impede que o sistema ache "ANA" no meio da palavra "JULIANA".
+    dados_retorno["texto_limpo"] = limpar_texto_pdf_para_busca(texto_raw)
+    if indice:
+        nome = indice.buscar(dados_retorno["texto_limpo"])
+        if nome:
+            print(f"MATCH EXATO COMPLETO: '{nome}' encontrado no PDF.")
+            dados_retorno["nome"] = nome
+            dados_retorno["origem"] = "python_exato"
 
     return dados_retorno
-
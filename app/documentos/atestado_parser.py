@@ -1,7 +1,24 @@
-from google.cloud import vision
+import io
+import os
 import re
+import threading
 import unicodedata
 import traceback
+from pypdf import PdfReader
+
+# SDK do Vision opcional: sem ele (dev, testes) usa-se o OCR local
+try:
+    from google.cloud import vision
+except ImportError:
+    vision = None
+
+# ==============================================================================
+# 🩺 LEITURA DE ATESTADOS (OCR PLUGÁVEL + REGRAS DE NEGÓCIO)
+# O OCR é um backend escolhido por ATESTADO_OCR: 'vision' (Google Cloud Vision,
+# produção) ou 'local' (texto embutido do PDF, sem serviço externo, para dev e
+# testes). Falhas do serviço levantam ErroOCR para quem chama tentar de novo;
+# a interpretação do texto (nome, dias, data) é a mesma para os dois.
+# ==============================================================================
 
 def limpar_texto(texto):
     """Padroniza o texto para análise de dados."""
@@ -19,84 +36,106 @@ def converter_numero_extenso(texto):
     }
     return mapa.get(texto.upper(), None)
 
-def analisar_atestado_vision(imagem_bytes, nome_funcionario):
+class ErroOCR(Exception):
+    """Falha do serviço de OCR (rede, cota, erro da API): vale tentar de novo."""
+
+class OCRVision:
+    """Google Cloud Vision. Um cliente por processo, compartilhado pelas threads."""
+    def __init__(self):
+        if vision is None:
+            raise RuntimeError("Biblioteca 'google-cloud-vision' não instalada. Use ATESTADO_OCR=local.")
+        self._client = vision.ImageAnnotatorClient()
+
+    def extrair_texto(self, arquivo_bytes):
+        try:
+            # Identifica se é PDF (assinatura de arquivo %PDF)
+            if arquivo_bytes.startswith(b'%PDF'):
+                input_config = vision.InputConfig(content=arquivo_bytes, mime_type='application/pdf')
+                feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+                # Solicitamos a análise da primeira página do PDF
+                request = vision.AnnotateFileRequest(input_config=input_config, features=[feature], pages=[1])
+                response = self._client.batch_annotate_files(requests=[request])
+                # O PDF retorna uma estrutura de resposta diferente da imagem
+                paginas = response.responses[0].responses
+                return paginas[0].full_text_annotation.text if paginas else ""
+            response = self._client.text_detection(image=vision.Image(content=arquivo_bytes))
+        except Exception as e:
+            raise ErroOCR(str(e)) from e
+        if response.error.message:
+            raise ErroOCR(f"ERRO NA API GOOGLE: {response.error.message}")
+        return response.text_annotations[0].description if response.text_annotations else ""
+
+class OCRLocal:
+    """Sem serviço externo: o texto embutido na primeira página do PDF. Imagens ficam sem texto."""
+    def extrair_texto(self, arquivo_bytes):
+        if not arquivo_bytes.startswith(b'%PDF'): return ""
+        try:
+            leitor = PdfReader(io.BytesIO(arquivo_bytes))
+            return (leitor.pages[0].extract_text() or "") if leitor.pages else ""
+        except Exception as e:
+            print(f"ERRO DE LEITURA PDF (atestado): {e}")
+            return ""
+
+_ocr = None
+_ocr_lock = threading.Lock()
+
+def obter_ocr():
+    global _ocr
+    if _ocr is None:
+        with _ocr_lock:
+            if _ocr is None:
+                _ocr = OCRLocal() if os.environ.get('ATESTADO_OCR', 'vision') == 'local' else OCRVision()
+    return _ocr
+
+def interpretar_atestado(texto_completo, nome_funcionario):
+    """Regras de negócio sobre o texto do OCR: nome do colaborador, dias de afastamento e data."""
     dados = {
         "nome_encontrado": False,
         "data_inicio": None,
         "dias_afastamento": None,
-        "texto_bruto": "NENHUM TEXTO DETECTADO."
+        "texto_bruto": "NENHUM TEXTO ENCONTRADO NO ARQUIVO."
     }
-    
-    try:
-        client = vision.ImageAnnotatorClient()
-        
-        # Identifica se é PDF (assinatura de arquivo %PDF)
-        is_pdf = imagem_bytes.startswith(b'%PDF')
-        
-        if is_pdf:
-            # Lógica para Processar PDF
-            input_config = vision.InputConfig(content=imagem_bytes, mime_type='application/pdf')
-            feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
-            # Solicitamos a análise da primeira página do PDF
-            request = vision.AnnotateFileRequest(input_config=input_config, features=[feature], pages=[1])
-            
-            response = client.batch_annotate_files(requests=[request])
-            # O PDF retorna uma estrutura de resposta diferente da imagem
-            if response.responses[0].responses:
-                texto_completo = response.responses[0].responses[0].full_text_annotation.text
-            else:
-                dados["texto_bruto"] = "PDF LIDO, MAS NENHUM TEXTO ENCONTRADO DENTRO DELE."
-                return dados
-        else:
-            # Lógica para Processar Imagem (JPG, PNG)
-            image = vision.Image(content=imagem_bytes)
-            response = client.text_detection(image=image)
-            
-            if response.error.message:
-                dados["texto_bruto"] = f"ERRO NA API GOOGLE: {response.error.message}"
-                return dados
-                
-            if not response.text_annotations:
-                dados["texto_bruto"] = "NENHUM TEXTO ENCONTRADO NA IMAGEM."
-                return dados
-            
-            texto_completo = response.text_annotations[0].description
-
-        # Processamento Comum (Independente do formato)
-        dados["texto_bruto"] = texto_completo
-        texto_limpo = limpar_texto(texto_completo)
-        nome_limpo = limpar_texto(nome_funcionario)
-
-        # 1. Validação de Nome
-        partes_nome = nome_limpo.split()
-        if len(partes_nome) >= 2:
-            if partes_nome[0] in texto_limpo and partes_nome[-1] in texto_limpo:
-                dados["nome_encontrado"] = True
-
-        # 2. Extração de Dias (Regras de Negócio)
-        # Tenta: "X dias", "X (extenso) dias", "AFASTAMENTO DE X", "REPOUSO DE X"
-        match_num = re.search(r'(\d{1,2})\s*(?:\([A-Z\s]+\))?\s*(?:DIAS|DIA)', texto_limpo)
-        if match_num:
-            dados["dias_afastamento"] = int(match_num.group(1))
+    if not texto_completo: return dados
+
+    # Processamento Comum (Independente do formato)
+    dados["texto_bruto"] = texto_completo
+    texto_limpo = limpar_texto(texto_completo)
+    nome_limpo = limpar_texto(nome_funcionario)
+
+    # 1. Validação de Nome
+    partes_nome = nome_limpo.split()
+    if len(partes_nome) >= 2:
+        if partes_nome[0] in texto_limpo and partes_nome[-1] in texto_limpo:
+            dados["nome_encontrado"] = True
+
+    # 2. Extração de Dias (Regras de Negócio)
+    # Tenta: "X dias", "X (extenso) dias", "AFASTAMENTO DE X", "REPOUSO DE X"
+    match_num = re.search(r'(\d{1,2})\s*(?:\([A-Z\s]+\))?\s*(?:DIAS|DIA)', texto_limpo)
+    if match_num:
+        dados["dias_afastamento"] = int(match_num.group(1))
+    else:
+        match_contexto = re.search(r'(?:AFASTAMENTO|REPOUSO|CONCEDO|NECESSITA DE)\D*?(\d{1,2})', texto_limpo)
+        if match_contexto:
+            dados["dias_afastamento"] = int(match_contexto.group(1))
         else:
-            match_contexto = re.search(r'(?:AFASTAMENTO|REPOUSO|CONCEDO|NECESSITA DE)\D*?(\d{1,2})', texto_limpo)
-            if match_contexto:
-                dados["dias_afastamento"] = int(match_contexto.group(1))
-            else:
-                palavras_numero = r'(UM|DOIS|TRES|QUATRO|CINCO|SEIS|SETE|OITO|NOVE|DEZ|ONZE|DOZE|TREZE|QUATORZE|CATORZE|QUINZE)'
-                match_extenso = re.search(f'{palavras_numero}\\s*(?:DIAS|DIA)', texto_limpo)
-                if match_extenso:
-                    dados["dias_afastamento"] = converter_numero_extenso(match_extenso.group(1))
-
-        # 3. Extração de Data
-        match_data = re.search(r'(\d{2})[/\-](\d{2})[/\-](\d{4})', texto_limpo)
-        if match_data:
-            dia, mes, ano = match_data.group(1), match_data.group(2), match_data.group(3)
-            dados["data_inicio"] = f"{ano}-{mes}-{dia}"
+            palavras_numero = r'(UM|DOIS|TRES|QUATRO|CINCO|SEIS|SETE|OITO|NOVE|DEZ|ONZE|DOZE|TREZE|QUATORZE|CATORZE|QUINZE)'
+            match_extenso = re.search(f'{palavras_numero}\\s*(?:DIAS|DIA)', texto_limpo)
+            if match_extenso:
+                dados["dias_afastamento"] = converter_numero_extenso(match_extenso.group(1))
 
-        return dados
+    # 3. Extração de Data
+    match_data = re.search(r'(\d{2})[/\-](\d{2})[/\-](\d{4})', texto_limpo)
+    if match_data:
+        dia, mes, ano = match_data.group(1), match_data.group(2), match_data.group(3)
+        dados["data_inicio"] = f"{ano}-{mes}-{dia}"
 
+    return dados
+
+def analisar_atestado_vision(imagem_bytes, nome_funcionario):
+    """OCR + interpretação numa chamada só, sem novas tentativas: uma falha vira o texto do erro."""
+    try:
+        return interpretar_atestado(obter_ocr().extrair_texto(imagem_bytes), nome_funcionario)
     except Exception as e:
+        dados = interpretar_atestado("", nome_funcionario)
         dados["texto_bruto"] = f"ERRO NO PROCESSAMENTO: {str(e)}\n{traceback.format_exc()}"
         return dados
-
@@ -0,0 +1,106 @@
+import os
+from collections import namedtuple
+from itertools import chain
+from flask import request, Response, current_app, redirect, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import dump_options_header
+from app.extensions import db
+from app.utils import calcular_hash_arquivo
+from app.documentos.storage import baixar_bytes_storage, ler_em_blocos, assina_urls, gerar_url_assinada
+
+# ==============================================================================
+# 📥 ENTREGA DE DOCUMENTOS (STREAMING, RANGE E ETAG)
+# O download sai do storage em pedaços direto para a resposta. O ETag forte é o
+# SHA-256 gravado no registro: um If-None-Match que bate responde 304 sem tocar
+# no storage, e o visualizador de PDF do navegador pode pedir só um intervalo
+# (Range) do arquivo. Registros antigos, sem hash, ganham hash e tamanho no
+# primeiro download.
+# Com DOCUMENTOS_DOWNLOAD_DIRETO=1 a rota só autoriza, registra a assinatura e
+# redireciona para um link temporário: URL assinada do bucket (GCS) ou, no
+# driver local, um token HMAC da rota /documentos/arquivo/<token>, que responde
+# sem consultar o documento. Os bytes deixam de ocupar as threads do gunicorn.
+# ==============================================================================
+
+DOWNLOAD_DIRETO = os.environ.get('DOCUMENTOS_DOWNLOAD_DIRETO', '0') == '1'
+VALIDADE_LINK_SEGUNDOS = int(os.environ.get('DOCUMENTOS_LINK_SEGUNDOS', 120))
+
+# O que o token do driver local carrega: o suficiente para responder sem consultar o banco
+ArquivoAssinado = namedtuple('ArquivoAssinado', 'url_arquivo hash_arquivo tamanho_arquivo')
+
+def garantir_metadados(doc):
+    """Preenche hash_arquivo/tamanho_arquivo de registros antigos. Retorna False se o arquivo não existe."""
+    if doc.hash_arquivo and doc.tamanho_arquivo is not None: return True
+    # Baixa uma vez (o objeto fica no cache do storage e a resposta logo em seguida sai de lá)
+    dados = baixar_bytes_storage(doc.url_arquivo)
+    if dados is None: return False
+    doc.hash_arquivo, doc.tamanho_arquivo = calcular_hash_arquivo(dados), len(dados)
+    db.session.commit()
+    return True
+
+def _serializador():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='documentos-download')
+
+def link_temporario(doc, mimetype, download_name, as_attachment=True):
+    """Link de download válido por VALIDADE_LINK_SEGUNDOS, ou None para servir pela própria rota."""
+    disposicao = dump_options_header('attachment' if as_attachment else 'inline', {'filename': download_name})
+    if assina_urls():
+        return gerar_url_assinada(doc.url_arquivo, VALIDADE_LINK_SEGUNDOS, mimetype, disposicao)
+    token = _serializador().dumps([doc.url_arquivo, doc.hash_arquivo, doc.tamanho_arquivo, mimetype, download_name, as_attachment])
+    return url_for('documentos.arquivo_assinado', token=token)
+
+def ler_token(token):
+    """(ArquivoAssinado, mimetype, download_name, as_attachment) de um token válido e no prazo, ou None."""
+    try:
+        caminho, hash_arquivo, tamanho, mimetype, download_name, as_attachment = _serializador().loads(token, max_age=VALIDADE_LINK_SEGUNDOS)
+    except (BadSignature, ValueError, TypeError):
+        return None
+    return ArquivoAssinado(caminho, hash_arquivo, tamanho), mimetype, download_name, as_attachment
+
+def responder_documento(doc, mimetype, download_name, as_attachment=True, redirecionar=True):
+    """
+    Resposta do arquivo de `doc` (com url_arquivo, hash_arquivo e tamanho_arquivo já garantidos).
+    Retorna None se o storage não entregar o arquivo, para a rota mostrar o erro.
+    """
+    etag, tamanho = doc.hash_arquivo, doc.tamanho_arquivo
+
+    def cabecalhos(resposta):
+        resposta.set_etag(etag)
+        # Privado (exige login) e sempre revalidado: a revalidação é o 304 barato abaixo
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        resposta.headers['Accept-Ranges'] = 'bytes'
+        return resposta
+
+    if etag in request.if_none_match:
+        return cabecalhos(Response(status=304))
+
+    if DOWNLOAD_DIRETO and redirecionar:
+        url = link_temporario(doc, mimetype, download_name, as_attachment)
+        if url:
+            resposta = redirect(url)
+            # O link expira: o redirecionamento em si nunca vai para cache
+            resposta.headers['Cache-Control'] = 'no-store'
+            return resposta
+
+    inicio, fim, parcial = 0, tamanho, False
+    intervalo = request.range
+    # If-Range com outro ETag (arquivo mudou para o navegador): ignora o Range e manda tudo
+    if_range_ok = 'If-Range' not in request.headers or request.if_range.etag == etag
+    if intervalo and len(intervalo.ranges) == 1 and if_range_ok:
+        limites = intervalo.range_for_length(tamanho)
+        if limites is None:
+            resposta = cabecalhos(Response(status=416))
+            resposta.content_range = ContentRange('bytes', None, None, tamanho)
+            return resposta
+        (inicio, fim), parcial = limites, True
+
+    blocos = ler_em_blocos(doc.url_arquivo, inicio, fim, tamanho_total=tamanho)
+    # O primeiro pedaço vem antes dos cabeçalhos: arquivo ausente vira erro na rota, não resposta truncada
+    primeiro = next(blocos, None) if fim > inicio else b''
+    if primeiro is None: return None
+
+    resposta = Response(chain([primeiro], blocos), status=206 if parcial else 200, mimetype=mimetype, direct_passthrough=True)
+    resposta.content_length = fim - inicio
+    if parcial: resposta.content_range = ContentRange('bytes', inicio, fim, tamanho)
+    resposta.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline', filename=download_name)
+    return cabecalhos(resposta)
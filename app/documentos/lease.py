@@ -0,0 +1,44 @@
+from datetime import timedelta
+from sqlalchemy import and_, or_
+from app.extensions import db
+from app.utils import get_brasil_time
+
+# ==============================================================================
+# ⏱️ LEASE DOS TRABALHOS EM SEGUNDO PLANO (processamentos e leitura de atestados)
+# Quem assume um registro grava a hora numa coluna de lease com um UPDATE
+# condicional: entre dois workers, só um vence. Um registro no status ativo cujo
+# lease não foi renovado dentro de LEASE_SEGUNDOS está "parado" (o processo que o
+# executava caiu) e pode ser reivindicado de novo.
+# ==============================================================================
+
+LEASE_SEGUNDOS = 300
+
+def limite_do_lease(agora=None):
+    """Leases marcados antes disto expiraram."""
+    return (agora or get_brasil_time()) - timedelta(seconds=LEASE_SEGUNDOS)
+
+def esta_parado(registro, coluna_status, status_ativo, coluna_lease, agora=None, coluna_reserva=None):
+    """
+    No status ativo, mas sem lease válido. Sem lease ainda marcado vale `coluna_reserva`
+    (ex.: a data de envio), se informada; senão o registro já conta como parado.
+    """
+    if getattr(registro, coluna_status) != status_ativo: return False
+    marcado = getattr(registro, coluna_lease)
+    if marcado is None and coluna_reserva: marcado = getattr(registro, coluna_reserva)
+    return marcado is None or marcado < limite_do_lease(agora)
+
+def reivindicar(tabela, registro_id, coluna_status, status_ativo, coluna_lease, agora=None, status_livres=(), valores=None):
+    """
+    Assume o registro num UPDATE condicional: está em `status_livres`, ou no status ativo com o
+    lease vencido (ou nunca marcado). Grava o status ativo, o lease e `valores`. Faz commit e
+    retorna True se este worker venceu.
+    """
+    agora = agora or get_brasil_time()
+    status, lease = tabela.c[coluna_status], tabela.c[coluna_lease]
+    disponivel = and_(status == status_ativo, or_(lease.is_(None), lease < limite_do_lease(agora)))
+    if status_livres: disponivel = or_(status.in_(status_livres), disponivel)
+    resultado = db.session.execute(tabela.update().where(tabela.c.id == registro_id, disponivel).values(
+        {coluna_status: status_ativo, coluna_lease: agora, **(valores or {})}
+    ))
+    db.session.commit()
+    return resultado.rowcount == 1
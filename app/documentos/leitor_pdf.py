@@ -0,0 +1,58 @@
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pypdf import PdfReader, PdfWriter
+
+# ==============================================================================
+# 📄 LEITURA DE PDFs GRANDES SEM CARREGAR TUDO NA MEMÓRIA
+# O PDF fica num arquivo temporário e o PdfReader lê por um mmap: o sistema
+# operacional pagina o arquivo sob demanda em vez de o processo guardar uma
+# cópia em bytes (e outra no BytesIO). O texto de cada página sai direto do
+# leitor original; os bytes de uma página isolada só são gerados na hora de
+# enviar ao storage.
+# ==============================================================================
+
+# Cópia do upload para o disco em blocos (nunca o arquivo inteiro em memória)
+TAMANHO_BLOCO = 1024 * 1024
+
+def gravar_em_temporario(origem, sufixo='.pdf'):
+    """Copia um stream (upload ou download) para um arquivo temporário. Retorna o caminho; quem chama apaga."""
+    with tempfile.NamedTemporaryFile(suffix=sufixo, delete=False) as tmp:
+        if hasattr(origem, 'seek'): origem.seek(0)
+        shutil.copyfileobj(origem, tmp, TAMANHO_BLOCO)
+        return tmp.name
+
+@contextmanager
+def abrir_pdf(caminho):
+    """PdfReader sobre um mmap somente leitura do arquivo. Um leitor por thread/processo."""
+    with open(caminho, 'rb') as arquivo:
+        if os.fstat(arquivo.fileno()).st_size == 0:
+            raise ValueError("PDF vazio.")
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            leitor = PdfReader(mapa)
+            try:
+                yield leitor
+            finally:
+                # O pypdf guarda referências ao stream; solta antes de fechar o mmap
+                del leitor
+
+def textos_das_paginas(leitor, paginas=None):
+    """Gera (índice da página, texto) a partir do leitor original, sem reserializar nada."""
+    for numero in (range(len(leitor.pages)) if paginas is None else paginas):
+        try:
+            texto = leitor.pages[numero].extract_text()
+        except Exception as e:
+            print(f"ERRO DE LEITURA PDF (página {numero}): {e}")
+            texto = ""
+        yield numero, texto
+
+def pdf_da_pagina(leitor, numero):
+    """Bytes de um PDF só com a página `numero` (para o upload individual)."""
+    writer = PdfWriter()
+    writer.add_page(leitor.pages[numero])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import or_, and_
+from app.extensions import db
+from app.models import Atestado, User
+from app.utils import enviar_notificacao
+from app.documentos import lease
+from app.documentos.storage import baixar_bytes_storage
+from app.documentos.atestado_parser import obter_ocr, interpretar_atestado, ErroOCR
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 🩺 LEITURA DOS ATESTADOS EM SEGUNDO PLANO
+# O envio só guarda o arquivo e cria o atestado em 'Processando'; o OCR roda num
+# pool pequeno de threads do próprio servidor, com novas tentativas e espera
+# crescente quando o serviço falha. No fim o atestado vai para 'Revisao' (com o
+# que foi lido, ou com o erro) e o RH é avisado. Quem assume a leitura marca
+# ocr_iniciado_em (UPDATE condicional): um atestado parado por muito tempo (o
+# processo caiu) é retomado pela consulta de status ou pelo comando
+# `flask documentos processar-atestados`, sem duas leituras ao mesmo tempo.
+# ==============================================================================
+
+STATUS_PROCESSANDO = 'Processando'
+STATUS_REVISAO = 'Revisao'
+
+OCR_WORKERS = int(os.environ.get('ATESTADO_OCR_WORKERS', 2))
+OCR_TENTATIVAS = int(os.environ.get('ATESTADO_OCR_TENTATIVAS', 3))
+# Espera antes da segunda tentativa; dobra a cada nova falha
+OCR_ESPERA_SEGUNDOS = float(os.environ.get('ATESTADO_OCR_ESPERA_SEGUNDOS', 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _obter_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='atestados-ocr')
+    return _executor
+
+def enfileirar_leitura(app, atestado_id, arquivo_bytes=None):
+    """Chamar DEPOIS do commit do atestado. Com os bytes do upload em mãos, a leitura não volta ao storage."""
+    _obter_executor().submit(ler_atestado, app, atestado_id, arquivo_bytes)
+
+def esta_parado(atestado, agora=None):
+    """Processando, mas ninguém leu (ou quem lia sumiu) dentro do lease."""
+    return lease.esta_parado(atestado, 'status', STATUS_PROCESSANDO, 'ocr_iniciado_em', agora, coluna_reserva='data_envio')
+
+def _reivindicar(atestado_id):
+    return lease.reivindicar(Atestado.__table__, atestado_id, 'status', STATUS_PROCESSANDO, 'ocr_iniciado_em')
+
+def _extrair_com_tentativas(arquivo_bytes):
+    """Texto do OCR; ErroOCR em todas as tentativas sobe com a última falha."""
+    espera = OCR_ESPERA_SEGUNDOS
+    for tentativa in range(1, OCR_TENTATIVAS + 1):
+        try:
+            return obter_ocr().extrair_texto(arquivo_bytes)
+        except ErroOCR as e:
+            if tentativa == OCR_TENTATIVAS: raise
+            logger.warning(f"OCR do atestado falhou (tentativa {tentativa}/{OCR_TENTATIVAS}): {e}")
+            time.sleep(espera)
+            espera *= 2
+
+def ler_atestado(app, atestado_id, arquivo_bytes=None):
+    """Corpo do worker: OCR, regras de negócio e passagem para 'Revisao'."""
+    with app.app_context():
+        try:
+            if not _reivindicar(atestado_id): return
+            atestado = db.session.get(Atestado, atestado_id)
+            if arquivo_bytes is None: arquivo_bytes = baixar_bytes_storage(atestado.url_arquivo)
+
+            if arquivo_bytes is None:
+                dados = interpretar_atestado("", atestado.user.real_name)
+                dados["texto_bruto"] = "ERRO NO PROCESSAMENTO: arquivo não encontrado no storage."
+            else:
+                try:
+                    dados = interpretar_atestado(_extrair_com_tentativas(arquivo_bytes), atestado.user.real_name)
+                except Exception as e:
+                    dados = interpretar_atestado("", atestado.user.real_name)
+                    dados["texto_bruto"] = f"ERRO NO PROCESSAMENTO: {e}"
+
+            data_inicio = datetime.strptime(dados['data_inicio'], '%Y-%m-%d').date() if dados['data_inicio'] else None
+            _concluir(atestado, data_inicio, dados['dias_afastamento'], dados['texto_bruto'])
+        except Exception:
+            db.session.rollback()
+            logger.exception(f"Falha na leitura do atestado {atestado_id}")
+        finally:
+            db.session.remove()
+
+def _concluir(atestado, data_inicio, dias, texto):
+    """
+    Grava a leitura só se o atestado ainda estiver em 'Processando': se o RH já avaliou
+    enquanto o OCR rodava, a decisão dele fica e só o texto lido é guardado.
+    """
+    tabela = Atestado.__table__
+    resultado = db.session.execute(tabela.update().where(
+        tabela.c.id == atestado.id, tabela.c.status == STATUS_PROCESSANDO
+    ).values(status=STATUS_REVISAO, data_inicio_afastamento=data_inicio, quantidade_dias=dias, texto_extraido=texto))
+    if resultado.rowcount == 0:
+        db.session.execute(tabela.update().where(tabela.c.id == atestado.id).values(texto_extraido=texto))
+    db.session.commit()
+    if resultado.rowcount == 1:
+        master = User.query.filter_by(username='50097952800').first()
+        if master:
+            enviar_notificacao(master.id, f"Novo Atestado de {atestado.user.real_name} aguardando análise.", "/documentos/admin/atestados")
+
+def retomar_leituras(app):
+    """Lê em sequência os atestados parados em 'Processando'. Retorna os ids tratados."""
+    with app.app_context():
+        limite = lease.limite_do_lease()
+        ids = [a.id for a in Atestado.query.filter(
+            Atestado.status == STATUS_PROCESSANDO,
+            or_(Atestado.ocr_iniciado_em < limite, and_(Atestado.ocr_iniciado_em.is_(None), Atestado.data_envio < limite))
+        ).order_by(Atestado.id)]
+        db.session.remove()
+    for atestado_id in ids:
+        ler_atestado(app, atestado_id)
+    return ids
+
+def status_json(atestado):
+    return {
+        'id': atestado.id, 'status': atestado.status,
+        'data_inicio': atestado.data_inicio_afastamento.isoformat() if atestado.data_inicio_afastamento else None,
+        'quantidade_dias': atestado.quantidade_dias,
+    }
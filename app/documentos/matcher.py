@@ -0,0 +1,124 @@
+from collections import deque
+from app.extensions import db
+from app.models import User
+from app.utils import limpar_nome, CacheTTL
+
+# Fallback aproximado opcional (se não estiver instalado, só o match exato funciona)
+try:
+    from thefuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
+
+# ==============================================================================
+# 🔎 ÍNDICE DE NOMES DA EMPRESA (AHO-CORASICK POR PALAVRA)
+# Os nomes normalizados (limpar_nome) viram um autômato montado uma vez por
+# empresa. Cada página é lida em UMA varredura das palavras do texto, achando
+# todos os nomes presentes de uma vez; vale o mais longo, como no match exato
+# antigo (que testava nome por nome, do maior para o menor). Por ser por
+# palavra, "ANA" nunca casa dentro de "JULIANA". Páginas sem match exato passam
+# por um fallback aproximado (thefuzz) em lote, com nota mínima e sem empate.
+# ==============================================================================
+
+# Nota mínima (0-100) do fallback aproximado e a folga exigida para o segundo colocado
+NOTA_MINIMA_APROXIMADO = 92
+FOLGA_APROXIMADO = 5
+
+class IndiceNomes:
+    def __init__(self, nomes_map):
+        """`nomes_map`: {nome normalizado: user_id}. Em empate de tamanho, vence o que veio primeiro."""
+        self._ids = dict(nomes_map)
+        self.nomes = [n for n in self._ids if n]
+        self._tamanhos = {}
+        # Autômato: transições por palavra, link de falha e o melhor nome que termina em cada estado
+        self._goto, self._saida = [{}], [None]
+        for ordem, nome in enumerate(self.nomes):
+            estado = 0
+            for palavra in nome.split():
+                proximo = self._goto[estado].get(palavra)
+                if proximo is None:
+                    proximo = len(self._goto)
+                    self._goto[estado][palavra] = proximo
+                    self._goto.append({}); self._saida.append(None)
+                estado = proximo
+            self._saida[estado] = self._melhor(self._saida[estado], ordem)
+            self._tamanhos.setdefault(len(nome.split()), []).append(nome)
+
+        # Links de falha em largura; a saída de cada estado herda a do seu link
+        self._falha = [0] * len(self._goto)
+        fila = deque([0])
+        while fila:
+            estado = fila.popleft()
+            for palavra, proximo in self._goto[estado].items():
+                fila.append(proximo)
+                if estado == 0: continue
+                f = self._falha[estado]
+                while f and palavra not in self._goto[f]: f = self._falha[f]
+                self._falha[proximo] = self._goto[f].get(palavra, 0)
+                self._saida[proximo] = self._melhor(self._saida[proximo], self._saida[self._falha[proximo]])
+        self._vocabulario = {palavra for nome in self.nomes for palavra in nome.split()}
+
+    def _melhor(self, a, b):
+        if a is None: return b
+        if b is None: return a
+        chave = lambda ordem: (-len(self.nomes[ordem]), ordem)
+        return min(a, b, key=chave)
+
+    def user_id(self, nome):
+        return self._ids.get(nome)
+
+    def buscar(self, texto_limpo):
+        """O nome (normalizado) mais longo presente no texto, ou ''. Uma varredura das palavras."""
+        estado, melhor = 0, None
+        for palavra in texto_limpo.split():
+            while estado and palavra not in self._goto[estado]: estado = self._falha[estado]
+            estado = self._goto[estado].get(palavra, 0)
+            if self._saida[estado] is not None: melhor = self._melhor(melhor, self._saida[estado])
+        return self.nomes[melhor] if melhor is not None else ''
+
+    def aproximar(self, textos_limpos):
+        """
+        Fallback para páginas sem match exato (ex.: uma letra trocada na extração do PDF).
+        Só compara trechos do tamanho de algum nome em que no máximo uma palavra fuja do
+        vocabulário da empresa; cada trecho distinto do lote é pontuado uma vez.
+        Retorna um nome ou '' por texto.
+        """
+        if process is None or not self.nomes: return [''] * len(textos_limpos)
+        janelas_por_texto, notas = [], {}
+        for texto in textos_limpos:
+            palavras, janelas = texto.split(), set()
+            for tamanho in self._tamanhos:
+                if tamanho < 2: continue
+                for i in range(len(palavras) - tamanho + 1):
+                    trecho = palavras[i:i + tamanho]
+                    if sum(p not in self._vocabulario for p in trecho) <= 1: janelas.add((tamanho, ' '.join(trecho)))
+            janelas_por_texto.append(janelas)
+            for janela in janelas: notas.setdefault(janela, None)
+
+        for (tamanho, trecho) in notas:
+            notas[(tamanho, trecho)] = process.extract(trecho, self._tamanhos[tamanho], scorer=fuzz.ratio, processor=None, limit=2)
+
+        resultado = []
+        for janelas in janelas_por_texto:
+            melhores = {}
+            for janela in janelas:
+                for nome, nota in notas[janela]:
+                    melhores[nome] = max(nota, melhores.get(nome, 0))
+            ranking = sorted(melhores.items(), key=lambda item: -item[1])
+            aceito = ranking and ranking[0][1] >= NOTA_MINIMA_APROXIMADO and (len(ranking) == 1 or ranking[0][1] - ranking[1][1] >= FOLGA_APROXIMADO)
+            resultado.append(ranking[0][0] if aceito else '')
+        return resultado
+
+def _carregar(empresa_id):
+    usuarios = db.session.query(User.id, User.real_name).filter(
+        User.empresa_id == empresa_id, User.role != 'Terminal'
+    ).order_by(User.id).all()
+    return IndiceNomes({limpar_nome(nome): user_id for user_id, nome in usuarios})
+
+_cache = CacheTTL()
+
+def indice_da_empresa(empresa_id):
+    return _cache.obter(empresa_id, lambda: _carregar(empresa_id))
+
+def invalidar_indice_nomes(empresa_id=None):
+    """Chamar sempre que um colaborador for criado, renomeado ou excluído."""
+    _cache.descartar(empresa_id)
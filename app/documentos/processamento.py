@@ -0,0 +1,403 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import func
+from app.extensions import db
+from app.models import Holerite, ProcessamentoDocumento
+from app.utils import get_brasil_time, enviar_notificacao, calcular_hash_arquivo
+from app.documentos import lease
+from app.documentos.storage import salvar_no_storage, salvar_arquivo_no_storage, baixar_para_arquivo, hash_do_stream
+from app.documentos.leitor_pdf import abrir_pdf, textos_das_paginas, pdf_da_pagina
+from app.documentos.ai_parser import extrair_dados_do_texto
+from app.documentos.matcher import indice_da_empresa
+from app.documentos.utils import dados_espelho, desenhar_pdf_espelho
+from app.ponto.apuracao import apurar_empresa
+from app.ponto.espelho import intervalo_do_mes
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 📦 PROCESSAMENTOS DE DOCUMENTOS EM SEGUNDO PLANO
+# Holerites: o upload só guarda o PDF original no storage e enfileira o job, que
+# lê as páginas num pool de processos. Espelhos de ponto: a apuração do mês da
+# empresa inteira é carregada uma vez e os PDFs são desenhados num pool de
+# processos. Nos dois casos uma thread do próprio servidor (ou o comando
+# `flask documentos processar-pendentes`) envia os arquivos ao storage num pool
+# de threads limitado e grava em lotes. Cada lote confirmado renova o heartbeat:
+# se o processo cair, o job fica "parado" e pode ser retomado, pulando os itens
+# já gravados (índice único processamento_id + pagina, nunca há documento duplicado).
+# O SHA-256 de cada PDF é calculado no envio: o mesmo arquivo da folha não abre um
+# segundo job enquanto o primeiro não termina, e a página que a empresa já tem
+# (folha reenviada) conta como duplicada em vez de subir e virar outro holerite.
+# ==============================================================================
+
+PAGINAS_POR_LOTE = int(os.environ.get('HOLERITES_PAGINAS_POR_LOTE', 25))
+ESPELHOS_POR_LOTE = int(os.environ.get('ESPELHOS_POR_LOTE', 20))
+MAX_UPLOADS = int(os.environ.get('HOLERITES_MAX_UPLOADS', 8))
+# Divisão e leitura do texto são CPU puro: mais processos que núcleos não ajuda
+MAX_PROCESSOS = int(os.environ.get('HOLERITES_MAX_PROCESSOS', min(4, os.cpu_count() or 1)))
+STATUS_NA_FILA, STATUS_PROCESSANDO, STATUS_CONCLUIDO, STATUS_ERRO = 'Na Fila', 'Processando', 'Concluido', 'Erro'
+
+# Documento que a empresa já tinha (pelo hash): não sobe de novo nem vira outra linha
+Duplicado = namedtuple('Duplicado', 'hash_arquivo')
+
+PaginaExtraida = namedtuple('PaginaExtraida', 'pagina nome mes_referencia')
+
+# ------------------------------------------------------------------------------
+# Trabalho de CPU (roda nos processos filhos, sem banco nem contexto Flask)
+# ------------------------------------------------------------------------------
+
+class _Extrator:
+    """Mantém o PDF original aberto (mmap) e identifica cada página pelo texto, sem gerar PDFs."""
+    def __init__(self, caminho, indice):
+        self._abertura = abrir_pdf(caminho)
+        self._leitor = self._abertura.__enter__()
+        self._indice = indice
+
+    def extrair(self, paginas):
+        extraidas, sem_nome = [], []
+        for numero, texto_raw in textos_das_paginas(self._leitor, paginas):
+            dados = extrair_dados_do_texto(texto_raw, self._indice)
+            if not dados['nome'] and dados['texto_limpo']: sem_nome.append((len(extraidas), dados['texto_limpo']))
+            extraidas.append(PaginaExtraida(numero, dados['nome'], dados['mes_referencia']))
+
+        # Quase-acertos (uma letra trocada na extração), todos os do lote numa passada só
+        if sem_nome:
+            for (posicao, _), nome in zip(sem_nome, self._indice.aproximar([texto for _, texto in sem_nome])):
+                if nome: extraidas[posicao] = extraidas[posicao]._replace(nome=nome)
+        return extraidas
+
+    def fechar(self):
+        self._leitor = None
+        self._abertura.__exit__(None, None, None)
+
+_extrator_do_processo = None
+
+def _iniciar_processo(caminho, indice):
+    global _extrator_do_processo
+    _extrator_do_processo = _Extrator(caminho, indice)
+
+def _extrair_no_processo(paginas):
+    return _extrator_do_processo.extrair(paginas)
+
+def _em_processos(funcao, lotes, funcao_local, inicializar=None, args_inicializar=()):
+    """
+    Gera `funcao(lote)` de cada lote, na ordem. Com mais de um núcleo usa um pool de processos
+    (spawn: o servidor tem várias threads, fork herdaria locks e conexões abertas); se o pool
+    não subir ou quebrar no meio, o restante roda nesta mesma thread com `funcao_local`.
+    """
+    entregues = 0
+    if MAX_PROCESSOS > 1 and len(lotes) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(MAX_PROCESSOS, len(lotes)), mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=inicializar, initargs=args_inicializar) as pool:
+                for resultado in pool.map(funcao, lotes):
+                    entregues += 1
+                    yield resultado
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"Pool de processos indisponível, seguindo na thread do job: {e}")
+    for lote in lotes[entregues:]:
+        yield funcao_local(lote)
+
+def _lotes_extraidos(caminho, indice, lotes):
+    """Páginas do PDF de holerites identificadas, lote a lote."""
+    extrator = None
+    def extrair_local(paginas):
+        nonlocal extrator
+        if extrator is None: extrator = _Extrator(caminho, indice)
+        return extrator.extrair(paginas)
+    try:
+        yield from _em_processos(_extrair_no_processo, lotes, extrair_local, _iniciar_processo, (caminho, indice))
+    finally:
+        if extrator is not None: extrator.fechar()
+
+def _desenhar_lote(lote):
+    """Renderiza os espelhos do lote. Um colaborador com erro não derruba os outros (fica None e é retomado)."""
+    pdfs = []
+    for dados in lote:
+        try:
+            pdfs.append(desenhar_pdf_espelho(dados))
+        except Exception as e:
+            print(f"Erro ao gerar espelho para {dados['real_name']}: {e}")
+            pdfs.append(None)
+    return pdfs
+
+# ------------------------------------------------------------------------------
+# Fila e execução
+# ------------------------------------------------------------------------------
+
+def _em_aberto(app, anterior):
+    """Devolve o job ainda não concluído, disparando de novo o worker se ele parou em erro."""
+    if anterior.status == STATUS_ERRO: iniciar_worker(app, anterior.id)
+    return anterior
+
+def enfileirar_holerites(app, arquivo, empresa_id, criado_por_id, mes_referencia=None):
+    """
+    Guarda o PDF original (stream do upload), cria o processamento e dispara o worker. Retorna o processamento ou None.
+    O mesmo PDF enviado de novo enquanto o job dele não terminou devolve esse job (retomado, se parou em erro):
+    dois jobs do mesmo arquivo em paralelo não se enxergariam. Para outro mês de referência o envio é recusado
+    (ValueError) até o job anterior terminar; depois de concluído, o original já está no storage.
+    """
+    hash_arquivo, _ = hash_do_stream(arquivo)
+    anterior = ProcessamentoDocumento.query.filter_by(empresa_id=empresa_id, tipo='holerite', hash_arquivo=hash_arquivo)\
+        .order_by(ProcessamentoDocumento.id.desc()).first()
+    if anterior and anterior.status != STATUS_CONCLUIDO:
+        if anterior.mes_referencia != mes_referencia:
+            raise ValueError(f"este PDF ainda está em processamento (mês {anterior.mes_referencia or 'não informado'}). "
+                             "Conclua ou retome esse processamento antes de enviá-lo para outro mês.")
+        return _em_aberto(app, anterior)
+    arquivo_origem = anterior.arquivo_origem if anterior else salvar_arquivo_no_storage(arquivo, "holerites/originais", hash_arquivo)
+    if not arquivo_origem: return None
+    proc = ProcessamentoDocumento(empresa_id=empresa_id, tipo='holerite', status=STATUS_NA_FILA, arquivo_origem=arquivo_origem,
+                                  hash_arquivo=hash_arquivo, mes_referencia=mes_referencia, criado_por_id=criado_por_id)
+    db.session.add(proc)
+    db.session.commit()
+    iniciar_worker(app, proc.id)
+    return proc
+
+def enfileirar_espelhos(app, empresa_id, criado_por_id, mes_referencia):
+    """
+    Publicação dos espelhos de ponto do mês para todos os colaboradores da empresa. Enquanto a
+    publicação do mesmo mês não terminou, devolve esse job (retomado, se parou em erro).
+    """
+    anterior = ProcessamentoDocumento.query.filter(
+        ProcessamentoDocumento.empresa_id == empresa_id, ProcessamentoDocumento.tipo == 'espelho',
+        ProcessamentoDocumento.mes_referencia == mes_referencia, ProcessamentoDocumento.status != STATUS_CONCLUIDO
+    ).order_by(ProcessamentoDocumento.id.desc()).first()
+    if anterior: return _em_aberto(app, anterior)
+    proc = ProcessamentoDocumento(empresa_id=empresa_id, tipo='espelho', status=STATUS_NA_FILA,
+                                  mes_referencia=mes_referencia, criado_por_id=criado_por_id)
+    db.session.add(proc)
+    db.session.commit()
+    iniciar_worker(app, proc.id)
+    return proc
+
+def iniciar_worker(app, processamento_id):
+    threading.Thread(target=processar_documentos, args=(app, processamento_id), name=f'documentos-{processamento_id}', daemon=True).start()
+
+def esta_parado(proc, agora=None):
+    """Processando, mas sem heartbeat dentro do lease: o processo que o executava caiu."""
+    return lease.esta_parado(proc, 'status', STATUS_PROCESSANDO, 'heartbeat_em', agora)
+
+def _reivindicar(processamento_id):
+    """UPDATE condicional: só um worker por vez assume o job (na fila, com erro ou abandonado)."""
+    agora = get_brasil_time()
+    tabela = ProcessamentoDocumento.__table__
+    return lease.reivindicar(tabela, processamento_id, 'status', STATUS_PROCESSANDO, 'heartbeat_em', agora,
+                             status_livres=[STATUS_NA_FILA, STATUS_ERRO],
+                             valores={'mensagem_erro': None, 'iniciado_em': func.coalesce(tabela.c.iniciado_em, agora)})
+
+def processar_documentos(app, processamento_id):
+    """Corpo do worker. Pode rodar numa thread do servidor ou no comando de CLI."""
+    with app.app_context():
+        try:
+            if not _reivindicar(processamento_id): return
+            proc = db.session.get(ProcessamentoDocumento, processamento_id)
+            falhas = _EXECUTORES[proc.tipo](proc)
+            if falhas:
+                proc.status, proc.mensagem_erro = STATUS_ERRO, f"{falhas} documento(s) não foram gerados ou enviados ao storage. Retome o processamento."
+            else:
+                proc.status, proc.concluido_em = STATUS_CONCLUIDO, get_brasil_time()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Falha no processamento de documentos {processamento_id}")
+            db.session.execute(ProcessamentoDocumento.__table__.update().where(ProcessamentoDocumento.id == processamento_id)
+                               .values(status=STATUS_ERRO, mensagem_erro=str(e)[:500]))
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+def _atualizar_progresso(proc):
+    """Contadores a partir do banco (não de variáveis do worker): continuam certos depois de retomar."""
+    enviados, revisao = db.session.query(
+        func.count(Holerite.user_id), func.count(Holerite.id) - func.count(Holerite.user_id)
+    ).filter(Holerite.processamento_id == proc.id).one()
+    proc.paginas_processadas = enviados + revisao + (proc.duplicados or 0)
+    proc.enviados, proc.revisao = enviados, revisao
+    proc.heartbeat_em = get_brasil_time()
+
+def _executar_holerites(proc):
+    # O original vai do storage direto para o disco; os processos e esta thread o leem por mmap
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+        caminho = tmp.name
+        baixado = baixar_para_arquivo(proc.arquivo_origem, tmp)
+    try:
+        if not baixado: raise RuntimeError("PDF original não encontrado no storage.")
+        with abrir_pdf(caminho) as leitor:
+            proc.total_paginas = len(leitor.pages)
+            gravadas = {p for (p,) in db.session.query(Holerite.pagina).filter(Holerite.processamento_id == proc.id)}
+            pendentes = [p for p in range(proc.total_paginas) if p not in gravadas]
+            # Duplicadas não têm linha: voltam às pendentes a cada execução e são recontadas do zero
+            proc.duplicados = 0
+            _atualizar_progresso(proc)
+            db.session.commit()
+
+            # O índice de nomes da empresa vai montado para os processos (um pickle por processo, não por página)
+            indice = indice_da_empresa(proc.empresa_id)
+            lotes = [pendentes[i:i + PAGINAS_POR_LOTE] for i in range(0, len(pendentes), PAGINAS_POR_LOTE)]
+
+            falhas = 0
+            with ThreadPoolExecutor(max_workers=MAX_UPLOADS) as uploads:
+                for extraidas in _lotes_extraidos(caminho, indice, lotes):
+                    falhas += _gravar_holerites(proc, leitor, extraidas, indice, uploads)
+    finally:
+        os.unlink(caminho)
+    return falhas
+
+def _gravar_holerites(proc, leitor, extraidas, indice, uploads):
+    """Envia o lote ao storage em paralelo e grava tudo numa transação. Retorna as páginas que falharam."""
+    # Os bytes de cada página só existem aqui, um lote por vez (o leitor não é compartilhado entre threads)
+    pdfs = [pdf_da_pagina(leitor, p.pagina) for p in extraidas]
+    salvos = _enviar_novos(proc, pdfs, [f"holerites/{p.mes_referencia}" for p in extraidas], uploads)
+    agora = get_brasil_time()
+    linhas, duplicados, nomes_repetidas = [], 0, {}
+    for pagina, salvo in zip(extraidas, salvos):
+        if isinstance(salvo, Duplicado):
+            duplicados += 1
+            if pagina.nome: nomes_repetidas.setdefault(salvo.hash_arquivo, pagina.nome)
+            continue
+        if not salvo: continue
+        caminho_blob, hash_arquivo, tamanho = salvo
+        user_id = indice.user_id(pagina.nome) if pagina.nome else None
+        linhas.append({'empresa_id': proc.empresa_id, 'user_id': user_id, 'mes_referencia': pagina.mes_referencia,
+                       'url_arquivo': caminho_blob, 'hash_arquivo': hash_arquivo, 'tamanho_arquivo': tamanho,
+                       'status': 'Enviado' if user_id else 'Revisao', 'enviado_em': agora,
+                       'processamento_id': proc.id, 'pagina': pagina.pagina, 'created_at': agora, 'updated_at': agora})
+
+    proc.duplicados = (proc.duplicados or 0) + duplicados
+    vinculados = _vincular_revisao(proc, nomes_repetidas, indice)
+    for user_id, mes_ref in _inserir_lote(proc, linhas) + vinculados:
+        enviar_notificacao(user_id, f"Novo Holerite disponível para assinatura ({mes_ref}).", "/documentos/meus-documentos")
+    return len(extraidas) - len(linhas) - duplicados
+
+def _vincular_revisao(proc, nomes_por_hash, indice):
+    """
+    Página repetida cujo documento anterior ficou em revisão (o nome não foi achado na época):
+    a busca desta execução, com o índice atual, atribui a linha existente em vez de só descartar
+    a cópia. Retorna (user_id, mês) dos vinculados. Não faz commit.
+    """
+    if not nomes_por_hash: return []
+    agora, vinculados = get_brasil_time(), []
+    pendentes = Holerite.query.filter(
+        Holerite.empresa_id == proc.empresa_id, Holerite.user_id.is_(None), Holerite.status == 'Revisao',
+        Holerite.hash_arquivo.in_(list(nomes_por_hash))
+    ).all()
+    for doc in pendentes:
+        user_id = indice.user_id(nomes_por_hash[doc.hash_arquivo])
+        if not user_id: continue
+        doc.user_id, doc.status, doc.enviado_em = user_id, 'Enviado', agora
+        vinculados.append((user_id, doc.mes_referencia))
+    return vinculados
+
+def _enviar_novos(proc, pdfs, pastas, uploads):
+    """
+    Calcula o hash de cada PDF do lote e envia ao storage, em paralelo, só os que a empresa ainda
+    não tem. Devolve, na ordem, (caminho, hash, tamanho), Duplicado ou None (não gerado/falhou).
+    """
+    hashes = [calcular_hash_arquivo(pdf) if pdf else None for pdf in pdfs]
+    conhecidos = {h for (h,) in db.session.query(Holerite.hash_arquivo).filter(
+        Holerite.empresa_id == proc.empresa_id, Holerite.hash_arquivo.in_([h for h in hashes if h]))}
+    envios = []
+    for pdf, hash_arquivo, pasta in zip(pdfs, hashes, pastas):
+        if not pdf:
+            envios.append(None)
+        elif hash_arquivo in conhecidos:
+            envios.append(Duplicado(hash_arquivo))
+        else:
+            # A mesma página repetida dentro do lote também conta uma vez só
+            conhecidos.add(hash_arquivo)
+            envios.append((uploads.submit(salvar_no_storage, pdf, pasta, hash_arquivo), hash_arquivo, len(pdf)))
+    salvos = []
+    for envio in envios:
+        if envio is None or isinstance(envio, Duplicado):
+            salvos.append(envio)
+            continue
+        futuro, hash_arquivo, tamanho = envio
+        caminho_blob = futuro.result()
+        salvos.append((caminho_blob, hash_arquivo, tamanho) if caminho_blob else None)
+    return salvos
+
+def _executar_espelhos(proc):
+    """
+    Apuração do mês da empresa inteira em duas consultas; os espelhos de quem ainda não tem
+    documento neste processamento são desenhados em lotes no pool e enviados em paralelo.
+    Aqui `pagina` é o id do colaborador: retomar pula quem já recebeu.
+    """
+    ano, mes = map(int, proc.mes_referencia.split('-'))
+    # O espelho vai para todos, administradores inclusive
+    apuracao = apurar_empresa(proc.empresa_id, *intervalo_do_mes(ano, mes), somente_ponto=False)
+    proc.total_paginas = len(apuracao.usuarios)
+    gravados = {p for (p,) in db.session.query(Holerite.pagina).filter(Holerite.processamento_id == proc.id)}
+    pendentes = [u for u in apuracao.usuarios if u.id not in gravados]
+    proc.duplicados = 0
+    _atualizar_progresso(proc)
+    db.session.commit()
+
+    lotes = [[dados_espelho(u, apuracao, ano, mes) for u in pendentes[i:i + ESPELHOS_POR_LOTE]]
+             for i in range(0, len(pendentes), ESPELHOS_POR_LOTE)]
+    falhas = 0
+    with ThreadPoolExecutor(max_workers=MAX_UPLOADS) as uploads:
+        for lote, pdfs in zip(lotes, _em_processos(_desenhar_lote, lotes, _desenhar_lote)):
+            salvos = _enviar_novos(proc, pdfs, [f"espelhos/{proc.mes_referencia}"] * len(pdfs), uploads)
+            agora = get_brasil_time()
+            linhas, duplicados = [], 0
+            for dados, salvo in zip(lote, salvos):
+                if isinstance(salvo, Duplicado):
+                    duplicados += 1
+                    continue
+                if not salvo: continue
+                caminho_blob, hash_arquivo, tamanho = salvo
+                linhas.append({'empresa_id': proc.empresa_id, 'user_id': dados['user_id'], 'mes_referencia': proc.mes_referencia,
+                               'url_arquivo': caminho_blob, 'hash_arquivo': hash_arquivo, 'tamanho_arquivo': tamanho,
+                               'status': 'Enviado', 'enviado_em': agora,
+                               'processamento_id': proc.id, 'pagina': dados['user_id'], 'created_at': agora, 'updated_at': agora})
+            proc.duplicados = (proc.duplicados or 0) + duplicados
+            for user_id, mes_ref in _inserir_lote(proc, linhas):
+                enviar_notificacao(user_id, f"Seu Espelho de Ponto ({mes_ref}) está disponível para validação.", "/documentos/meus-documentos")
+            falhas += len(lote) - len(linhas) - duplicados
+    return falhas
+
+def _inserir_lote(proc, linhas):
+    """
+    Insere os documentos do lote, atualiza o progresso e confirma. Retorna (user_id, mês) só das
+    linhas realmente inseridas: quem já tinha o documento (retomada) não é avisado de novo.
+    """
+    inseridos = []
+    if linhas:
+        from app.ponto.resumo import _insert_do_dialeto
+        stmt = _insert_do_dialeto()(Holerite.__table__).values(linhas)
+        stmt = stmt.on_conflict_do_nothing(index_elements=['processamento_id', 'pagina']).returning(Holerite.user_id, Holerite.mes_referencia)
+        inseridos = [(uid, mes) for uid, mes in db.session.execute(stmt) if uid]
+    _atualizar_progresso(proc)
+    db.session.commit()
+    return inseridos
+
+_EXECUTORES = {'holerite': _executar_holerites, 'espelho': _executar_espelhos}
+
+def retomar_pendentes(app, empresa_id=None):
+    """Processa em sequência os jobs na fila, com erro ou abandonados. Retorna os ids tratados."""
+    with app.app_context():
+        query = ProcessamentoDocumento.query.filter(ProcessamentoDocumento.status != STATUS_CONCLUIDO)
+        if empresa_id: query = query.filter(ProcessamentoDocumento.empresa_id == empresa_id)
+        agora = get_brasil_time()
+        ids = [p.id for p in query.order_by(ProcessamentoDocumento.id) if p.status != STATUS_PROCESSANDO or esta_parado(p, agora)]
+        db.session.remove()
+    for processamento_id in ids:
+        processar_documentos(app, processamento_id)
+    return ids
+
+def progresso_json(proc):
+    total = proc.total_paginas or 0
+    return {
+        'id': proc.id, 'status': proc.status, 'parado': esta_parado(proc),
+        'total_paginas': total, 'paginas_processadas': proc.paginas_processadas or 0,
+        'enviados': proc.enviados or 0, 'revisao': proc.revisao or 0, 'duplicados': proc.duplicados or 0,
+        'percentual': round(100 * (proc.paginas_processadas or 0) / total) if total else 0,
+        'mensagem_erro': proc.mensagem_erro,
+    }
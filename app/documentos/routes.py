@@ -1,19 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from app.extensions import db
-from app.models import User, Holerite, Recibo, AssinaturaDigital, Atestado, PontoResumo
-from app.utils import get_brasil_time, permission_required, has_permission, limpar_nome, get_client_ip, calcular_hash_arquivo, enviar_notificacao, format_minutes_to_hm
-from app.documentos.storage import salvar_no_storage, baixar_bytes_storage
-from app.documentos.ai_parser import extrair_dados_holerite
-from app.documentos.utils import gerar_pdf_recibo, gerar_pdf_espelho_mensal, gerar_certificado_entrega
-from app.documentos.atestado_parser import analisar_atestado_vision
+from app.models import User, Holerite, Recibo, AssinaturaDigital, Atestado, ProcessamentoDocumento
+from app.utils import get_brasil_time, permission_required, has_permission, get_client_ip, calcular_hash_arquivo, enviar_notificacao, format_minutes_to_hm
+from app.documentos.storage import salvar_no_storage
+from app.documentos.utils import gerar_pdf_recibo, gerar_certificado_entrega
+from app.documentos.leitura_atestados import enfileirar_leitura, retomar_leituras, esta_parado as leitura_parada, status_json as status_atestado_json
+from app.documentos.entrega import garantir_metadados, responder_documento, ler_token
+from app.documentos.processamento import enfileirar_holerites, enfileirar_espelhos, iniciar_worker, retomar_pendentes, esta_parado, progresso_json
+from app.ponto.espelho import intervalo_do_mes
+from app.ponto.resumo import marcar_ausencia
+from app.ponto.apuracao import apurar_empresa
 from datetime import datetime, timedelta
-from pypdf import PdfReader, PdfWriter
 import io
+import click
 import pandas as pd 
 
 documentos_bp = Blueprint('documentos', __name__, template_folder='templates', url_prefix='/documentos')
 
+PROCESSAMENTOS_RECENTES = 10
+
 @documentos_bp.route('/admin')
 @login_required
 @permission_required('DOCUMENTOS')
@@ -31,8 +37,9 @@ def dashboard_documentos():
     
     if f_mes:
         q_holerite = q_holerite.filter(Holerite.mes_referencia == f_mes)
-        q_recibo = q_recibo.filter(db.extract('month', Recibo.data_pagamento) == int(f_mes.split('-')[1]),
-                                   db.extract('year', Recibo.data_pagamento) == int(f_mes.split('-')[0]))
+        # Intervalo de datas em vez de extract(month/year): o filtro usa o índice de data_pagamento
+        inicio_mes, fim_mes = intervalo_do_mes(*map(int, f_mes.split('-')))
+        q_recibo = q_recibo.filter(Recibo.data_pagamento >= inicio_mes, Recibo.data_pagamento <= fim_mes)
 
     holerites_db = q_holerite.order_by(Holerite.enviado_em.desc()).limit(50).all()
     recibos_db = q_recibo.order_by(Recibo.created_at.desc()).limit(50).all()
@@ -91,43 +98,61 @@ def admin_holerites():
         file = request.files.get('arquivo_pdf')
         if not file: return redirect(request.url)
         try:
-            reader = PdfReader(file)
-            sucesso, revisao = 0, 0
-            usuarios_db = User.query.filter(User.role != 'Terminal').all()
-            usuarios_map = {limpar_nome(u.real_name): u.id for u in usuarios_db}
-            lista_nomes_banco = list(usuarios_map.keys())
-
-            for page in reader.pages:
-                writer = PdfWriter(); writer.add_page(page); buffer = io.BytesIO(); writer.write(buffer)
-                pdf_bytes = buffer.getvalue()
-                
-                dados = extrair_dados_holerite(pdf_bytes, lista_nomes_banco)
-                nome_identificado = dados.get('nome', '')
-                mes_ref = dados.get('mes_referencia', '2026-02')
-
-                caminho_blob = salvar_no_storage(pdf_bytes, f"holerites/{mes_ref}")
-                if not caminho_blob: continue
-
-                user_id = None
-                if nome_identificado and nome_identificado in usuarios_map:
-                    user_id = usuarios_map[nome_identificado]
-
-                novo_h = Holerite(user_id=user_id, mes_referencia=mes_ref, url_arquivo=caminho_blob,
-                                 status='Enviado' if user_id else 'Revisao', enviado_em=get_brasil_time())
-                db.session.add(novo_h)
-                
-                if user_id: 
-                    sucesso += 1
-                    enviar_notificacao(user_id, f"Novo Holerite disponível para assinatura ({mes_ref}).", "/documentos/meus-documentos")
-                else: 
-                    revisao += 1
-
-            db.session.commit()
-            flash(f"Processado: {sucesso} enviados, {revisao} para revisão manual.", "success")
-            return redirect(url_for('documentos.dashboard_documentos'))
+            # A divisão e a distribuição rodam em segundo plano: a requisição só guarda o PDF e enfileira
+            proc = enfileirar_holerites(current_app._get_current_object(), file.stream, current_user.empresa_id,
+                                        current_user.id, request.form.get('mes_ref') or None)
+            if not proc:
+                flash("Erro ao guardar o PDF no storage. Tente novamente.", "error")
+                return redirect(request.url)
+            flash("PDF recebido. Os holerites estão sendo distribuídos; acompanhe o progresso abaixo.", "success")
+            return redirect(url_for('documentos.admin_holerites', processamento=proc.id))
         except Exception as e:
             db.session.rollback(); flash(f"Erro: {e}", "error")
-    return render_template('documentos/admin_upload_holerite.html')
+
+    processamentos = ProcessamentoDocumento.query.filter_by(empresa_id=current_user.empresa_id)\
+        .order_by(ProcessamentoDocumento.id.desc()).limit(PROCESSAMENTOS_RECENTES).all()
+    uploads = Holerite.query.filter(Holerite.empresa_id == current_user.empresa_id, Holerite.user_id.isnot(None))\
+        .order_by(Holerite.enviado_em.desc()).limit(20).all()
+    return render_template('documentos/admin_upload_holerite.html', processamentos=processamentos, uploads=uploads, progresso_json=progresso_json)
+
+@documentos_bp.route('/api/processamentos/<int:id>')
+@login_required
+@permission_required('DOCUMENTOS')
+def status_processamento(id):
+    proc = ProcessamentoDocumento.query.filter_by(id=id, empresa_id=current_user.empresa_id).first_or_404()
+    return jsonify(progresso_json(proc))
+
+@documentos_bp.route('/admin/processamentos/<int:id>/retomar', methods=['POST'])
+@login_required
+@permission_required('DOCUMENTOS')
+def retomar_processamento(id):
+    proc = ProcessamentoDocumento.query.filter_by(id=id, empresa_id=current_user.empresa_id).first_or_404()
+    if proc.status == 'Concluido' or (proc.status == 'Processando' and not esta_parado(proc)):
+        flash("Este processamento não precisa ser retomado.", "warning")
+    else:
+        iniciar_worker(current_app._get_current_object(), proc.id)
+        flash("Processamento retomado. As páginas já gravadas não serão repetidas.", "success")
+    return redirect(url_for('documentos.admin_holerites', processamento=proc.id))
+
+@documentos_bp.cli.command('processar-pendentes')
+@click.option('--empresa', 'slug', default=None, help='Slug de uma empresa específica.')
+def processar_pendentes_cmd(slug):
+    """Retoma as importações de holerites na fila, com erro ou abandonadas (rodar como job se o Cloud Run não mantiver CPU)."""
+    from app.models import Empresa
+    empresa_id = None
+    if slug:
+        empresa = Empresa.query.filter_by(slug=slug).first()
+        if not empresa:
+            click.echo(f"Empresa '{slug}' não encontrada."); return
+        empresa_id = empresa.id
+    ids = retomar_pendentes(current_app._get_current_object(), empresa_id)
+    click.echo(f"{len(ids)} processamento(s) executado(s)" + (f": {ids}" if ids else ""))
+
+@documentos_bp.cli.command('processar-atestados')
+def processar_atestados_cmd():
+    """Lê os atestados parados em 'Processando' (o processo que fazia o OCR caiu)."""
+    ids = retomar_leituras(current_app._get_current_object())
+    click.echo(f"{len(ids)} atestado(s) lido(s)" + (f": {ids}" if ids else ""))
 
 # Adicionado o método GET para permitir a abertura em nova aba no painel Master
 @documentos_bp.route('/baixar/holerite/<int:id>', methods=['GET', 'POST'])
@@ -141,14 +166,12 @@ def baixar_holerite(id):
         flash("Erro ao baixar o arquivo. Arquivo não encontrado no servidor de nuvem.", "error")
         return redirect(url_for('documentos.dashboard_documentos'))
 
-    arquivo_bytes = baixar_bytes_storage(doc.url_arquivo)
-    
     if 'espelhos' in doc.url_arquivo:
         nome_download = f"ponto_{doc.mes_referencia}.pdf"
     else:
         nome_download = f"holerite_{doc.mes_referencia}.pdf"
         
-    if not arquivo_bytes:
+    if not garantir_metadados(doc):
         flash("Falha ao comunicar com o Google Cloud Storage.", "error")
         return redirect(url_for('documentos.dashboard_documentos'))
 
@@ -162,7 +185,7 @@ def baixar_holerite(id):
             user_id=current_user.id,
             documento_id=doc.id,
             tipo_documento=f"{tipo_doc} - {doc.mes_referencia}",
-            hash_arquivo=calcular_hash_arquivo(arquivo_bytes),
+            hash_arquivo=doc.hash_arquivo,
             data_assinatura=get_brasil_time(),
             ip_address=get_client_ip(),
             user_agent=user_agent_info
@@ -170,9 +193,11 @@ def baixar_holerite(id):
         db.session.add(assinatura)
         db.session.commit()
 
-    buffer = io.BytesIO(arquivo_bytes)
-    buffer.seek(0)
-    return send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name=nome_download)
+    resposta = responder_documento(doc, 'application/pdf', nome_download, as_attachment=True)
+    if resposta is None:
+        flash("Falha ao comunicar com o Google Cloud Storage.", "error")
+        return redirect(url_for('documentos.dashboard_documentos'))
+    return resposta
 
 # Adicionado o método GET para permitir a abertura em nova aba no painel Master
 @documentos_bp.route('/baixar/recibo/<int:id>', methods=['GET', 'POST'])
@@ -186,9 +211,7 @@ def baixar_recibo(id):
         flash("Erro: Recibo não encontrado no servidor de nuvem.", "error")
         return redirect(url_for('documentos.dashboard_documentos'))
 
-    arquivo_bytes = baixar_bytes_storage(doc.url_arquivo)
-        
-    if not arquivo_bytes:
+    if not garantir_metadados(doc):
         flash("Falha ao comunicar com o Google Cloud Storage.", "error")
         return redirect(url_for('documentos.dashboard_documentos'))
         
@@ -199,15 +222,17 @@ def baixar_recibo(id):
         assinatura = AssinaturaDigital(
             user_id=current_user.id, documento_id=doc.id,
             tipo_documento=f"Recibo - R$ {doc.valor}",
-            hash_arquivo=calcular_hash_arquivo(arquivo_bytes),
+            hash_arquivo=doc.hash_arquivo,
             data_assinatura=get_brasil_time(), ip_address=get_client_ip(), user_agent=user_agent_info
         )
         db.session.add(assinatura)
         db.session.commit()
 
-    buffer = io.BytesIO(arquivo_bytes)
-    buffer.seek(0)
-    return send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name=f"recibo_{id}.pdf")
+    resposta = responder_documento(doc, 'application/pdf', f"recibo_{id}.pdf", as_attachment=True)
+    if resposta is None:
+        flash("Falha ao comunicar com o Google Cloud Storage.", "error")
+        return redirect(url_for('documentos.dashboard_documentos'))
+    return resposta
 
 @documentos_bp.route('/meus-documentos')
 @login_required
@@ -270,8 +295,9 @@ def novo_recibo():
         u = User.query.get(request.form.get('user_id'))
         r = Recibo(user_id=u.id, valor=float(request.form.get('valor', 0)), data_pagamento=get_brasil_time().date())
         pdf_bytes = gerar_pdf_recibo(r, u)
+        r.hash_arquivo, r.tamanho_arquivo = calcular_hash_arquivo(pdf_bytes), len(pdf_bytes)
         mes_ref = get_brasil_time().strftime('%Y-%m')
-        caminho_blob = salvar_no_storage(pdf_bytes, f"recibos/{mes_ref}")
+        caminho_blob = salvar_no_storage(pdf_bytes, f"recibos/{mes_ref}", r.hash_arquivo)
         r.url_arquivo = caminho_blob
         db.session.add(r); db.session.commit()
         
@@ -286,24 +312,16 @@ def novo_recibo():
 @permission_required('DOCUMENTOS')
 def disparar_espelhos():
     mes = request.form.get('mes_ref')
-    users = User.query.filter(User.username != '12345678900').all()
-    sucessos = 0
-    
-    for u in users:
-        try:
-            pdf_bytes = gerar_pdf_espelho_mensal(u, mes)
-            caminho_blob = salvar_no_storage(pdf_bytes, f"espelhos/{mes}")
-            db.session.add(Holerite(user_id=u.id, mes_referencia=mes, url_arquivo=caminho_blob, status='Enviado', enviado_em=get_brasil_time()))
-            
-            enviar_notificacao(u.id, f"Seu Espelho de Ponto ({mes}) está disponível para validação.", "/documentos/meus-documentos")
-            
-            sucessos += 1
-        except Exception as e:
-            print(f"Erro ao gerar espelho para {u.real_name}: {e}")
-            
-    db.session.commit()
-    flash(f'Processamento concluído. {sucessos} espelhos gerados com sucesso!', 'success')
-    return redirect(url_for('documentos.dashboard_documentos'))
+    try:
+        datetime.strptime(mes or '', '%Y-%m')
+    except ValueError:
+        flash('Informe o mês de referência.', 'error')
+        return redirect(url_for('documentos.dashboard_documentos'))
+
+    # Apuração, PDFs, uploads e avisos rodam em segundo plano, em lotes retomáveis
+    proc = enfileirar_espelhos(current_app._get_current_object(), current_user.empresa_id, current_user.id, mes)
+    flash(f'Publicação dos espelhos de {mes} iniciada. Acompanhe o progresso abaixo.', 'success')
+    return redirect(url_for('documentos.admin_holerites', processamento=proc.id))
 
 @documentos_bp.route('/api/user-info/<int:id>')
 @login_required
@@ -355,26 +373,26 @@ def enviar_atestado():
             return redirect(request.url)
         try:
             file_bytes = file.read()
+            hash_arquivo = calcular_hash_arquivo(file_bytes)
+            # O mesmo arquivo reenviado (toque duplo, nova tentativa no celular) não abre outra análise
+            repetido = Atestado.query.filter(Atestado.user_id == current_user.id, Atestado.hash_arquivo == hash_arquivo,
+                                             Atestado.status != 'Recusado').first()
+            if repetido:
+                flash('Este atestado já foi enviado e está com o RH.', 'warning')
+                return redirect(url_for('documentos.meus_atestados'))
             mes_ref = get_brasil_time().strftime('%Y-%m')
-            caminho_blob = salvar_no_storage(file_bytes, f"atestados/{mes_ref}")
+            caminho_blob = salvar_no_storage(file_bytes, f"atestados/{mes_ref}", hash_arquivo)
             if not caminho_blob: return redirect(request.url)
 
-            dados_ia = analisar_atestado_vision(file_bytes, current_user.real_name)
-            
-            data_inicio_db = datetime.strptime(dados_ia['data_inicio'], '%Y-%m-%d').date() if dados_ia['data_inicio'] else None
-
+            # O OCR roda em segundo plano: o celular não espera o serviço externo
             novo_atestado = Atestado(
                 user_id=current_user.id, data_envio=get_brasil_time(), url_arquivo=caminho_blob,
-                data_inicio_afastamento=data_inicio_db, quantidade_dias=dados_ia['dias_afastamento'],
-                texto_extraido=dados_ia['texto_bruto'], status='Revisao' 
+                hash_arquivo=hash_arquivo, tamanho_arquivo=len(file_bytes), status='Processando'
             )
             db.session.add(novo_atestado); db.session.commit()
+            enfileirar_leitura(current_app._get_current_object(), novo_atestado.id, file_bytes)
             
-            master = User.query.filter_by(username='50097952800').first()
-            if master:
-                enviar_notificacao(master.id, f"Novo Atestado de {current_user.real_name} aguardando análise.", "/documentos/admin/atestados")
-            
-            flash('Atestado enviado com sucesso para o RH!', 'success')
+            flash('Atestado enviado com sucesso para o RH! A leitura automática termina em instantes.', 'success')
             return redirect(url_for('documentos.meus_atestados'))
             
         except Exception as e:
@@ -396,19 +414,33 @@ def baixar_atestado(id):
     atestado = Atestado.query.get_or_404(id)
     if not has_permission('DOCUMENTOS') and atestado.user_id != current_user.id: return redirect(url_for('main.dashboard'))
     
-    if atestado.url_arquivo:
-        arquivo_bytes = baixar_bytes_storage(atestado.url_arquivo)
-        if arquivo_bytes:
-            ext = 'pdf' if 'pdf' in atestado.url_arquivo.lower() else 'jpeg'
-            mimetype = 'application/pdf' if ext == 'pdf' else f'image/{ext}'
-            
-            buffer = io.BytesIO(arquivo_bytes)
-            buffer.seek(0)
-            
-            return send_file(buffer, mimetype=mimetype, as_attachment=False, download_name=f"atestado_{id}.{ext}")
+    if atestado.url_arquivo and garantir_metadados(atestado):
+        ext = 'pdf' if 'pdf' in atestado.url_arquivo.lower() else 'jpeg'
+        mimetype = 'application/pdf' if ext == 'pdf' else f'image/{ext}'
+        resposta = responder_documento(atestado, mimetype, f"atestado_{id}.{ext}", as_attachment=False)
+        if resposta is not None: return resposta
             
     return redirect(request.referrer or url_for('main.dashboard'))
 
+@documentos_bp.route('/api/atestados/<int:id>/status')
+@login_required
+def status_atestado(id):
+    atestado = Atestado.query.get_or_404(id)
+    if not has_permission('DOCUMENTOS') and atestado.user_id != current_user.id: abort(403)
+    # Leitura que ficou para trás (processo reiniciado): quem acompanha a tela a põe de volta na fila
+    if leitura_parada(atestado): enfileirar_leitura(current_app._get_current_object(), atestado.id)
+    return jsonify(status_atestado_json(atestado))
+
+@documentos_bp.route('/arquivo/<token>')
+def arquivo_assinado(token):
+    """Link temporário do driver local (modo de download direto): o token assinado já é a autorização."""
+    lido = ler_token(token)
+    if lido is None: abort(403)
+    arquivo, mimetype, download_name, as_attachment = lido
+    resposta = responder_documento(arquivo, mimetype, download_name, as_attachment, redirecionar=False)
+    if resposta is None: abort(404)
+    return resposta
+
 @documentos_bp.route('/admin/atestados/<int:id>/avaliar', methods=['POST'])
 @login_required
 @permission_required('DOCUMENTOS')
@@ -425,17 +457,8 @@ def avaliar_atestado(id):
             atestado.quantidade_dias = int(qtd_dias_str)
             atestado.status = 'Aprovado'
             
-            for i in range(atestado.quantidade_dias):
-                dia_atual = atestado.data_inicio_afastamento + timedelta(days=i)
-                ponto = PontoResumo.query.filter_by(user_id=atestado.user_id, data_referencia=dia_atual).first()
-                if ponto:
-                    ponto.status_dia = 'Atestado'
-                    ponto.minutos_esperados = 0
-                    ponto.minutos_saldo = ponto.minutos_trabalhados
-                else:
-                    novo_ponto = PontoResumo(user_id=atestado.user_id, data_referencia=dia_atual, minutos_trabalhados=0, minutos_esperados=0, minutos_saldo=0, status_dia='Atestado')
-                    db.session.add(novo_ponto)
-                    
+            fim = atestado.data_inicio_afastamento + timedelta(days=atestado.quantidade_dias - 1)
+            marcar_ausencia([atestado.user_id], atestado.data_inicio_afastamento, fim, 'Atestado')
             enviar_notificacao(atestado.user_id, "O seu Atestado foi recebido e APROVADO com sucesso.", "/documentos/atestados/meus")
             
         elif acao == 'recusar':
@@ -477,23 +500,17 @@ def exportar_relatorio_folha():
         data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
         data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
         
-        usuarios = User.query.filter(User.username != '12345678900', User.username != 'terminal').order_by(User.real_name).all()
+        # Apuração da empresa inteira no período, de uma vez (matriz colaboradores × dias)
+        apuracao = apurar_empresa(current_user.empresa_id, data_inicio, data_fim)
+        totais = apuracao.totais()
+        atestados = apuracao.contar('Atestado')
         
         dados_relatorio = []
         
-        for u in usuarios:
-            pontos = PontoResumo.query.filter(
-                PontoResumo.user_id == u.id,
-                PontoResumo.data_referencia >= data_inicio,
-                PontoResumo.data_referencia <= data_fim
-            ).all()
-            
-            total_esperado = sum(p.minutos_esperados for p in pontos)
-            total_trabalhado = sum(p.minutos_trabalhados for p in pontos)
-            saldo = total_trabalhado - total_esperado
-            
-            faltas = sum(1 for p in pontos if p.status_dia == 'Falta')
-            atestados = sum(1 for p in pontos if p.status_dia == 'Atestado')
+        for i, u in enumerate(apuracao.usuarios):
+            total_esperado = int(totais['esperado'][i])
+            total_trabalhado = int(totais['trabalhado'][i])
+            saldo = int(totais['saldo'][i])
             
             sinal = "+" if saldo >= 0 else "-"
             saldo_str = f"{sinal}{format_minutes_to_hm(abs(saldo))}"
@@ -506,8 +523,8 @@ def exportar_relatorio_folha():
                 'Total Horas Esperadas': format_minutes_to_hm(total_esperado),
                 'Total Horas Realizadas': format_minutes_to_hm(total_trabalhado),
                 'Saldo Extra / Débito': saldo_str,
-                'Total Faltas (Dias)': faltas,
-                'Atestados (Dias)': atestados
+                'Total Faltas (Dias)': int(totais['faltas'][i]),
+                'Atestados (Dias)': int(atestados[i])
             })
             
         if not dados_relatorio:
@@ -1,43 +1,293 @@
-from google.cloud import storage
+import hashlib
+import os
+import shutil
+import threading
+import time
 import uuid
-import io
+from collections import OrderedDict
+from datetime import timedelta
+
+# SDK do Google opcional: sem ele (dev, testes, benchmarks) usa-se o driver local
+try:
+    from google.cloud import storage
+    from google.api_core.exceptions import NotFound
+    from google.auth.transport.requests import Request as GoogleRequest
+except ImportError:
+    storage = None
+    NotFound = None
+    GoogleRequest = None
+
+# ==============================================================================
+# 🗄️ ARMAZENAMENTO DOS DOCUMENTOS (GCS OU DISCO LOCAL) + CACHE DE LEITURA
+# Um backend por processo, escolhido por STORAGE_BACKEND ('gcs' em produção,
+# 'local' com STORAGE_LOCAL_DIR para dev/testes/benchmarks). O cliente do GCS é
+# criado uma vez e reaproveitado por todas as threads (ele é thread-safe e mantém
+# o pool de conexões HTTP). O nome de cada objeto é o SHA-256 do conteúdo
+# (endereçamento por conteúdo): reenviar o mesmo arquivo cai no mesmo objeto e
+# um nome nunca muda de conteúdo, então os lidos recentemente ficam num cache LRU
+# limitado em bytes: no dia do pagamento, reabrir o mesmo holerite não volta ao bucket.
+# ==============================================================================
 
 # NOVO BUCKET GRATUITO NOS EUA
-BUCKET_NAME = "shahin-docs-us"
+BUCKET_NAME = os.environ.get('STORAGE_BUCKET', "shahin-docs-us")
+
+CACHE_MAX_BYTES = int(os.environ.get('STORAGE_CACHE_MB', 64)) * 1024 * 1024
+# Objetos maiores que isso (PDF original da folha, por exemplo) não entram no cache
+CACHE_MAX_OBJETO = int(os.environ.get('STORAGE_CACHE_OBJETO_MB', 4)) * 1024 * 1024
+# Tamanho de cada pedaço nas leituras em streaming (download para o navegador)
+TAMANHO_BLOCO = 256 * 1024
+# Links assinados guardados: um link novo só quando o guardado já passou da metade da validade
+MAX_URLS_GUARDADAS = 2000
+
+class CacheLRU:
+    """Cache de bytes por nome do objeto, limitado pelo total de bytes."""
+    def __init__(self, max_bytes, max_objeto):
+        self.max_bytes, self.max_objeto = max_bytes, max_objeto
+        self._itens = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            dados = self._itens.get(chave)
+            if dados is not None: self._itens.move_to_end(chave)
+            return dados
+
+    def guardar(self, chave, dados):
+        if not dados or len(dados) > self.max_objeto: return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None: self._total -= len(antigo)
+            self._itens[chave] = dados
+            self._total += len(dados)
+            while self._total > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._total -= len(removido)
+
+    def descartar(self, chave):
+        with self._lock:
+            dados = self._itens.pop(chave, None)
+            if dados is not None: self._total -= len(dados)
+
+class ArmazenamentoGCS:
+    def __init__(self, bucket_name):
+        if storage is None:
+            raise RuntimeError("Biblioteca 'google-cloud-storage' não instalada. Use STORAGE_BACKEND=local.")
+        self._client = storage.Client()
+        self._bucket = self._client.bucket(bucket_name)
+        self._credenciais_lock = threading.Lock()
+
+    def salvar(self, dados, nome_blob, content_type):
+        self._bucket.blob(nome_blob).upload_from_string(dados, content_type=content_type)
+
+    def salvar_arquivo(self, arquivo, nome_blob, content_type):
+        self._bucket.blob(nome_blob).upload_from_file(arquivo, content_type=content_type)
+
+    def baixar(self, nome_blob):
+        """Bytes do objeto ou None. Uma ida ao bucket: o 404 vem da própria leitura, sem exists() antes."""
+        try:
+            return self._bucket.blob(nome_blob).download_as_bytes()
+        except NotFound:
+            return None
+
+    def baixar_para(self, nome_blob, destino):
+        try:
+            self._bucket.blob(nome_blob).download_to_file(destino)
+            return True
+        except NotFound:
+            return False
+
+    def ler_intervalo(self, nome_blob, inicio, fim):
+        """Bytes [inicio, fim) em pedaços, cada um com um GET de Range no bucket."""
+        blob = self._bucket.blob(nome_blob)
+        for posicao in range(inicio, fim, TAMANHO_BLOCO):
+            try:
+                yield blob.download_as_bytes(start=posicao, end=min(posicao + TAMANHO_BLOCO, fim) - 1)
+            except NotFound:
+                return
+
+    def url_assinada(self, nome_blob, segundos, content_type, disposicao):
+        """URL V4 de leitura direta no bucket, com o tipo e o Content-Disposition da resposta fixados."""
+        credenciais = self._client._credentials
+        extra = {}
+        # No Cloud Run não há chave privada: a assinatura vai pela API IAM (signBlob) com o token da conta de serviço
+        if not hasattr(credenciais, 'signer'):
+            with self._credenciais_lock:
+                if not credenciais.valid: credenciais.refresh(GoogleRequest())
+            extra = {'service_account_email': credenciais.service_account_email, 'access_token': credenciais.token}
+        return self._bucket.blob(nome_blob).generate_signed_url(
+            version='v4', method='GET', expiration=timedelta(seconds=segundos),
+            response_type=content_type, response_disposition=disposicao, **extra)
+
+class ArmazenamentoLocal:
+    """Mesmos nomes de objeto do bucket, como arquivos abaixo de `raiz`."""
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        os.makedirs(self.raiz, exist_ok=True)
+
+    def _caminho(self, nome_blob):
+        caminho = os.path.abspath(os.path.join(self.raiz, nome_blob))
+        if not caminho.startswith(self.raiz + os.sep):
+            raise ValueError(f"Nome de objeto inválido: {nome_blob}")
+        return caminho
+
+    def _gravar(self, nome_blob, escrever):
+        caminho = self._caminho(nome_blob)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Grava ao lado e renomeia: um leitor nunca vê o arquivo pela metade
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        with open(temporario, 'wb') as f: escrever(f)
+        os.replace(temporario, caminho)
+
+    def salvar(self, dados, nome_blob, content_type):
+        self._gravar(nome_blob, lambda f: f.write(dados))
+
+    def salvar_arquivo(self, arquivo, nome_blob, content_type):
+        self._gravar(nome_blob, lambda f: shutil.copyfileobj(arquivo, f, 1024 * 1024))
+
+    def baixar(self, nome_blob):
+        try:
+            with open(self._caminho(nome_blob), 'rb') as f: return f.read()
+        except FileNotFoundError:
+            return None
+
+    def baixar_para(self, nome_blob, destino):
+        try:
+            with open(self._caminho(nome_blob), 'rb') as f: shutil.copyfileobj(f, destino, 1024 * 1024)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def ler_intervalo(self, nome_blob, inicio, fim):
+        try:
+            f = open(self._caminho(nome_blob), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(inicio)
+            restante = fim - inicio
+            while restante > 0:
+                bloco = f.read(min(TAMANHO_BLOCO, restante))
+                if not bloco: return
+                restante -= len(bloco)
+                yield bloco
+
+_backend = None
+_backend_lock = threading.Lock()
+_cache = CacheLRU(CACHE_MAX_BYTES, CACHE_MAX_OBJETO)
 
-def salvar_no_storage(pdf_bytes, pasta_ref):
+def obter_armazenamento():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if os.environ.get('STORAGE_BACKEND', 'gcs') == 'local':
+                    _backend = ArmazenamentoLocal(os.environ.get('STORAGE_LOCAL_DIR', 'instance/storage'))
+                else:
+                    _backend = ArmazenamentoGCS(BUCKET_NAME)
+    return _backend
+
+def hash_do_stream(arquivo):
+    """SHA-256 e tamanho de um stream lido em blocos (volta ao início no fim)."""
+    arquivo.seek(0)
+    sha, tamanho = hashlib.sha256(), 0
+    for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+        sha.update(bloco)
+        tamanho += len(bloco)
+    arquivo.seek(0)
+    return sha.hexdigest(), tamanho
+
+def salvar_no_storage(pdf_bytes, pasta_ref, hash_arquivo=None):
     """Salva o PDF no bucket e retorna o caminho relativo."""
     try:
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-        # O arquivo será salvo com a estrutura: pasta_ref/uuid.pdf
-        nome_blob = f"{pasta_ref}/{uuid.uuid4()}.pdf"
-        blob = bucket.blob(nome_blob)
-        blob.upload_from_string(pdf_bytes, content_type='application/pdf')
+        # O arquivo será salvo com a estrutura: pasta_ref/sha256.pdf
+        nome_blob = f"{pasta_ref}/{hash_arquivo or hashlib.sha256(pdf_bytes).hexdigest()}.pdf"
+        obter_armazenamento().salvar(pdf_bytes, nome_blob, 'application/pdf')
         return nome_blob
     except Exception as e:
         print(f"Erro no Cloud Storage Upload: {e}")
         return None
 
+def salvar_arquivo_no_storage(arquivo, pasta_ref, hash_arquivo=None):
+    """Como salvar_no_storage, mas envia a partir de um stream (upload em disco) sem lê-lo inteiro."""
+    try:
+        nome_blob = f"{pasta_ref}/{hash_arquivo or hash_do_stream(arquivo)[0]}.pdf"
+        arquivo.seek(0)
+        obter_armazenamento().salvar_arquivo(arquivo, nome_blob, 'application/pdf')
+        return nome_blob
+    except Exception as e:
+        print(f"Erro no Cloud Storage Upload: {e}")
+        return None
+
+def baixar_para_arquivo(caminho_blob, destino):
+    """Baixa o blob direto para um arquivo aberto (sem passar por bytes na memória). Retorna True/False."""
+    try:
+        return obter_armazenamento().baixar_para(caminho_blob, destino)
+    except Exception as e:
+        print(f"Erro ao baixar do Storage: {e}")
+        return False
+
 def baixar_bytes_storage(caminho_blob):
     """
     Baixa o arquivo do Storage para a memória do servidor.
     Isso evita problemas de Link Assinado/Chave Privada no Cloud Run.
     """
+    if not caminho_blob: return None
+    dados = _cache.obter(caminho_blob)
+    if dados is not None: return dados
     try:
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-        blob = bucket.blob(caminho_blob)
-        
-        if not blob.exists():
-            return None
-            
-        return blob.download_as_bytes()
+        dados = obter_armazenamento().baixar(caminho_blob)
     except Exception as e:
         print(f"Erro ao baixar do Storage: {e}")
         return None
+    if dados is not None: _cache.guardar(caminho_blob, dados)
+    return dados
 
-# Função legada mantida para compatibilidade, mas não será usada preferencialmente
-def gerar_url_assinada(caminho_blob):
-    return None
+def ler_em_blocos(caminho_blob, inicio, fim, tamanho_total=None):
+    """
+    Gera os bytes [inicio, fim) do objeto em pedaços, sem montar o arquivo inteiro numa resposta.
+    Objetos pequenos (o holerite de uma página) são baixados inteiros uma vez e servidos do
+    cache nas próximas leituras; os grandes vão direto do backend, só no intervalo pedido.
+    """
+    dados = _cache.obter(caminho_blob)
+    if dados is None and tamanho_total is not None and tamanho_total <= CACHE_MAX_OBJETO:
+        dados = baixar_bytes_storage(caminho_blob)
+        if dados is None: return
+    if dados is not None:
+        visao = memoryview(dados)
+        for posicao in range(inicio, fim, TAMANHO_BLOCO):
+            yield bytes(visao[posicao:min(posicao + TAMANHO_BLOCO, fim)])
+        return
+    try:
+        yield from obter_armazenamento().ler_intervalo(caminho_blob, inicio, fim)
+    except Exception as e:
+        print(f"Erro ao baixar do Storage: {e}")
+
+_urls = {}
+_urls_lock = threading.Lock()
 
+def assina_urls():
+    """O backend entrega o arquivo sem passar pelo servidor (GCS). No driver local quem assina é o app."""
+    return hasattr(obter_armazenamento(), 'url_assinada')
+
+def gerar_url_assinada(caminho_blob, segundos=300, content_type='application/pdf', disposicao=None):
+    """
+    Link temporário de leitura direta no bucket, ou None (backend sem assinatura ou falha: o
+    chamador serve o arquivo ele mesmo). Cada assinatura no Cloud Run é uma chamada à API IAM,
+    então o link é reaproveitado enquanto ainda tiver mais da metade da validade.
+    """
+    backend = obter_armazenamento()
+    if not caminho_blob or not hasattr(backend, 'url_assinada'): return None
+    chave, agora = (caminho_blob, content_type, disposicao), time.monotonic()
+    with _urls_lock:
+        guardada = _urls.get(chave)
+    if guardada and guardada[1] - agora > segundos / 2: return guardada[0]
+    try:
+        url = backend.url_assinada(caminho_blob, segundos, content_type, disposicao)
+    except Exception as e:
+        print(f"Erro ao assinar URL do Storage: {e}")
+        return None
+    with _urls_lock:
+        if len(_urls) >= MAX_URLS_GUARDADAS: _urls.clear()
+        _urls[chave] = (url, agora + segundos)
+    return url
@@ -4,9 +4,8 @@ from reportlab.lib.units import cm
 from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
 import io
-import calendar
-from datetime import date, timedelta, datetime
-from app.utils import data_por_extenso, time_to_minutes, format_minutes_to_hm
+from datetime import datetime
+from app.utils import data_por_extenso, format_minutes_to_hm, get_brasil_time
 
 def gerar_pdf_recibo(recibo, user):
     buffer = io.BytesIO()
@@ -80,68 +79,67 @@ def gerar_pdf_recibo(recibo, user):
     buffer.seek(0)
     return buffer.read()
 
-def gerar_pdf_espelho_mensal(user, mes_ano_str):
-    from app.models import PontoRegistro, PontoResumo
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    
+def gerar_pdf_espelho_mensal(user, mes_ano_str, apuracao=None):
+    from app.ponto.apuracao import apurar_periodo
+    from app.ponto.espelho import intervalo_do_mes
     try: ano, mes = map(int, mes_ano_str.split('-'))
     except: now = datetime.now(); ano, mes = now.year, now.month
 
+    # Lotes (disparo para a empresa toda) passam a apuração do mês já calculada
+    if apuracao is None: apuracao = apurar_periodo([user], *intervalo_do_mes(ano, mes))
+    return desenhar_pdf_espelho(dados_espelho(user, apuracao, ano, mes))
+
+def dados_espelho(user, apuracao, ano, mes):
+    """Tudo que o PDF do espelho precisa, em tipos simples (vai por pickle para os processos de renderização)."""
+    i = apuracao.indice(user.id)
+    dias = []
+    for j, dt_atual in enumerate(apuracao.dias()):
+        abonado = bool(apuracao.abonado[i, j])
+        dias.append((dt_atual, int(apuracao.trabalhado[i, j]), int(apuracao.saldo[i, j]), apuracao.rotulo(i, j),
+                     abonado, [] if abonado else apuracao.horarios(i, j)))
+    return {
+        'user_id': user.id, 'ano': ano, 'mes': mes, 'real_name': user.real_name, 'role': user.role,
+        'empresa': user.razao_social_empregadora or "SHAHIN GESTÃO", 'cnpj': user.cnpj_empregador or "",
+        'dias': dias, 'total_saldo': int(apuracao.saldo[i].sum()),
+        # Corte da apuração (dias futuros ficam de fora): o rodapé depende dele, não do relógio
+        'apurado_ate': min(apuracao.fim, get_brasil_time().date()),
+    }
+
+def desenhar_pdf_espelho(dados):
+    """
+    Só ReportLab: sem banco nem contexto Flask. Os mesmos dados geram os mesmos bytes
+    (invariant: sem data de criação nem id aleatório), então o hash do envio acusa a repetição.
+    """
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    width, height = A4
+    ano, mes = dados['ano'], dados['mes']
+
     p.setFont("Helvetica-Bold", 16)
     p.drawString(2*cm, height - 2*cm, "ESPELHO DE PONTO ELETRÔNICO")
     
     p.setFont("Helvetica", 10)
-    p.drawString(2*cm, height - 3*cm, f"Colaborador: {user.real_name}")
-    p.drawString(2*cm, height - 3.5*cm, f"Cargo: {user.role}")
+    p.drawString(2*cm, height - 3*cm, f"Colaborador: {dados['real_name']}")
+    p.drawString(2*cm, height - 3.5*cm, f"Cargo: {dados['role']}")
     p.drawString(12*cm, height - 3*cm, f"Período: {mes}/{ano}")
+    p.drawString(2*cm, height - 4*cm, f"Empresa: {dados['empresa']} - CNPJ: {dados['cnpj']}")
     
-    empresa = user.razao_social_empregadora or "SHAHIN GESTÃO"
-    cnpj = user.cnpj_empregador or ""
-    p.drawString(2*cm, height - 4*cm, f"Empresa: {empresa} - CNPJ: {cnpj}")
-    
-    dados = [['Data', 'Dia', 'Entradas / Saídas', 'Jornada', 'Saldo', 'Status']]
-    last_day = calendar.monthrange(ano, mes)[1]
-    total_saldo_min = 0
+    tabela = [['Data', 'Dia', 'Entradas / Saídas', 'Jornada', 'Saldo', 'Status']]
     dias_semana = {0:'Seg', 1:'Ter', 2:'Qua', 3:'Qui', 4:'Sex', 5:'Sáb', 6:'Dom'}
+    rotulos_pdf = {'Incompleto': 'Inc.', 'Hora Extra': '+ Extra'}
     
-    for dia in range(1, last_day + 1):
-        dt_atual = date(ano, mes, dia)
-        pontos = PontoRegistro.query.filter_by(user_id=user.id, data_registro=dt_atual).order_by(PontoRegistro.hora_registro).all()
-        horarios_str = "  ".join([pt.hora_registro.strftime('%H:%M') for pt in pontos])
-        resumo_dia = PontoResumo.query.filter_by(user_id=user.id, data_referencia=dt_atual).first()
-        
-        meta = user.carga_horaria or 528
-        if user.escala == '5x2' and dt_atual.weekday() >= 5: meta = 0
-        elif user.escala == '12x36' and user.data_inicio_escala:
-            if (dt_atual - user.data_inicio_escala).days % 2 != 0: meta = 0
-            else: meta = 720
-            
-        trabalhado = 0
-        for i in range(0, len(pontos), 2):
-            if i+1 < len(pontos): trabalhado += (time_to_minutes(pontos[i+1].hora_registro) - time_to_minutes(pontos[i].hora_registro))
-        
-        saldo = trabalhado - meta
-        status_abonados = ['Atestado', 'Férias', 'Licença', 'Folga Prêmio', 'Ferias', 'Licenca', 'Folga Premio']
-        
-        if resumo_dia and resumo_dia.status_dia in status_abonados:
-            horarios_str = str(resumo_dia.status_dia).upper() 
-            trabalhado = 0
-            saldo = 0  
+    for dt_atual, trabalhado, saldo, status, abonado, horarios in dados['dias']:
+        if abonado:
+            horarios_str = status.upper()
             status = "Abono"
         else:
-            status = "OK"
-            if not pontos: status = "Folga" if meta == 0 else "Falta"
-            elif len(pontos) % 2 != 0: status = "Inc."
-            elif saldo > 10: status = "+ Extra"
-            elif saldo < -10: status = "Débito" if meta > 0 else "Extra"
+            horarios_str = "  ".join(horarios)
+            status = rotulos_pdf.get(status, status)
 
-        total_saldo_min += saldo
-        dados.append([dt_atual.strftime('%d/%m'), dias_semana[dt_atual.weekday()], horarios_str, format_minutes_to_hm(trabalhado).replace('-', ''), format_minutes_to_hm(saldo), status])
+        tabela.append([dt_atual.strftime('%d/%m'), dias_semana[dt_atual.weekday()], horarios_str, format_minutes_to_hm(trabalhado).replace('-', ''), format_minutes_to_hm(saldo), status])
     
-    dados.append(['', '', 'TOTAL MENSAL', '', format_minutes_to_hm(total_saldo_min), ''])
-    t = Table(dados, colWidths=[2*cm, 1.5*cm, 6*cm, 2*cm, 2*cm, 2.5*cm])
+    tabela.append(['', '', 'TOTAL MENSAL', '', format_minutes_to_hm(dados['total_saldo']), ''])
+    t = Table(tabela, colWidths=[2*cm, 1.5*cm, 6*cm, 2*cm, 2*cm, 2.5*cm])
     t.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,0), colors.navy), ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke), ('ALIGN', (0,0), (-1,-1), 'CENTER'), ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), ('FONTSIZE', (0,0), (-1,0), 9), ('BOTTOMPADDING', (0,0), (-1,0), 8), ('BACKGROUND', (0,-1), (-1,-1), colors.lightgrey), ('GRID', (0,0), (-1,-1), 0.5, colors.grey), ('FONTSIZE', (0,1), (-1,-1), 8)]))
     w, h = t.wrapOn(p, width, height)
     t.drawOn(p, 2*cm, height - 6*cm - h)
@@ -152,7 +150,7 @@ def gerar_pdf_espelho_mensal(user, mes_ano_str):
     p.drawString(3*cm, y_ass - 0.5*cm, "Assinatura do Colaborador")
     p.line(12*cm, y_ass, 19*cm, y_ass)
     p.drawString(13*cm, y_ass - 0.5*cm, "Gestor Responsável")
-    p.drawString(2*cm, 1.5*cm, f"Documento gerado eletronicamente em {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    p.drawString(2*cm, 1.5*cm, f"Documento gerado eletronicamente com a apuração até {dados['apurado_ate'].strftime('%d/%m/%Y')}")
 
     p.showPage()
     p.save()
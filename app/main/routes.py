@@ -1,10 +1,11 @@
-from flask import render_template, redirect, url_for, jsonify, request
+from flask import render_template, redirect, url_for, jsonify, request, g
 from flask_login import login_required, current_user
 from app.extensions import db
 from app.models import User, PontoAjuste, Recibo, Holerite, PreCadastro, Notificacao, PontoResumo, PontoRegistro, HistoricoSaida, PushSubscription
 from app.utils import get_brasil_time, has_permission
+from app.ponto.apuracao import apurar_empresa
 from datetime import timedelta
-from sqlalchemy import func
+from sqlalchemy import func, case
 import traceback
 import json
 
@@ -112,19 +113,27 @@ def api_analytics():
         sete_dias_atras = hoje - timedelta(days=6)
         primeiro_dia_mes = hoje.replace(day=1)
 
+        # Resumos só da empresa logada: filtro (empresa_id, data) usa o índice ix_ponto_resumo_empresa_data
+        resumos_empresa = PontoResumo.empresa_id == g.empresa_id
+
         # 1. Raio-X da Operação Hoje (Donut)
-        ponto_hoje = db.session.query(PontoResumo.status_dia, func.count(PontoResumo.id)).filter(PontoResumo.data_referencia == hoje).group_by(PontoResumo.status_dia).all()
+        ponto_hoje = db.session.query(PontoResumo.status_dia, func.count(PontoResumo.id)).filter(resumos_empresa, PontoResumo.data_referencia == hoje).group_by(PontoResumo.status_dia).all()
         raio_x = {status: qtd for status, qtd in ponto_hoje}
         
-        # 2. Termômetro de Risco (Linhas: Faltas vs Horas Extras nos últimos 7 dias)
+        # 2. Termômetro de Risco (Linhas: Faltas vs Horas Extras nos últimos 7 dias) - uma consulta agrupada por dia
         dias_labels = [(sete_dias_atras + timedelta(days=i)).strftime('%d/%m') for i in range(7)]
+        por_dia = {dia: (faltas or 0, extras or 0) for dia, faltas, extras in db.session.query(
+            PontoResumo.data_referencia,
+            func.sum(case((PontoResumo.status_dia == 'Falta', 1), else_=0)),
+            func.sum(case((PontoResumo.minutos_saldo > 0, PontoResumo.minutos_saldo), else_=0))
+        ).filter(
+            resumos_empresa, PontoResumo.data_referencia >= sete_dias_atras, PontoResumo.data_referencia <= hoje
+        ).group_by(PontoResumo.data_referencia).all()}
         risco_faltas = []
         risco_extras = []
         for i in range(7):
-            dia_alvo = sete_dias_atras + timedelta(days=i)
-            faltas = PontoResumo.query.filter(PontoResumo.data_referencia == dia_alvo, PontoResumo.status_dia == 'Falta').count()
-            extras_min = db.session.query(func.sum(PontoResumo.minutos_saldo)).filter(PontoResumo.data_referencia == dia_alvo, PontoResumo.minutos_saldo > 0).scalar() or 0
-            risco_faltas.append(faltas)
+            faltas, extras_min = por_dia.get(sete_dias_atras + timedelta(days=i), (0, 0))
+            risco_faltas.append(int(faltas))
             risco_extras.append(round(extras_min / 60, 1))
 
         # 3. Termômetro de Custos (Barras: EPI por Depto no mês atual)
@@ -145,10 +154,13 @@ def api_analytics():
         lidos_docs = lid_holerites + lid_recibos
         taxa_assinatura = round((lidos_docs / total_docs * 100) if total_docs > 0 else 100, 1)
 
-        # 5. Radar de Pontualidade (Barras Empilhadas: Atrasos no Mês)
-        pontual = PontoResumo.query.filter(PontoResumo.data_referencia >= primeiro_dia_mes, PontoResumo.minutos_saldo >= 0).count()
-        atraso_leve = PontoResumo.query.filter(PontoResumo.data_referencia >= primeiro_dia_mes, PontoResumo.minutos_saldo < 0, PontoResumo.minutos_saldo >= -15).count()
-        atraso_critico = PontoResumo.query.filter(PontoResumo.data_referencia >= primeiro_dia_mes, PontoResumo.minutos_saldo < -15).count()
+        # 5. Radar de Pontualidade (Barras Empilhadas: Atrasos no Mês) - apuração vetorizada do mês até hoje
+        # Só dias com meta e com batida: folga e dia sem escala não são "pontuais"
+        apuracao = apurar_empresa(g.empresa_id, primeiro_dia_mes, hoje, hoje)
+        saldos = apuracao.saldo[apuracao.apurado & (apuracao.meta > 0) & (apuracao.qtd_batidas > 0)]
+        pontual = int((saldos >= 0).sum())
+        atraso_leve = int(((saldos < 0) & (saldos >= -15)).sum())
+        atraso_critico = int((saldos < -15).sum())
 
         return jsonify({
             'raio_x': raio_x,
@@ -242,9 +254,149 @@ def vortice_migrar():
             except Exception as inner_e:
                 print(f"Aviso ao alterar a tabela {tabela}: {inner_e}")
                 pass # Ignora se a tabela não existir
-        
+
         db.session.commit()
 
+        # 1.6. UM RESUMO POR DIA: remove duplicados antigos (fica o mais recente) e cria a chave única do UPSERT
+        try:
+            db.session.execute(text("""
+                DELETE FROM ponto_resumos a USING ponto_resumos b
+                WHERE a.user_id = b.user_id AND a.data_referencia = b.data_referencia AND a.id < b.id;
+            """))
+            db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_ponto_resumo_user_dia ON ponto_resumos (user_id, data_referencia);"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar a chave única de ponto_resumos: {inner_e}")
+
+        # 1.7. CHAVE DE IDEMPOTÊNCIA DAS LEITURAS DO TERMINAL (sincronização offline)
+        try:
+            db.session.execute(text("ALTER TABLE ponto_registros ADD COLUMN IF NOT EXISTS chave_idempotencia VARCHAR(64);"))
+            db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_ponto_registro_chave ON ponto_registros (chave_idempotencia);"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar a chave de idempotência de ponto_registros: {inner_e}")
+
+        # 1.7.1. LEDGER DE FÉRIAS: dias pedidos e ainda pendentes por período aquisitivo
+        try:
+            db.session.execute(text("ALTER TABLE periodos_aquisitivos ADD COLUMN IF NOT EXISTS dias_pendentes INTEGER DEFAULT 0;"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar a coluna dias_pendentes: {inner_e}")
+
+        # 1.7.2. PROCESSAMENTOS EM SEGUNDO PLANO (holerites e espelhos): item de origem de cada documento
+        try:
+            db.session.execute(text("ALTER TABLE holerites ADD COLUMN IF NOT EXISTS processamento_id INTEGER REFERENCES processamentos_documentos(id) ON DELETE SET NULL;"))
+            db.session.execute(text("ALTER TABLE holerites ADD COLUMN IF NOT EXISTS pagina INTEGER;"))
+            db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_holerite_processamento_pagina ON holerites (processamento_id, pagina);"))
+            db.session.execute(text("ALTER TABLE processamentos_documentos ALTER COLUMN arquivo_origem DROP NOT NULL;"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar as colunas de processamento em holerites: {inner_e}")
+
+        # 1.7.3. HASH E TAMANHO DOS ARQUIVOS NO STORAGE (ETag e Range nos downloads)
+        for tabela_doc in ['holerites', 'recibos', 'atestados']:
+            try:
+                db.session.execute(text(f"ALTER TABLE {tabela_doc} ADD COLUMN IF NOT EXISTS hash_arquivo VARCHAR(64);"))
+                db.session.execute(text(f"ALTER TABLE {tabela_doc} ADD COLUMN IF NOT EXISTS tamanho_arquivo INTEGER;"))
+                db.session.commit()
+            except Exception as inner_e:
+                db.session.rollback()
+                print(f"Aviso ao criar hash_arquivo em {tabela_doc}: {inner_e}")
+
+        # 1.7.4. HASH CALCULADO NO ENVIO (o mesmo PDF/página não gera outro documento)
+        try:
+            db.session.execute(text("ALTER TABLE processamentos_documentos ADD COLUMN IF NOT EXISTS hash_arquivo VARCHAR(64);"))
+            db.session.execute(text("ALTER TABLE processamentos_documentos ADD COLUMN IF NOT EXISTS duplicados INTEGER DEFAULT 0;"))
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_holerite_empresa_hash ON holerites (empresa_id, hash_arquivo);"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar as colunas de hash do envio: {inner_e}")
+
+        # 1.7.5. LEITURA DOS ATESTADOS EM SEGUNDO PLANO (lease do OCR)
+        try:
+            db.session.execute(text("ALTER TABLE atestados ADD COLUMN IF NOT EXISTS ocr_iniciado_em TIMESTAMP;"))
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao criar ocr_iniciado_em em atestados: {inner_e}")
+
+        # 1.7.6. FALTAS FANTASMAS DO FECHAMENTO (administradores e escala Livre não têm falta)
+        # Uma vez por empresa e só nos dias que o fechamento noturno cobriu desde que entrou no ar:
+        # faltas de antes disso (inclusive de quem mudou de escala depois) não são tocadas.
+        try:
+            from datetime import date, datetime
+            from app.ponto.escala import tem_escala_fixa
+            from app.ponto.ferias import atualizar_faltas
+            from app.ponto.fechamento import CHAVE_CHECKPOINT
+            inicio_fechamento = date(2026, 10, 17)
+            chave_limpeza = 'faltas_sem_escala_limpas'
+            for empresa in Empresa.query.all():
+                config = dict(empresa.config_json or {})
+                fechado_ate = config.get(CHAVE_CHECKPOINT)
+                if not fechado_ate or config.get(chave_limpeza): continue
+                fechado_ate = date.fromisoformat(fechado_ate)
+                sem_escala = [u.id for u in User.query.filter_by(empresa_id=empresa.id) if not tem_escala_fixa(u)]
+                if sem_escala and fechado_ate >= inicio_fechamento:
+                    PontoResumo.query.filter(
+                        PontoResumo.user_id.in_(sem_escala), PontoResumo.status_dia == 'Falta',
+                        func.coalesce(PontoResumo.minutos_trabalhados, 0) == 0,
+                        PontoResumo.data_referencia >= inicio_fechamento, PontoResumo.data_referencia <= fechado_ate,
+                        PontoResumo.created_at >= datetime.combine(inicio_fechamento, datetime.min.time())
+                    ).delete(synchronize_session=False)
+                    atualizar_faltas(sem_escala, inicio_fechamento, fechado_ate)
+                config[chave_limpeza] = True
+                empresa.config_json = config
+            db.session.commit()
+        except Exception as inner_e:
+            db.session.rollback()
+            print(f"Aviso ao limpar as faltas de quem não tem escala fixa: {inner_e}")
+
+        # 1.8. ÍNDICES DOS CAMINHOS QUENTES (consultas por colaborador + data e telas da empresa)
+        indices = [
+            "CREATE INDEX IF NOT EXISTS ix_ponto_registro_user_data ON ponto_registros (user_id, data_registro, hora_registro);",
+            "CREATE INDEX IF NOT EXISTS ix_ponto_resumo_empresa_data ON ponto_resumos (empresa_id, data_referencia, status_dia);",
+            "CREATE INDEX IF NOT EXISTS ix_users_empresa_nome ON users (empresa_id, real_name);",
+            "CREATE INDEX IF NOT EXISTS ix_notificacao_user_lida_data ON notificacoes (user_id, lida, data_criacao);",
+            "CREATE INDEX IF NOT EXISTS ix_solicitacao_ausencia_user_status ON solicitacoes_ausencia (user_id, status, data_inicio, data_fim);",
+            "CREATE INDEX IF NOT EXISTS ix_solicitacao_ausencia_data ON solicitacoes_ausencia (data_solicitacao, id);",
+            "CREATE INDEX IF NOT EXISTS ix_holerite_user_visualizado ON holerites (user_id, visualizado);",
+            "CREATE INDEX IF NOT EXISTS ix_holerite_status ON holerites (status);",
+            "CREATE INDEX IF NOT EXISTS ix_holerite_enviado ON holerites (enviado_em);",
+            "CREATE INDEX IF NOT EXISTS ix_recibo_user_visualizado ON recibos (user_id, visualizado);",
+            "CREATE INDEX IF NOT EXISTS ix_recibo_data_pagamento ON recibos (data_pagamento);",
+            "CREATE INDEX IF NOT EXISTS ix_assinatura_user_data ON assinaturas_digitais (user_id, data_assinatura);",
+            "CREATE INDEX IF NOT EXISTS ix_ponto_ajuste_user_criado ON ponto_ajustes (user_id, created_at);",
+            "CREATE INDEX IF NOT EXISTS ix_ponto_ajuste_status ON ponto_ajustes (status);",
+            "CREATE INDEX IF NOT EXISTS ix_atestado_user_envio ON atestados (user_id, data_envio);",
+        ]
+        # Chaves únicas onde duplicidade é bug: remove as cópias antigas (fica a mais recente) antes de criar
+        unicos = [
+            ("push_subscriptions", "user_id, endpoint", "uq_push_subscription_user_endpoint",
+             "a.user_id = b.user_id AND a.endpoint = b.endpoint"),
+            ("periodos_aquisitivos", "user_id, data_inicio", "uq_periodo_aquisitivo_user_inicio",
+             "a.user_id = b.user_id AND a.data_inicio = b.data_inicio"),
+        ]
+        for sql in indices:
+            try:
+                db.session.execute(text(sql))
+                db.session.commit()
+            except Exception as inner_e:
+                db.session.rollback()
+                print(f"Aviso ao criar índice: {inner_e}")
+        for tabela, colunas, nome, igualdade in unicos:
+            try:
+                db.session.execute(text(f"DELETE FROM {tabela} a USING {tabela} b WHERE {igualdade} AND a.id < b.id;"))
+                db.session.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {nome} ON {tabela} ({colunas});"))
+                db.session.commit()
+            except Exception as inner_e:
+                db.session.rollback()
+                print(f"Aviso ao criar a chave única {nome}: {inner_e}")
+
         # 2. VORTICE CRIA O SEU PRIMEIRO CLIENTE (SHAHIN)
         cliente_shahin = Empresa.query.filter_by(slug='shahin').first()
         if not cliente_shahin:
@@ -55,6 +55,7 @@ class TenantModel(db.Model):
 
 class User(UserMixin, TenantModel):
     __tablename__ = 'users'
+    __table_args__ = (db.Index('ix_users_empresa_nome', 'empresa_id', 'real_name'),)
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
@@ -134,19 +135,59 @@ class HistoricoSaida(TenantModel):
 
 class Holerite(TenantModel):
     __tablename__ = 'holerites'
+    __table_args__ = (
+        db.Index('ix_holerite_user_visualizado', 'user_id', 'visualizado'),
+        db.Index('ix_holerite_status', 'status'),
+        db.Index('ix_holerite_enviado', 'enviado_em'),
+        db.Index('uq_holerite_processamento_pagina', 'processamento_id', 'pagina', unique=True),
+        db.Index('ix_holerite_empresa_hash', 'empresa_id', 'hash_arquivo'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     mes_referencia = db.Column(db.String(7), nullable=False)
     status = db.Column(db.String(20), default='Enviado')
     url_arquivo = db.Column(db.String(500), nullable=True)
     conteudo_pdf = db.Column(db.LargeBinary, nullable=True)
+    # SHA-256 (calculado no envio) e tamanho do arquivo no storage: ETag e Range do download sem ir
+    # ao bucket, e a mesma página reenviada é reconhecida sem gerar outro documento
+    hash_arquivo = db.Column(db.String(64), nullable=True)
+    tamanho_arquivo = db.Column(db.Integer, nullable=True)
     visualizado = db.Column(db.Boolean, default=False)
     visualizado_em = db.Column(db.DateTime, nullable=True)
     enviado_em = db.Column(db.DateTime, default=get_brasil_time)
+    # Origem no processamento em lote: a página do PDF (holerites) ou o colaborador (espelhos)
+    # nunca gera dois documentos no mesmo processamento, mesmo ao retomar
+    processamento_id = db.Column(db.Integer, db.ForeignKey('processamentos_documentos.id', ondelete='SET NULL'), nullable=True)
+    pagina = db.Column(db.Integer, nullable=True)
     user = db.relationship('User', backref=db.backref('holerites', lazy=True))
 
+class ProcessamentoDocumento(TenantModel):
+    """Importação em segundo plano de um PDF com vários documentos (ex.: a folha inteira de holerites)."""
+    __tablename__ = 'processamentos_documentos'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False, default='holerite')
+    status = db.Column(db.String(20), nullable=False, default='Na Fila')  # Na Fila, Processando, Concluido, Erro
+    arquivo_origem = db.Column(db.String(500), nullable=True)  # PDF original no storage (para retomar); vazio nos espelhos
+    hash_arquivo = db.Column(db.String(64), nullable=True)  # SHA-256 do original: o mesmo PDF não abre um segundo job
+    mes_referencia = db.Column(db.String(7), nullable=True)
+    total_paginas = db.Column(db.Integer, default=0)
+    paginas_processadas = db.Column(db.Integer, default=0)
+    enviados = db.Column(db.Integer, default=0)
+    revisao = db.Column(db.Integer, default=0)
+    duplicados = db.Column(db.Integer, default=0)  # páginas que a empresa já tinha (mesmo hash): não viram outro documento
+    mensagem_erro = db.Column(db.String(500), nullable=True)
+    criado_por_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    iniciado_em = db.Column(db.DateTime, nullable=True)
+    concluido_em = db.Column(db.DateTime, nullable=True)
+    # Renovado a cada lote gravado: sem renovação por muito tempo, o processo caiu e o job pode ser retomado
+    heartbeat_em = db.Column(db.DateTime, nullable=True)
+
 class Recibo(TenantModel):
     __tablename__ = 'recibos'
+    __table_args__ = (
+        db.Index('ix_recibo_user_visualizado', 'user_id', 'visualizado'),
+        db.Index('ix_recibo_data_pagamento', 'data_pagamento'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     valor = db.Column(db.Float, nullable=False)
@@ -158,11 +199,14 @@ class Recibo(TenantModel):
     forma_pagamento = db.Column(db.String(50), default="Transferência")
     url_arquivo = db.Column(db.String(500), nullable=True) 
     conteudo_pdf = db.Column(db.LargeBinary, nullable=True) 
+    hash_arquivo = db.Column(db.String(64), nullable=True)
+    tamanho_arquivo = db.Column(db.Integer, nullable=True)
     visualizado = db.Column(db.Boolean, default=False)
     user = db.relationship('User', backref=db.backref('recibos', lazy=True))
 
 class AssinaturaDigital(TenantModel):
     __tablename__ = 'assinaturas_digitais'
+    __table_args__ = (db.Index('ix_assinatura_user_data', 'user_id', 'data_assinatura'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     tipo_documento = db.Column(db.String(50), nullable=False)
@@ -175,6 +219,10 @@ class AssinaturaDigital(TenantModel):
 
 class PontoRegistro(TenantModel):
     __tablename__ = 'ponto_registros'
+    __table_args__ = (
+        db.Index('ix_ponto_registro_user_data', 'user_id', 'data_registro', 'hora_registro'),
+        db.Index('uq_ponto_registro_chave', 'chave_idempotencia', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     data_registro = db.Column(db.Date, nullable=False)
@@ -182,9 +230,15 @@ class PontoRegistro(TenantModel):
     tipo = db.Column(db.String(20))
     latitude = db.Column(db.String(50))
     longitude = db.Column(db.String(50))
+    # Chave gerada pelo terminal para cada leitura; o reenvio da mesma leitura não duplica a batida
+    chave_idempotencia = db.Column(db.String(64), nullable=True)
 
 class PontoResumo(TenantModel):
     __tablename__ = 'ponto_resumos'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'data_referencia', name='uq_ponto_resumo_user_dia'),
+        db.Index('ix_ponto_resumo_empresa_data', 'empresa_id', 'data_referencia', 'status_dia'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     data_referencia = db.Column(db.Date, nullable=False)
@@ -195,6 +249,10 @@ class PontoResumo(TenantModel):
 
 class PontoAjuste(TenantModel):
     __tablename__ = 'ponto_ajustes'
+    __table_args__ = (
+        db.Index('ix_ponto_ajuste_user_criado', 'user_id', 'created_at'),
+        db.Index('ix_ponto_ajuste_status', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     data_referencia = db.Column(db.Date, nullable=False)
@@ -209,19 +267,24 @@ class PontoAjuste(TenantModel):
 
 class Atestado(TenantModel):
     __tablename__ = 'atestados'
+    __table_args__ = (db.Index('ix_atestado_user_envio', 'user_id', 'data_envio'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     data_envio = db.Column(db.DateTime, nullable=False)
     url_arquivo = db.Column(db.String(500), nullable=False) 
+    hash_arquivo = db.Column(db.String(64), nullable=True)
+    tamanho_arquivo = db.Column(db.Integer, nullable=True)
     data_inicio_afastamento = db.Column(db.Date, nullable=True) 
     quantidade_dias = db.Column(db.Integer, nullable=True)
     texto_extraido = db.Column(db.Text, nullable=True) 
-    status = db.Column(db.String(50), default='Processando')
+    status = db.Column(db.String(50), default='Processando')  # Processando (OCR em segundo plano), Revisao, Aprovado, Recusado
+    ocr_iniciado_em = db.Column(db.DateTime, nullable=True)  # Lease da leitura: sem conclusão dentro dele, outra tentativa assume
     motivo_recusa = db.Column(db.String(500), nullable=True)
     user = db.relationship('User', backref=db.backref('atestados', lazy=True))
 
 class PeriodoAquisitivo(TenantModel):
     __tablename__ = 'periodos_aquisitivos'
+    __table_args__ = (db.UniqueConstraint('user_id', 'data_inicio', name='uq_periodo_aquisitivo_user_inicio'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     data_inicio = db.Column(db.Date, nullable=False)
@@ -229,11 +292,34 @@ class PeriodoAquisitivo(TenantModel):
     faltas_injustificadas = db.Column(db.Integer, default=0)
     dias_direito = db.Column(db.Integer, default=30)
     dias_usados = db.Column(db.Integer, default=0)
+    # Férias pedidas e ainda não avaliadas pelo RH (já reservadas do saldo)
+    dias_pendentes = db.Column(db.Integer, default=0)
     ativo = db.Column(db.Boolean, default=True)
     user = db.relationship('User', backref=db.backref('periodos', lazy=True))
 
+class AlertaFerias(TenantModel):
+    """Vencimento do prazo concessivo já calculado (fechamento noturno e a cada mudança no ledger de férias)."""
+    __tablename__ = 'alertas_ferias'
+    __table_args__ = (db.Index('ix_alerta_ferias_empresa_limite', 'empresa_id', 'data_limite', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, unique=True)
+    periodo_id = db.Column(db.Integer, db.ForeignKey('periodos_aquisitivos.id', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # 'Vencidas' ou 'A Vencer'
+    dias = db.Column(db.Integer, nullable=False)  # dias restantes (ou em atraso, se Vencidas)
+    data_limite = db.Column(db.Date, nullable=False)
+    user = db.relationship('User')
+
+    @property
+    def msg(self):
+        if self.status == 'Vencidas': return 'Prazo concessivo estourado. Risco alto de multa/dobro!'
+        return f'Vence em {self.dias} dias (Data limite: {self.data_limite.strftime("%d/%m/%Y")}).'
+
 class SolicitacaoAusencia(TenantModel):
     __tablename__ = 'solicitacoes_ausencia'
+    __table_args__ = (
+        db.Index('ix_solicitacao_ausencia_user_status', 'user_id', 'status', 'data_inicio', 'data_fim'),
+        db.Index('ix_solicitacao_ausencia_data', 'data_solicitacao', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     tipo_ausencia = db.Column(db.String(50), nullable=False) 
@@ -264,6 +350,7 @@ class SolicitacaoUniforme(TenantModel):
 
 class Notificacao(TenantModel):
     __tablename__ = 'notificacoes'
+    __table_args__ = (db.Index('ix_notificacao_user_lida_data', 'user_id', 'lida', 'data_criacao'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     mensagem = db.Column(db.String(255), nullable=False)
@@ -274,6 +361,7 @@ class Notificacao(TenantModel):
 
 class PushSubscription(TenantModel):
     __tablename__ = 'push_subscriptions'
+    __table_args__ = (db.UniqueConstraint('user_id', 'endpoint', name='uq_push_subscription_user_endpoint'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     endpoint = db.Column(db.String(500), nullable=False)
@@ -0,0 +1,215 @@
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import select
+from app.extensions import db
+from app.models import User, PontoRegistro, PontoResumo
+from app.utils import get_brasil_time
+from app.ponto.escala import compilar_escala, versao_escala, tem_escala_fixa, PAPEIS_SEM_PONTO, CONTAS_SEM_PONTO
+from app.ponto.resumo import STATUS_CALCULADOS
+
+# ==============================================================================
+# 🧮 APURAÇÃO VETORIZADA DO PERÍODO (colaboradores × dias)
+# Uma leitura das batidas e uma dos abonos do período inteiro, convertidas em
+# matrizes densas (uma linha por colaborador, uma coluna por dia). Minutos
+# trabalhados, meta, saldo, status, extras e débito saem de operações NumPy
+# sobre a matriz toda, com a MESMA regra de resumir_batidas. O resultado é o
+# objeto único consumido pelo espelho (web e PDF), pela folha e pelo analytics.
+# ==============================================================================
+
+# Códigos de status da matriz. 0 = dia sem apuração (antes da admissão ou futuro sem batida).
+SEM_APURACAO, OK, FALTA, FOLGA, INCOMPLETO, HORA_EXTRA, DEBITO, EXTRA = range(8)
+ROTULOS_CALCULADOS = ('', 'OK', 'Falta', 'Folga', 'Incompleto', 'Hora Extra', 'Débito', 'Extra')
+
+# Mesma tolerância de resumir_batidas (minutos)
+TOLERANCIA_SALDO = 10
+
+class ApuracaoPeriodo:
+    """
+    Matrizes (colaborador × dia) do período [inicio, fim]. A linha `i` é `usuarios[i]`
+    e a coluna `j` é `inicio + j dias`. Dias abonados pelo RH (Férias, Atestado...) têm
+    meta zero e saldo igual ao tempo trabalhado, como no PontoResumo. `resumos` só vem
+    preenchido quando a apuração foi pedida `com_resumos`.
+    """
+    def __init__(self, usuarios, inicio, fim, meta, trabalhado, qtd_batidas, status, rotulos, abonado, minutos, deslocamentos, resumos=None):
+        self.usuarios = usuarios
+        self.inicio = inicio
+        self.fim = fim
+        self.meta = meta
+        self.trabalhado = trabalhado
+        self.saldo = trabalhado - meta
+        self.qtd_batidas = qtd_batidas
+        self.status = status
+        self.rotulos = rotulos
+        self.abonado = abonado
+        self.resumos = resumos
+        self._minutos = minutos
+        self._deslocamentos = deslocamentos
+        self._indice = {u.id: i for i, u in enumerate(usuarios)}
+
+    @property
+    def num_dias(self):
+        return self.meta.shape[1]
+
+    def dias(self):
+        return [self.inicio + timedelta(days=j) for j in range(self.num_dias)]
+
+    def indice(self, user_id):
+        return self._indice[user_id]
+
+    def coluna(self, dia):
+        return (dia - self.inicio).days
+
+    def rotulo(self, i, j):
+        return self.rotulos[self.status[i, j]]
+
+    def horarios(self, i, j):
+        """Batidas do dia em 'HH:MM', em ordem."""
+        celula = i * self.num_dias + j
+        inicio = self._deslocamentos[celula]
+        return [f"{m // 60:02d}:{m % 60:02d}" for m in self._minutos[inicio:inicio + self.qtd_batidas[i, j]].tolist()]
+
+    @property
+    def apurado(self):
+        return self.status != SEM_APURACAO
+
+    @property
+    def extras(self):
+        """Minutos positivos de saldo em dias não abonados."""
+        return np.where(self.abonado, 0, np.clip(self.saldo, 0, None))
+
+    @property
+    def debito(self):
+        """Minutos negativos de saldo (em valor absoluto)."""
+        return np.clip(-self.saldo, 0, None)
+
+    def contar(self, rotulo):
+        """Quantidade de dias com o status, por colaborador."""
+        if rotulo not in self.rotulos: return np.zeros(len(self.usuarios), dtype=np.int32)
+        return (self.status == self.rotulos.index(rotulo)).sum(axis=1)
+
+    def totais(self):
+        """Somatórios por colaborador (vetores alinhados com `usuarios`)."""
+        return {
+            'esperado': self.meta.sum(axis=1),
+            'trabalhado': self.trabalhado.sum(axis=1),
+            'saldo': self.saldo.sum(axis=1),
+            'extras': self.extras.sum(axis=1),
+            'debito': self.debito.sum(axis=1),
+            'faltas': self.contar('Falta'),
+        }
+
+def _matriz_de_metas(usuarios, inicio, num_dias):
+    """Meta de cada (colaborador, dia): uma indexação por versão de escala, não por colaborador."""
+    meta = np.zeros((len(usuarios), num_dias), dtype=np.int32)
+    grupos = {}
+    for i, u in enumerate(usuarios):
+        grupos.setdefault(versao_escala(u), []).append(i)
+    deslocamento = np.arange(num_dias)
+    for versao, linhas in grupos.items():
+        compilada = compilar_escala(versao)
+        tabela = np.asarray(compilada.tabela, dtype=np.int32)
+        posicoes = ((inicio - compilada.ancora).days + deslocamento) % len(tabela)
+        meta[linhas] = tabela[posicoes]
+    return meta
+
+def apurar_periodo(usuarios, inicio, fim, hoje=None, filtro_usuarios=None, com_resumos=False):
+    """
+    Apura [inicio, fim] para a lista de colaboradores em duas consultas.
+    `filtro_usuarios` (uma subconsulta de ids) substitui o IN com a lista inteira
+    quando o período é de uma empresa toda. `com_resumos` troca a leitura dos abonos
+    pela dos PontoResumo inteiros (em ordem de colaborador e dia), devolvidos em
+    `apuracao.resumos`: é o caso do espelho, que lista os resumos do mês.
+    """
+    hoje = hoje or get_brasil_time().date()
+    num_usuarios, num_dias = len(usuarios), (fim - inicio).days + 1
+    indice = {u.id: i for i, u in enumerate(usuarios)}
+    filtro_usuarios = filtro_usuarios if filtro_usuarios is not None else [u.id for u in usuarios]
+
+    # Consultas Core (sem a camada de carregamento do ORM): são centenas de milhares de tuplas num mês
+    registros, resumos = PontoRegistro.__table__.c, PontoResumo.__table__.c
+    batidas = db.session.execute(select(registros.user_id, registros.data_registro, registros.hora_registro).where(
+        registros.user_id.in_(filtro_usuarios),
+        registros.data_registro >= inicio,
+        registros.data_registro <= fim
+    )).all()
+    resumos_orm = None
+    if com_resumos:
+        resumos_orm = PontoResumo.query.filter(
+            PontoResumo.user_id.in_(filtro_usuarios),
+            PontoResumo.data_referencia >= inicio,
+            PontoResumo.data_referencia <= fim
+        ).order_by(PontoResumo.user_id, PontoResumo.data_referencia).all()
+        abonos = [(r.user_id, r.data_referencia, r.status_dia) for r in resumos_orm if r.status_dia not in STATUS_CALCULADOS]
+    else:
+        abonos = db.session.execute(select(resumos.user_id, resumos.data_referencia, resumos.status_dia).where(
+            resumos.user_id.in_(filtro_usuarios),
+            resumos.data_referencia >= inicio,
+            resumos.data_referencia <= fim,
+            resumos.status_dia.notin_(STATUS_CALCULADOS)
+        )).all()
+
+    # Batidas -> vetores (linha, coluna, minuto), ordenados por célula e horário
+    batidas = [b for b in batidas if b[0] in indice]
+    linha = np.fromiter((indice[b[0]] for b in batidas), dtype=np.int64, count=len(batidas))
+    coluna = np.fromiter(((b[1] - inicio).days for b in batidas), dtype=np.int64, count=len(batidas))
+    minutos = np.fromiter((b[2].hour * 60 + b[2].minute for b in batidas), dtype=np.int32, count=len(batidas))
+    celula = linha * num_dias + coluna
+    ordem = np.lexsort((minutos, celula))
+    celula, minutos = celula[ordem], minutos[ordem]
+
+    total_celulas = num_usuarios * num_dias
+    qtd = np.bincount(celula, minlength=total_celulas).astype(np.int32)
+    deslocamentos = np.zeros(total_celulas, dtype=np.int64)
+    np.cumsum(qtd[:-1], out=deslocamentos[1:])
+
+    # Pares entrada/saída: posição par subtrai, ímpar soma; a última batida de um dia ímpar fica de fora
+    posicao = np.arange(len(celula)) - deslocamentos[celula]
+    pareada = posicao < (qtd[celula] // 2) * 2
+    sinal = np.where(posicao % 2 == 1, 1, -1) * pareada
+    trabalhado = np.bincount(celula, weights=sinal * minutos, minlength=total_celulas).astype(np.int32)
+
+    qtd = qtd.reshape(num_usuarios, num_dias)
+    trabalhado = trabalhado.reshape(num_usuarios, num_dias)
+    meta = _matriz_de_metas(usuarios, inicio, num_dias)
+    # Sem escala fixa (Livre, administradores) o dia sem batida é folga, não falta: mesma regra do fechamento
+    sem_escala = np.array([not tem_escala_fixa(u) for u in usuarios], dtype=bool)
+    meta[sem_escala[:, None] & (qtd == 0)] = 0
+
+    # Status com a regra de resumir_batidas, na matriz inteira
+    saldo = trabalhado - meta
+    status = np.select(
+        [qtd == 0, qtd % 2 == 1, saldo > TOLERANCIA_SALDO, saldo < -TOLERANCIA_SALDO],
+        [np.where(meta > 0, FALTA, FOLGA), INCOMPLETO, HORA_EXTRA, np.where(meta > 0, DEBITO, EXTRA)],
+        default=OK
+    ).astype(np.int16)
+
+    # Abonos do RH: meta zero e o status do abono
+    rotulos = list(ROTULOS_CALCULADOS)
+    abonado = np.zeros((num_usuarios, num_dias), dtype=bool)
+    for user_id, dia, rotulo in abonos:
+        if user_id not in indice: continue
+        if rotulo not in rotulos: rotulos.append(rotulo)
+        i, j = indice[user_id], (dia - inicio).days
+        abonado[i, j] = True
+        status[i, j] = rotulos.index(rotulo)
+    meta[abonado] = 0
+
+    # Fora do período apurável: antes da admissão, ou dia futuro ainda sem batida
+    dias = np.arange(num_dias)
+    admissao = np.array([(u.data_admissao - inicio).days if u.data_admissao else -1 for u in usuarios], dtype=np.int64)
+    fora = dias[None, :] < admissao[:, None]
+    fora |= (dias[None, :] > (hoje - inicio).days) & (qtd == 0) & ~abonado
+    meta[fora] = 0
+    status[fora] = SEM_APURACAO
+
+    return ApuracaoPeriodo(usuarios, inicio, fim, meta, trabalhado, qtd, status, rotulos, abonado, minutos, deslocamentos, resumos_orm)
+
+def apurar_empresa(empresa_id, inicio, fim, hoje=None, somente_ponto=True):
+    """
+    Todos os colaboradores da empresa (sem o terminal), em ordem alfabética.
+    `somente_ponto` deixa de fora também os administradores, que não batem ponto.
+    """
+    condicoes = [User.empresa_id == empresa_id, User.role != 'Terminal', User.username != '12345678900', User.username != 'terminal']
+    if somente_ponto: condicoes += [User.role.notin_(PAPEIS_SEM_PONTO), User.username.notin_(CONTAS_SEM_PONTO)]
+    usuarios = User.query.filter(*condicoes).order_by(User.real_name, User.id).all()
+    return apurar_periodo(usuarios, inicio, fim, hoje, filtro_usuarios=select(User.id).where(*condicoes))
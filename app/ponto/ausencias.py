@@ -0,0 +1,74 @@
+from bisect import bisect_right
+from collections import namedtuple
+from app.extensions import db
+from app.models import User, SolicitacaoAusencia
+from app.utils import CacheTTL
+
+# ==============================================================================
+# 🏖️ ÍNDICE DE AUSÊNCIAS APROVADAS (Férias, Licenças...)
+# Os intervalos aprovados são carregados UMA vez por colaborador ou por empresa e
+# ficam ordenados por data de início. "Está ausente no dia X?" vira uma busca
+# binária em memória em vez de uma consulta ao banco por dia/colaborador.
+# ==============================================================================
+
+Ausencia = namedtuple('Ausencia', 'user_id tipo_ausencia data_inicio data_fim')
+
+class IndiceAusencias:
+    def __init__(self, ausencias):
+        por_user = {}
+        for a in sorted(ausencias, key=lambda a: (a.user_id, a.data_inicio)):
+            por_user.setdefault(a.user_id, []).append(a)
+
+        # Por colaborador: inícios ordenados + maior data_fim acumulada (permite parar a varredura cedo)
+        self._por_user = {}
+        for user_id, lista in por_user.items():
+            inicios, fins_max, maior = [], [], None
+            for a in lista:
+                inicios.append(a.data_inicio)
+                maior = a.data_fim if maior is None or a.data_fim > maior else maior
+                fins_max.append(maior)
+            self._por_user[user_id] = (inicios, fins_max, lista)
+
+    def sobrepostas(self, user_id, inicio, fim):
+        """Ausências do colaborador que tocam o intervalo [inicio, fim], em ordem de início."""
+        dados = self._por_user.get(user_id)
+        if not dados: return []
+        inicios, fins_max, lista = dados
+        i = bisect_right(inicios, fim) - 1
+        encontradas = []
+        while i >= 0 and fins_max[i] >= inicio:
+            if lista[i].data_fim >= inicio: encontradas.append(lista[i])
+            i -= 1
+        encontradas.reverse()
+        return encontradas
+
+    def ausencia_em(self, user_id, dia):
+        """A ausência que cobre o dia (a de início mais recente, se houver sobreposição) ou None."""
+        encontradas = self.sobrepostas(user_id, dia, dia)
+        return encontradas[-1] if encontradas else None
+
+def _carregar(filtro_user):
+    """Uma consulta: solicitações aprovadas (atestados aprovados já viram resumo 'Atestado' na avaliação)."""
+    solicitacoes = db.session.query(
+        SolicitacaoAusencia.user_id, SolicitacaoAusencia.tipo_ausencia,
+        SolicitacaoAusencia.data_inicio, SolicitacaoAusencia.data_fim
+    ).join(User, User.id == SolicitacaoAusencia.user_id).filter(
+        SolicitacaoAusencia.status == 'Aprovado', filtro_user
+    ).all()
+    return IndiceAusencias([Ausencia(*linha) for linha in solicitacoes])
+
+_cache = CacheTTL()
+
+def indice_do_usuario(user_id):
+    return _cache.obter(('user', user_id), lambda: _carregar(User.id == user_id))
+
+def indice_da_empresa(empresa_id):
+    return _cache.obter(('empresa', empresa_id), lambda: _carregar(User.empresa_id == empresa_id))
+
+def invalidar_ausencias(user_id=None, empresa_id=None):
+    """
+    Chamar sempre que uma solicitação de ausência mudar de status.
+    Sem `empresa_id`, descarta os índices de todas as empresas (são baratos de reconstruir).
+    """
+    if user_id is not None: _cache.descartar(('user', user_id))
+    _cache.descartar(filtro=lambda chave: chave[0] == 'empresa' and (empresa_id is None or chave[1] == empresa_id))
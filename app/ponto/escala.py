@@ -0,0 +1,110 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+import calendar
+
+# ==============================================================================
+# 📅 MOTOR DE ESCALAS (5x2, 12x36, 6x1...)
+# Fonte ÚNICA da regra "quantos minutos este colaborador deve trabalhar neste dia".
+# Cada escala vira uma tabela de ciclo (minutos por posição do ciclo) ancorada numa
+# data; a meta de qualquer dia é um simples índice: tabela[(dia - âncora) % ciclo].
+# ==============================================================================
+
+# Marcador de "usa a carga horária cadastrada no colaborador"
+CARGA = None
+
+# ciclo: minutos esperados em cada posição do ciclo (0 = folga, CARGA = carga do colaborador)
+# semanal: True ancora o ciclo numa segunda-feira; False exige data_inicio_escala
+RegraEscala = namedtuple('RegraEscala', 'ciclo semanal')
+
+# Para criar uma escala nova basta registar aqui a tabela do ciclo.
+REGRAS_ESCALA = {
+    # Livre: sem escala fixa (não bloqueia batida); a meta vale de segunda a sexta
+    'Livre': RegraEscala(ciclo=(CARGA,) * 5 + (0, 0), semanal=True),
+    '5x2': RegraEscala(ciclo=(CARGA,) * 5 + (0, 0), semanal=True),
+    '6x1': RegraEscala(ciclo=(CARGA,) * 6 + (0,), semanal=False),
+    '12x36': RegraEscala(ciclo=(720, 0), semanal=False),
+}
+
+# Escala desconhecida ou revezamento sem data de referência: não há como alternar, vale a carga todo dia
+REGRA_SEM_CICLO = RegraEscala(ciclo=(CARGA,), semanal=True)
+
+# Segunda-feira de referência para as escalas semanais
+ANCORA_SEMANAL = date(2024, 1, 1)
+
+# Só quem tem uma destas escalas recebe falta gravada pelo fechamento (dia sem batida)
+ESCALAS_FIXAS = tuple(e for e in REGRAS_ESCALA if e != 'Livre')
+# Quem não bate ponto: o terminal e os administradores (papel Master e a conta master da plataforma)
+PAPEIS_SEM_PONTO = ('Terminal', 'Master')
+CONTAS_SEM_PONTO = ('12345678900', 'terminal', '50097952800')
+
+EscalaCompilada = namedtuple('EscalaCompilada', 'tabela ancora')
+CalendarioMes = namedtuple('CalendarioMes', 'ano mes inicio minutos trabalho')
+
+def versao_escala(user):
+    """
+    Assinatura da escala do colaborador: (escala, carga, data_inicio_escala).
+    Qualquer alteração cadastral gera uma versão nova e, portanto, entradas novas no cache.
+    """
+    inicio = user.data_inicio_escala
+    if isinstance(inicio, str):
+        try: inicio = date.fromisoformat(inicio)
+        except ValueError: inicio = None
+    return (user.escala or 'Livre', user.carga_horaria or 528, inicio)
+
+@lru_cache(maxsize=256)
+def compilar_escala(versao):
+    """Transforma a versão da escala na tabela de ciclo com os minutos já resolvidos."""
+    escala, carga, data_inicio = versao
+    regra = REGRAS_ESCALA.get(escala, REGRA_SEM_CICLO)
+
+    if regra.semanal:
+        ancora = ANCORA_SEMANAL
+    elif data_inicio:
+        ancora = data_inicio
+    else:
+        regra, ancora = REGRA_SEM_CICLO, ANCORA_SEMANAL
+
+    tabela = tuple(carga if m is CARGA else m for m in regra.ciclo)
+    return EscalaCompilada(tabela=tabela, ancora=ancora)
+
+def _meta(compilada, dia):
+    return compilada.tabela[(dia - compilada.ancora).days % len(compilada.tabela)]
+
+def meta_do_dia(user, data_ref):
+    """Minutos esperados para o colaborador na data, conforme a escala."""
+    return _meta(compilar_escala(versao_escala(user)), data_ref)
+
+def bate_ponto(user):
+    return user.role not in PAPEIS_SEM_PONTO and user.username not in CONTAS_SEM_PONTO
+
+def tem_escala_fixa(user):
+    """Escala cadastrada com dias de trabalho definidos: um dia sem batida é falta, não folga livre."""
+    return bate_ponto(user) and user.escala in ESCALAS_FIXAS
+
+def e_dia_de_trabalho(user, data_ref):
+    return meta_do_dia(user, data_ref) > 0
+
+def motivo_folga(user, data_ref):
+    """Texto exibido quando o colaborador tenta bater ponto num dia de folga da escala."""
+    # Livre nunca bloqueia; revezamento sem data de referência também não (não há como alternar)
+    regra = REGRAS_ESCALA.get(user.escala)
+    if regra is None or user.escala == 'Livre' or (not regra.semanal and not versao_escala(user)[2]): return None
+    if e_dia_de_trabalho(user, data_ref): return None
+    if user.escala == '5x2': return "Fim de semana (Escala 5x2)."
+    return f"Dia de folga (Escala {user.escala})."
+
+@lru_cache(maxsize=4096)
+def _calendario(versao, ano, mes):
+    compilada = compilar_escala(versao)
+    inicio = date(ano, mes, 1)
+    num_dias = calendar.monthrange(ano, mes)[1]
+    minutos = tuple(_meta(compilada, inicio + timedelta(days=i)) for i in range(num_dias))
+    return CalendarioMes(ano=ano, mes=mes, inicio=inicio, minutos=minutos, trabalho=tuple(m > 0 for m in minutos))
+
+def calendario_mes(user, ano, mes):
+    """
+    Mês inteiro de uma vez: `minutos[i]` e `trabalho[i]` referem-se ao dia i+1.
+    Memorizado por (versão da escala, mês): colaboradores com a mesma escala partilham a entrada.
+    """
+    return _calendario(versao_escala(user), ano, mes)
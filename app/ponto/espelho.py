@@ -0,0 +1,21 @@
+from datetime import date
+import calendar
+from app.ponto.apuracao import apurar_periodo
+
+# ==============================================================================
+# 🗓️ CARREGADOR DO ESPELHO MENSAL
+# A apuração vetorizada do mês (consulta por intervalo de datas, que usa índice,
+# ao contrário de extract(month)) traz as batidas de cada dia, os totais e os
+# próprios resumos do mês, lidos na mesma consulta dos abonos. A mesma apuração
+# alimenta o PDF.
+# ==============================================================================
+
+def intervalo_do_mes(ano, mes):
+    """Primeiro e último dia do mês, para filtros `data BETWEEN inicio AND fim`."""
+    return date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+def carregar_espelho_mes(user, ano, mes):
+    """Retorna (resumos do mês em ordem, apuração do mês do colaborador)."""
+    inicio, fim = intervalo_do_mes(ano, mes)
+    apuracao = apurar_periodo([user], inicio, fim, com_resumos=True)
+    return apuracao.resumos, apuracao
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+# Backend opcional entre instâncias (se não estiver instalado, só a entrega local funciona)
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 📣 CONFIRMAÇÃO INSTANTÂNEA DE BATIDA (PUB/SUB POR COLABORADOR)
+# A tela do QR-Code assina o canal do próprio colaborador e o terminal publica
+# logo depois do commit da batida. Substitui o polling de /api/check-status.
+# Sem REDIS_URL a entrega é só dentro do processo (um worker no Cloud Run);
+# com REDIS_URL, qualquer instância que gravar a batida avisa todas as outras.
+# ==============================================================================
+
+PREFIXO_CANAL = 'ponto:batida:'
+# Cada conexão de streaming ocupa uma thread do gunicorn: acima disto o navegador volta ao polling
+MAX_ASSINANTES = int(os.environ.get('PONTO_SSE_MAX_CONEXOES', 4))
+
+class CanalLocal:
+    """Entrega dentro do processo: uma fila por assinante, indexadas pelo user_id."""
+    def __init__(self):
+        self._assinantes = {}
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(MAX_ASSINANTES)
+
+    def assinar(self, user_id):
+        """Retorna a fila do assinante ou None se o limite de conexões abertas foi atingido."""
+        if not self._vagas.acquire(blocking=False): return None
+        fila = queue.Queue(maxsize=10)
+        with self._lock:
+            self._assinantes.setdefault(user_id, set()).add(fila)
+        return fila
+
+    def cancelar(self, user_id, fila):
+        with self._lock:
+            filas = self._assinantes.get(user_id)
+            if filas is not None and fila in filas:
+                filas.discard(fila)
+                if not filas: self._assinantes.pop(user_id, None)
+                self._vagas.release()
+
+    def entregar(self, user_id, evento):
+        with self._lock:
+            filas = list(self._assinantes.get(user_id, ()))
+        for fila in filas:
+            try: fila.put_nowait(evento)
+            except queue.Full: pass
+
+    def publicar(self, user_id, evento):
+        self.entregar(user_id, evento)
+
+class CanalRedis(CanalLocal):
+    """Publica no Redis; uma thread por processo escuta e repassa aos assinantes locais."""
+    def __init__(self, url):
+        super().__init__()
+        self._redis = redis.Redis.from_url(url)
+        threading.Thread(target=self._escutar, name='ponto-eventos', daemon=True).start()
+
+    def publicar(self, user_id, evento):
+        try:
+            self._redis.publish(f'{PREFIXO_CANAL}{user_id}', json.dumps(evento))
+        except Exception as e:
+            # Sem Redis, ao menos quem está conectado neste processo recebe
+            logger.error(f"Falha ao publicar evento de ponto no Redis: {e}")
+            self.entregar(user_id, evento)
+
+    def _escutar(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{PREFIXO_CANAL}*')
+                for msg in pubsub.listen():
+                    canal = msg['channel'].decode() if isinstance(msg['channel'], bytes) else msg['channel']
+                    self.entregar(int(canal[len(PREFIXO_CANAL):]), json.loads(msg['data']))
+            except Exception as e:
+                logger.error(f"Conexão de eventos de ponto com o Redis caiu, reconectando: {e}")
+                threading.Event().wait(5)
+
+_canal = None
+_canal_lock = threading.Lock()
+
+def obter_canal():
+    global _canal
+    if _canal is None:
+        with _canal_lock:
+            if _canal is None:
+                url = os.environ.get('REDIS_URL')
+                _canal = CanalRedis(url) if url and redis is not None else CanalLocal()
+    return _canal
+
+def publicar_batida(user_id, tipo, hora):
+    """Chamar DEPOIS do commit: o evento tem o mesmo formato da resposta de /api/check-status."""
+    obter_canal().publicar(user_id, {'marcado': True, 'tipo': tipo, 'hora': hora})
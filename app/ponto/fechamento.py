@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+import logging
+from app.extensions import db
+from app.models import Empresa, User
+from app.utils import get_brasil_time
+from app.ponto.escala import meta_do_dia, tem_escala_fixa
+from app.ponto.resumo import inserir_resumos_ausentes
+from app.ponto.ausencias import indice_da_empresa
+from app.ponto.ferias import garantir_periodos, atualizar_faltas, gravar_alertas_ferias
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 🌙 FECHAMENTO DIÁRIO: MATERIALIZA FALTAS E FOLGAS DE QUEM NÃO BATEU PONTO
+# Sem isto, um dia sem batida simplesmente não tem PontoResumo e as faltas somem
+# do analytics, do ledger de férias e do fechamento da folha. Só entra quem tem
+# escala fixa: administradores e colaboradores em escala Livre não ganham faltas.
+# ==============================================================================
+
+# Chave do checkpoint gravada no config_json de cada empresa (último dia já fechado)
+CHAVE_CHECKPOINT = 'ponto_fechado_ate'
+
+def _usuarios_da_empresa(empresa_id):
+    return User.query.filter(
+        User.empresa_id == empresa_id,
+        User.role != 'Terminal',
+        User.username != '12345678900'
+    ).all()
+
+def fechar_dias_empresa(empresa, data_fim, data_inicio=None):
+    """
+    Cria, num único INSERT em lote, os resumos ausentes da empresa entre o dia seguinte
+    ao checkpoint (ou `data_inicio`) e `data_fim`. Dias já resumidos não são tocados.
+    Retorna a quantidade de linhas candidatas enviadas ao banco. Não faz commit.
+    """
+    config = dict(empresa.config_json or {})
+    if data_inicio is None:
+        checkpoint = config.get(CHAVE_CHECKPOINT)
+        data_inicio = date.fromisoformat(checkpoint) + timedelta(days=1) if checkpoint else data_fim
+    if data_inicio > data_fim: return 0
+
+    usuarios = _usuarios_da_empresa(empresa.id)
+    com_escala = [u for u in usuarios if tem_escala_fixa(u)]
+    ausencias = indice_da_empresa(empresa.id)
+
+    agora = get_brasil_time()
+    total_dias = (data_fim - data_inicio).days + 1
+    linhas = []
+    for u in com_escala:
+        for i in range(total_dias):
+            dia = data_inicio + timedelta(days=i)
+            if u.data_admissao and dia < u.data_admissao: continue
+
+            ausencia = ausencias.ausencia_em(u.id, dia)
+            if ausencia:
+                meta, status = 0, ausencia.tipo_ausencia
+            else:
+                meta = meta_do_dia(u, dia)
+                status = "Falta" if meta > 0 else "Folga"
+
+            linhas.append({
+                'user_id': u.id, 'empresa_id': empresa.id, 'data_referencia': dia,
+                'minutos_trabalhados': 0, 'minutos_esperados': meta, 'minutos_saldo': -meta,
+                'status_dia': status, 'created_at': agora, 'updated_at': agora
+            })
+
+    inserir_resumos_ausentes(linhas)
+
+    # Faltas novas reduzem o direito de férias do período aquisitivo (CLT art. 130); o ledger é de todos
+    garantir_periodos(usuarios, data_fim)
+    atualizar_faltas([u.id for u in com_escala], data_inicio, data_fim)
+    # Os dias restantes dos alertas de vencimento mudam a cada dia que passa
+    gravar_alertas_ferias(empresa_id=empresa.id, hoje=data_fim + timedelta(days=1))
+
+    # Checkpoint nunca anda para trás (um reprocessamento manual de dias antigos não o reinicia)
+    checkpoint = config.get(CHAVE_CHECKPOINT)
+    if not checkpoint or date.fromisoformat(checkpoint) < data_fim:
+        config[CHAVE_CHECKPOINT] = data_fim.isoformat()
+        empresa.config_json = config
+    return len(linhas)
+
+def fechar_dias(data_fim=None, data_inicio=None, slug=None):
+    """
+    Executa o fechamento para todas as empresas ativas (ou só `slug`).
+    Cada empresa é uma transação própria: uma falha não perde o trabalho das outras.
+    """
+    data_fim = data_fim or (get_brasil_time().date() - timedelta(days=1))
+    query = Empresa.query.filter(Empresa.ativa == True, Empresa.deleted_at.is_(None))
+    if slug: query = query.filter(Empresa.slug == slug)
+
+    resultado = {}
+    for empresa in query.order_by(Empresa.id).all():
+        try:
+            resultado[empresa.slug] = fechar_dias_empresa(empresa, data_fim, data_inicio)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Fechamento do ponto falhou para a empresa {empresa.slug}: {e}")
+            resultado[empresa.slug] = None
+    return resultado
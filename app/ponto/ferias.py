@@ -0,0 +1,245 @@
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import and_, case, func, select
+from app.extensions import db
+from app.models import User, PeriodoAquisitivo, AlertaFerias, PontoResumo, SolicitacaoAusencia
+from app.utils import get_brasil_time
+from app.ponto.resumo import _insert_do_dialeto
+from app.ponto.escala import ESCALAS_FIXAS, PAPEIS_SEM_PONTO, CONTAS_SEM_PONTO
+
+# ==============================================================================
+# 🏖️ LEDGER DE FÉRIAS (PeriodoAquisitivo)
+# Um registo por colaborador e período aquisitivo de 12 meses desde a admissão,
+# com as faltas injustificadas do período, os dias de direito (CLT art. 130) e os
+# dias já usados/pendentes. É mantido pelos eventos (pedido, aprovação, recusa,
+# cancelamento, falta nova, fechamento), então o saldo é uma leitura indexada.
+# Os alertas de vencimento do prazo concessivo ficam gravados em AlertaFerias.
+# ==============================================================================
+
+TIPO_FERIAS = 'Férias'
+# CLT art. 130: (faltas até, dias de direito). Acima da última faixa o direito é zero.
+FAIXAS_FALTAS = ((5, 30), (14, 24), (23, 18), (32, 12))
+# Aviso de vencimento do prazo concessivo com esta antecedência
+DIAS_ALERTA_VENCIMENTO = 90
+
+SaldoFerias = namedtuple('SaldoFerias', 'dias_direito faltas dias_usados saldo direito_referencia')
+
+def dias_de_direito(faltas):
+    for limite, dias in FAIXAS_FALTAS:
+        if faltas <= limite: return dias
+    return 0
+
+def _somar_anos(data, anos):
+    try:
+        return data.replace(year=data.year + anos)
+    except ValueError:  # 29/02 em ano não bissexto
+        return data.replace(year=data.year + anos, day=28)
+
+def limite_concessao(periodo):
+    """Data limite para gozar as férias do período (fim do prazo concessivo de 12 meses)."""
+    return _somar_anos(periodo.data_inicio, 2)
+
+def _expressao_direito(coluna_faltas):
+    return case(*[(coluna_faltas <= limite, dias) for limite, dias in FAIXAS_FALTAS], else_=0)
+
+def _periodos_de(user_ids):
+    """Períodos dos colaboradores em ordem cronológica, sempre com os valores atuais do banco."""
+    periodos = PeriodoAquisitivo.query.filter(PeriodoAquisitivo.user_id.in_(user_ids)).order_by(
+        PeriodoAquisitivo.user_id, PeriodoAquisitivo.data_inicio
+    ).populate_existing().all()
+    por_usuario = {}
+    for p in periodos:
+        por_usuario.setdefault(p.user_id, []).append(p)
+    return por_usuario
+
+def garantir_periodos(usuarios, hoje=None):
+    """
+    Cria os períodos aquisitivos que faltam até o que contém `hoje` (ON CONFLICT DO NOTHING).
+    Uma leitura agrupada do último período de cada colaborador; só quem passou do aniversário
+    de admissão (ou ainda não tinha ledger) gera escrita. Retorna os ids alterados. Não faz commit.
+    """
+    hoje = hoje or get_brasil_time().date()
+    usuarios = [u for u in usuarios if u.data_admissao and u.data_admissao <= hoje]
+    if not usuarios: return set()
+
+    ultimos = dict(db.session.query(PeriodoAquisitivo.user_id, func.max(PeriodoAquisitivo.data_inicio)).filter(
+        PeriodoAquisitivo.user_id.in_([u.id for u in usuarios])
+    ).group_by(PeriodoAquisitivo.user_id).all())
+
+    agora = get_brasil_time()
+    linhas, inicio_recontagem = [], hoje
+    for u in usuarios:
+        ultimo = ultimos.get(u.id)
+        ciclo = 0 if ultimo is None else ultimo.year - u.data_admissao.year + 1
+        while True:
+            inicio = _somar_anos(u.data_admissao, ciclo)
+            if inicio > hoje: break
+            linhas.append({
+                'user_id': u.id, 'empresa_id': u.empresa_id, 'data_inicio': inicio,
+                'data_fim': _somar_anos(u.data_admissao, ciclo + 1) - timedelta(days=1),
+                'faltas_injustificadas': 0, 'dias_direito': 30, 'dias_usados': 0, 'dias_pendentes': 0,
+                'ativo': True, 'created_at': agora, 'updated_at': agora
+            })
+            inicio_recontagem = min(inicio_recontagem, inicio)
+            ciclo += 1
+
+    if not linhas: return set()
+    insert = _insert_do_dialeto()
+    db.session.execute(insert(PeriodoAquisitivo.__table__).values(linhas).on_conflict_do_nothing(
+        index_elements=['user_id', 'data_inicio']
+    ))
+    alterados = {l['user_id'] for l in linhas}
+    atualizar_faltas(alterados, inicio_recontagem, hoje, redistribuir=False)
+    redistribuir_ferias(alterados)
+    return alterados
+
+def atualizar_faltas(user_ids, data_inicio, data_fim, redistribuir=True):
+    """
+    Reconta, num UPDATE em massa, as faltas dos períodos que cruzam [data_inicio, data_fim]
+    e reaplica a tabela de direito. Só os colaboradores cujo direito mudou são redistribuídos.
+    Conta só a falta de quem bate ponto em escala fixa, em dia com meta: sem escala não há
+    dia de trabalho a faltar. Chamar depois de qualquer mudança de status_dia no passado.
+    Não faz commit.
+    """
+    user_ids = list({int(u) for u in user_ids})
+    if not user_ids or data_inicio > data_fim: return set()
+    db.session.flush()
+
+    tabela = PeriodoAquisitivo.__table__
+    resumos = PontoResumo.__table__
+    usuarios = User.__table__
+    faltas = select(func.count()).select_from(
+        resumos.join(usuarios, usuarios.c.id == resumos.c.user_id)
+    ).where(
+        resumos.c.user_id == tabela.c.user_id,
+        resumos.c.data_referencia >= tabela.c.data_inicio,
+        resumos.c.data_referencia <= tabela.c.data_fim,
+        resumos.c.status_dia == 'Falta',
+        resumos.c.minutos_esperados > 0,
+        usuarios.c.escala.in_(ESCALAS_FIXAS),
+        usuarios.c.role.notin_(PAPEIS_SEM_PONTO),
+        usuarios.c.username.notin_(CONTAS_SEM_PONTO)
+    ).scalar_subquery()
+    filtro = and_(tabela.c.user_id.in_(user_ids), tabela.c.data_inicio <= data_fim, tabela.c.data_fim >= data_inicio)
+
+    db.session.execute(tabela.update().where(filtro).values(faltas_injustificadas=faltas))
+    direito = _expressao_direito(tabela.c.faltas_injustificadas)
+    mudaram = {uid for (uid,) in db.session.execute(
+        select(tabela.c.user_id).where(filtro, tabela.c.dias_direito != direito).distinct()
+    )}
+    if mudaram:
+        db.session.execute(tabela.update().where(filtro, tabela.c.dias_direito != direito).values(dias_direito=direito))
+        if redistribuir: redistribuir_ferias(mudaram)
+    return mudaram
+
+def redistribuir_ferias(user_ids):
+    """
+    Reparte os dias de férias aprovados e pendentes de cada colaborador pelos seus períodos,
+    do mais antigo para o mais novo (o mais antigo vence primeiro). O excedente fica no
+    período mais recente. Uma leitura agrupada dos pedidos e uma dos períodos; no fim
+    regrava os alertas de vencimento desses colaboradores. Não faz commit.
+    """
+    user_ids = list({int(u) for u in user_ids})
+    if not user_ids: return
+    db.session.flush()
+
+    dias = SolicitacaoAusencia.quantidade_dias + func.coalesce(SolicitacaoAusencia.dias_abono, 0)
+    totais = {}
+    for user_id, status, total in db.session.query(
+        SolicitacaoAusencia.user_id, SolicitacaoAusencia.status, func.sum(dias)
+    ).filter(
+        SolicitacaoAusencia.user_id.in_(user_ids),
+        SolicitacaoAusencia.status.in_(['Aprovado', 'Pendente']),
+        SolicitacaoAusencia.tipo_ausencia == TIPO_FERIAS
+    ).group_by(SolicitacaoAusencia.user_id, SolicitacaoAusencia.status):
+        totais.setdefault(user_id, {})[status] = int(total or 0)
+
+    for user_id, periodos in _periodos_de(user_ids).items():
+        usados = totais.get(user_id, {}).get('Aprovado', 0)
+        pendentes = totais.get(user_id, {}).get('Pendente', 0)
+        for i, p in enumerate(periodos):
+            ultimo = i == len(periodos) - 1
+            direito = p.dias_direito or 0
+            p.dias_usados = usados if ultimo else min(usados, direito)
+            usados -= p.dias_usados
+            livre = max(direito - p.dias_usados, 0)
+            p.dias_pendentes = pendentes if ultimo else min(pendentes, livre)
+            pendentes -= p.dias_pendentes
+            p.ativo = direito - p.dias_usados - p.dias_pendentes > 0
+
+    gravar_alertas_ferias(user_ids=user_ids)
+
+def registrar_pedido_ferias(solicitacao):
+    """Pedido novo, aprovado, recusado ou cancelado: atualiza só o ledger do colaborador. Não faz commit."""
+    if solicitacao.tipo_ausencia != TIPO_FERIAS: return
+    user = solicitacao.user or db.session.get(User, solicitacao.user_id)
+    if not garantir_periodos([user]):
+        redistribuir_ferias([user.id])
+
+def reconstruir_ferias(usuarios, hoje=None):
+    """Apaga e refaz o ledger (ex.: a data de admissão mudou). Não faz commit."""
+    ids = [u.id for u in usuarios]
+    if not ids: return
+    AlertaFerias.query.filter(AlertaFerias.user_id.in_(ids)).delete(synchronize_session=False)
+    PeriodoAquisitivo.query.filter(PeriodoAquisitivo.user_id.in_(ids)).delete(synchronize_session=False)
+    garantir_periodos(usuarios, hoje)
+
+def saldo_ferias(user, hoje=None):
+    """
+    Saldo do colaborador a partir do ledger: soma dos períodos já adquiridos ainda em vigor
+    (com saldo ou dentro do prazo concessivo). As faltas exibidas são as do período em curso.
+    `direito_referencia` é o direito do período mais antigo em aberto (base do limite de 1/3 do abono).
+    Só leitura: os períodos novos são criados pelo fechamento noturno e pelos eventos do ledger.
+    """
+    if not user.data_admissao: return SaldoFerias(30, 0, 0, 0, 30)
+    hoje = hoje or get_brasil_time().date()
+
+    periodos = _periodos_de([user.id]).get(user.id, [])
+
+    adquiridos = [p for p in periodos if p.data_fim < hoje and (p.ativo or limite_concessao(p) >= hoje)]
+    em_curso = [p for p in periodos if p.data_inicio <= hoje <= p.data_fim]
+
+    dias_direito = sum(p.dias_direito or 0 for p in adquiridos)
+    dias_usados = sum((p.dias_usados or 0) + (p.dias_pendentes or 0) for p in adquiridos + em_curso)
+    faltas = em_curso[0].faltas_injustificadas or 0 if em_curso else 0
+    abertos = [p for p in adquiridos if p.ativo]
+    referencia = abertos[0].dias_direito if abertos else 30
+    return SaldoFerias(dias_direito, faltas, dias_usados, dias_direito - dias_usados, referencia)
+
+def gravar_alertas_ferias(empresa_id=None, user_ids=None, hoje=None):
+    """
+    Regrava a tabela de alertas de vencimento da empresa (fechamento noturno) ou só dos
+    colaboradores informados (mudança no ledger). Entra o período adquirido mais antigo
+    ainda não gozado, se o prazo concessivo venceu ou vence em até DIAS_ALERTA_VENCIMENTO dias.
+    Não faz commit.
+    """
+    if empresa_id is None and not user_ids: return 0
+    hoje = hoje or get_brasil_time().date()
+
+    escopo_periodos = PeriodoAquisitivo.empresa_id == empresa_id if empresa_id is not None else PeriodoAquisitivo.user_id.in_(user_ids)
+    escopo_alertas = AlertaFerias.empresa_id == empresa_id if empresa_id is not None else AlertaFerias.user_id.in_(user_ids)
+    abertos = db.session.query(
+        PeriodoAquisitivo.id, PeriodoAquisitivo.user_id, PeriodoAquisitivo.empresa_id, PeriodoAquisitivo.data_inicio
+    ).filter(
+        escopo_periodos,
+        PeriodoAquisitivo.data_fim < hoje,
+        PeriodoAquisitivo.dias_direito > func.coalesce(PeriodoAquisitivo.dias_usados, 0)
+    ).order_by(PeriodoAquisitivo.user_id, PeriodoAquisitivo.data_inicio).all()
+
+    agora = get_brasil_time()
+    linhas, vistos = [], set()
+    for periodo_id, user_id, empresa, data_inicio in abertos:
+        if user_id in vistos: continue
+        vistos.add(user_id)
+        data_limite = _somar_anos(data_inicio, 2)
+        dias_vencimento = (data_limite - hoje).days
+        if dias_vencimento > DIAS_ALERTA_VENCIMENTO: continue
+        linhas.append({
+            'user_id': user_id, 'empresa_id': empresa, 'periodo_id': periodo_id,
+            'status': 'Vencidas' if dias_vencimento < 0 else 'A Vencer', 'dias': abs(dias_vencimento),
+            'data_limite': data_limite, 'created_at': agora, 'updated_at': agora
+        })
+
+    AlertaFerias.query.filter(escopo_alertas).delete(synchronize_session=False)
+    if linhas: db.session.execute(AlertaFerias.__table__.insert(), linhas)
+    return len(linhas)
@@ -0,0 +1,212 @@
+from datetime import timedelta
+from sqlalchemy import case
+from app.extensions import db
+from app.models import User, PontoRegistro, PontoResumo
+from app.utils import get_brasil_time, time_to_minutes
+from app.ponto.escala import meta_do_dia, tem_escala_fixa
+
+# ==============================================================================
+# ⏱️ MOTOR DE RESUMO DIÁRIO (PontoResumo)
+# Cada batida atualiza o resumo do dia com um UPSERT único por (user_id, data_referencia),
+# dentro da MESMA transação da batida. Nada de recarregar o utilizador, reler as
+# batidas do banco ou fazer um segundo commit.
+# ==============================================================================
+
+# Status que o motor calcula sozinho. Qualquer outro (Férias, Atestado, Licença...)
+# é um abono lançado pelo RH e nunca é sobrescrito por uma batida ou recálculo.
+STATUS_CALCULADOS = ('OK', 'Falta', 'Folga', 'Incompleto', 'Hora Extra', 'Débito', 'Extra')
+
+TAMANHO_LOTE_UPSERT = 1000
+
+def resumir_batidas(horas, meta):
+    """
+    Regra única de apuração do dia a partir das batidas já ordenadas.
+    Retorna (minutos_trabalhados, minutos_saldo, status_dia).
+    """
+    trab = 0
+    for i in range(0, len(horas) - 1, 2):
+        trab += time_to_minutes(horas[i + 1]) - time_to_minutes(horas[i])
+
+    saldo = trab - meta
+
+    status = "OK"
+    if not horas:
+        status = "Falta" if meta > 0 else "Folga"
+    elif len(horas) % 2 != 0:
+        status = "Incompleto"
+    elif saldo > 10:
+        status = "Hora Extra"
+    elif saldo < -10:
+        status = "Débito" if meta > 0 else "Extra"
+    return trab, saldo, status
+
+def _insert_do_dialeto():
+    """O UPSERT (ON CONFLICT) é específico de cada banco: Postgres em produção, SQLite em dev."""
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"UPSERT de PontoResumo não suportado no banco '{dialeto}'.")
+    return insert
+
+def upsert_resumos(linhas):
+    """
+    Grava (insere ou atualiza) vários resumos num único comando por lote.
+    Dias já abonados pelo RH mantêm o status, ficam com meta zero e o saldo
+    passa a ser o próprio tempo trabalhado (mesma regra da aprovação de ausências).
+    Não faz commit: quem chama decide a transação.
+    """
+    if not linhas: return 0
+    insert = _insert_do_dialeto()
+    tabela = PontoResumo.__table__
+    agora = get_brasil_time()
+
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_UPSERT):
+        stmt = insert(tabela).values(linhas[inicio:inicio + TAMANHO_LOTE_UPSERT])
+        novo = stmt.excluded
+        calculado = tabela.c.status_dia.in_(STATUS_CALCULADOS)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'data_referencia'],
+            set_={
+                'minutos_trabalhados': novo.minutos_trabalhados,
+                'minutos_esperados': case((calculado, novo.minutos_esperados), else_=0),
+                'minutos_saldo': case((calculado, novo.minutos_saldo), else_=novo.minutos_trabalhados),
+                'status_dia': case((calculado, novo.status_dia), else_=tabela.c.status_dia),
+                'updated_at': agora,
+            }
+        )
+        db.session.execute(stmt)
+    return len(linhas)
+
+def inserir_resumos_ausentes(linhas):
+    """
+    Insere em massa apenas os resumos que ainda não existem (ON CONFLICT DO NOTHING).
+    Idempotente: rodar de novo sobre o mesmo período não altera nada. Não faz commit.
+    """
+    if not linhas: return 0
+    insert = _insert_do_dialeto()
+    tabela = PontoResumo.__table__
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_UPSERT):
+        stmt = insert(tabela).values(linhas[inicio:inicio + TAMANHO_LOTE_UPSERT])
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=['user_id', 'data_referencia']))
+    return len(linhas)
+
+def _linha_resumo(user, data_ref, horas, agora):
+    # Sem escala fixa (Livre, administradores) o dia sem batida é folga, não falta: mesma regra do fechamento
+    meta = meta_do_dia(user, data_ref) if horas or tem_escala_fixa(user) else 0
+    trab, saldo, status = resumir_batidas(horas, meta)
+    return {
+        'user_id': user.id, 'empresa_id': user.empresa_id, 'data_referencia': data_ref,
+        'minutos_trabalhados': trab, 'minutos_esperados': meta, 'minutos_saldo': saldo,
+        'status_dia': status, 'created_at': agora, 'updated_at': agora
+    }
+
+def aplicar_batida(user, data_ref, horas_do_dia):
+    """
+    Aplica uma batida nova ao resumo do dia.
+    `horas_do_dia` são os horários do dia JÁ incluindo a batida nova (as rotas de registo
+    já têm essa lista em memória para decidir o tipo da batida), portanto não há releitura.
+    """
+    horas = sorted(horas_do_dia)
+    upsert_resumos([_linha_resumo(user, data_ref, horas, get_brasil_time())])
+
+def recalcular_intervalo(user_ids, data_inicio, data_fim):
+    """
+    Recalcula em massa os resumos de vários utilizadores num intervalo de datas.
+    São duas leituras (utilizadores e batidas do intervalo) e um UPSERT por lote,
+    independentemente do número de dias. Dias futuros sem batida não são materializados.
+    Não faz commit.
+    """
+    user_ids = list({int(u) for u in user_ids})
+    if not user_ids or data_inicio > data_fim: return 0
+
+    usuarios = User.query.filter(User.id.in_(user_ids)).all()
+
+    batidas = db.session.query(PontoRegistro.user_id, PontoRegistro.data_registro, PontoRegistro.hora_registro).filter(
+        PontoRegistro.user_id.in_(user_ids),
+        PontoRegistro.data_registro >= data_inicio,
+        PontoRegistro.data_registro <= data_fim
+    ).order_by(PontoRegistro.user_id, PontoRegistro.data_registro, PontoRegistro.hora_registro).all()
+
+    horas_por_dia = {}
+    for user_id, data_registro, hora in batidas:
+        horas_por_dia.setdefault((user_id, data_registro), []).append(hora)
+
+    agora = get_brasil_time()
+    hoje = agora.date()
+    total_dias = (data_fim - data_inicio).days + 1
+    linhas = []
+    for u in usuarios:
+        for i in range(total_dias):
+            dia = data_inicio + timedelta(days=i)
+            horas = horas_por_dia.get((u.id, dia), [])
+            if dia > hoje and not horas: continue
+            linhas.append(_linha_resumo(u, dia, horas, agora))
+
+    total = upsert_resumos(linhas)
+    _recontar_ferias(user_ids, data_inicio, data_fim)
+    return total
+
+def _recontar_ferias(user_ids, data_inicio, data_fim):
+    """Um dia passado pode ter virado (ou deixado de ser) falta: reconta o ledger de férias."""
+    hoje = get_brasil_time().date()
+    if data_inicio < hoje:
+        from app.ponto.ferias import atualizar_faltas
+        atualizar_faltas(user_ids, data_inicio, min(data_fim, hoje))
+
+def marcar_ausencia(user_ids, data_inicio, data_fim, status):
+    """
+    Lança um abono (Férias, Atestado, Licença...) em [data_inicio, data_fim] para um ou vários
+    colaboradores num único UPSERT por lote: o dia fica com meta zero e o saldo passa a ser o
+    tempo trabalhado, preservando as batidas já apuradas. Não faz commit.
+    """
+    user_ids = list({int(u) for u in user_ids})
+    if not user_ids or data_inicio > data_fim: return 0
+
+    empresas = dict(db.session.query(User.id, User.empresa_id).filter(User.id.in_(user_ids)).all())
+    agora = get_brasil_time()
+    total_dias = (data_fim - data_inicio).days + 1
+    linhas = [{
+        'user_id': user_id, 'empresa_id': empresa_id, 'data_referencia': data_inicio + timedelta(days=i),
+        'minutos_trabalhados': 0, 'minutos_esperados': 0, 'minutos_saldo': 0,
+        'status_dia': status, 'created_at': agora, 'updated_at': agora
+    } for user_id, empresa_id in empresas.items() for i in range(total_dias)]
+
+    insert = _insert_do_dialeto()
+    tabela = PontoResumo.__table__
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_UPSERT):
+        stmt = insert(tabela).values(linhas[inicio:inicio + TAMANHO_LOTE_UPSERT])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'data_referencia'],
+            set_={
+                'minutos_esperados': 0,
+                'minutos_saldo': tabela.c.minutos_trabalhados,
+                'status_dia': stmt.excluded.status_dia,
+                'updated_at': agora,
+            }
+        )
+        db.session.execute(stmt)
+
+    _recontar_ferias(user_ids, data_inicio, data_fim)
+    return len(linhas)
+
+def reverter_ausencia(user_ids, data_inicio, data_fim, status):
+    """
+    Desfaz um abono: apaga, num único DELETE, os dias do intervalo que ainda estão com `status`
+    e recalcula o intervalo pelas batidas e pela escala (meta do dia, Falta/Folga). Dias com
+    outro abono no meio do intervalo (ex.: um atestado durante as férias) ficam como estão.
+    Não faz commit.
+    """
+    user_ids = list({int(u) for u in user_ids})
+    if not user_ids or data_inicio > data_fim: return 0
+
+    PontoResumo.query.filter(
+        PontoResumo.user_id.in_(user_ids),
+        PontoResumo.data_referencia >= data_inicio,
+        PontoResumo.data_referencia <= data_fim,
+        PontoResumo.status_dia == status
+    ).delete(synchronize_session=False)
+    return recalcular_intervalo(user_ids, data_inicio, data_fim)
+
@@ -0,0 +1,52 @@
+from sqlalchemy import func
+from app.extensions import db
+from app.models import User, PontoRegistro
+from app.ponto.escala import e_dia_de_trabalho
+from app.ponto.ausencias import indice_da_empresa
+
+# ==============================================================================
+# 📋 ESCALA DO DIA (QUEM TRABALHA / QUEM FOLGA)
+# Uma passagem agregada para a empresa inteira: colaboradores, contagem de batidas
+# (GROUP BY) e o índice de ausências. O número de consultas não cresce com o efetivo.
+# ==============================================================================
+
+def montar_escala_dia(empresa_id, data_ref):
+    """Retorna (trabalhando, folga): listas de dicts {'user', 'ausencia', 'batidas', 'qtd_batidas'[, 'motivo']}."""
+    usuarios = User.query.filter(
+        User.empresa_id == empresa_id,
+        User.username != '12345678900'
+    ).order_by(User.real_name).all()
+
+    contagens = dict(db.session.query(PontoRegistro.user_id, func.count(PontoRegistro.id)).join(
+        User, User.id == PontoRegistro.user_id
+    ).filter(
+        User.empresa_id == empresa_id,
+        PontoRegistro.data_registro == data_ref
+    ).group_by(PontoRegistro.user_id).all())
+
+    ausencias = indice_da_empresa(empresa_id)
+    trabalhando, folga = [], []
+
+    for u in usuarios:
+        ausencia = ausencias.ausencia_em(u.id, data_ref)
+        qtd = contagens.get(u.id, 0)
+        info = {'user': u, 'ausencia': ausencia, 'qtd_batidas': qtd,
+                'batidas': f"{qtd} marcações" if qtd else "Sem marcação"}
+
+        if ausencia: info['motivo'] = ausencia.tipo_ausencia; folga.append(info)
+        elif not e_dia_de_trabalho(u, data_ref): info['motivo'] = 'Folga Escala'; folga.append(info)
+        else: trabalhando.append(info)
+
+    return trabalhando, folga
+
+def escala_dia_json(info, situacao):
+    u = info['user']
+    return {
+        'user_id': u.id,
+        'nome': u.real_name,
+        'escala': u.escala,
+        'departamento': u.departamento,
+        'situacao': situacao,
+        'motivo': info.get('motivo'),
+        'qtd_batidas': info['qtd_batidas'],
+    }
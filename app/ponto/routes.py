@@ -1,18 +1,38 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response
 from flask_login import login_required, current_user
 from app.extensions import db, csrf
-from app.models import PontoRegistro, PontoResumo, User, PontoAjuste, SolicitacaoAusencia
-from app.utils import get_brasil_time, calcular_dia, format_minutes_to_hm, data_por_extenso, enviar_notificacao
+from app.models import PontoRegistro, PontoResumo, User, PontoAjuste, SolicitacaoAusencia, AlertaFerias
+from app.utils import get_brasil_time, format_minutes_to_hm, data_por_extenso, enviar_notificacao
+from app.ponto.resumo import aplicar_batida, marcar_ausencia, reverter_ausencia
+from app.ponto.escala import motivo_folga, calendario_mes
+from app.ponto.espelho import carregar_espelho_mes
+from app.ponto.ausencias import indice_do_usuario, invalidar_ausencias
+from app.ponto.roster import montar_escala_dia, escala_dia_json
+from app.ponto.terminal import processar_leituras, proximo_tipo, MAX_LEITURAS_POR_LOTE, VALIDADE_TOKEN_SEGUNDOS, INTERVALO_MINIMO_SEGUNDOS
+from app.ponto.tokens import consumir_token, liberar_token, marcar_batida, batida_recente
+from app.ponto.eventos import obter_canal, publicar_batida
+from app.ponto.ferias import saldo_ferias, garantir_periodos, registrar_pedido_ferias, reconstruir_ferias
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, contains_eager
 import logging
-import calendar
+import click
+import json
+import queue
+import time
 
 logger = logging.getLogger(__name__)
 
 ponto_bp = Blueprint('ponto', __name__, template_folder='templates', url_prefix='/ponto')
 
+# Tempo máximo de cada conexão SSE (o QR-Code vale 35s; o navegador reconecta depois disso)
+DURACAO_CONEXAO_SSE = 30
+# Paginação da gestão de ausências
+ALERTAS_POR_PAGINA = 12
+SOLICITACOES_POR_PAGINA = 50
+
 @ponto_bp.route('/api/gerar-token', methods=['GET'])
 @login_required
 def gerar_token_qrcode():
@@ -21,17 +41,63 @@ def gerar_token_qrcode():
     token = s.dumps({'user_id': current_user.id, 'timestamp': get_brasil_time().timestamp()})
     return jsonify({'token': token})
 
-@ponto_bp.route('/api/check-status', methods=['GET'])
-@login_required
-def check_status_ponto():
-    if current_user.role == 'Terminal': return jsonify({'status': 'ignorar'})
+def _batida_recente(user_id):
+    """Resposta do check-status: a última batida, se foi gravada há menos de 15 segundos."""
     agora = get_brasil_time()
-    ultimo_ponto = PontoRegistro.query.filter_by(user_id=current_user.id).order_by(PontoRegistro.id.desc()).first()
+    ultimo_ponto = PontoRegistro.query.filter_by(user_id=user_id).order_by(PontoRegistro.id.desc()).first()
     if ultimo_ponto:
         dt_ponto = datetime.combine(ultimo_ponto.data_registro, ultimo_ponto.hora_registro)
         if (agora - dt_ponto).total_seconds() < 15:
-            return jsonify({'marcado': True, 'tipo': ultimo_ponto.tipo, 'hora': ultimo_ponto.hora_registro.strftime('%H:%M')})
-    return jsonify({'marcado': False})
+            return {'marcado': True, 'tipo': ultimo_ponto.tipo, 'hora': ultimo_ponto.hora_registro.strftime('%H:%M')}
+    return {'marcado': False}
+
+@ponto_bp.route('/api/check-status', methods=['GET'])
+@login_required
+def check_status_ponto():
+    if current_user.role == 'Terminal': return jsonify({'status': 'ignorar'})
+    return jsonify(_batida_recente(current_user.id))
+
+@ponto_bp.route('/api/eventos', methods=['GET'])
+@login_required
+def eventos_ponto():
+    """
+    Server-Sent Events da tela do QR-Code: a confirmação chega assim que o terminal grava a batida.
+    A conexão dura no máximo DURACAO_CONEXAO_SSE segundos (o navegador reconecta sozinho) e não
+    segura conexão do banco enquanto espera. Sem vaga, responde 503 e a página volta ao polling.
+    """
+    if current_user.role == 'Terminal': return jsonify({'status': 'ignorar'})
+    user_id = current_user.id
+    canal = obter_canal()
+    fila, entregue = None, False
+    # A vaga só fica presa se a resposta sair: qualquer erro até lá a devolve no finally
+    try:
+        fila = canal.assinar(user_id)
+        if fila is None: return jsonify({'error': 'Limite de conexões em tempo real atingido.'}), 503
+
+        # Batida gravada entre o carregamento da página e a abertura do canal
+        inicial = _batida_recente(user_id)
+
+        def gerar():
+            yield "retry: 3000\n\n"
+            if inicial['marcado']:
+                yield f"data: {json.dumps(inicial)}\n\n"
+                return
+            limite = time.monotonic() + DURACAO_CONEXAO_SSE
+            while (restante := limite - time.monotonic()) > 0:
+                try:
+                    evento = fila.get(timeout=min(15, restante))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {json.dumps(evento)}\n\n"
+                return
+
+        resposta = Response(gerar(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        resposta.call_on_close(lambda: canal.cancelar(user_id, fila))
+        entregue = True
+        return resposta
+    finally:
+        if fila is not None and not entregue: canal.cancelar(user_id, fila)
 
 @ponto_bp.route('/api/registrar-leitura', methods=['POST'])
 @login_required
@@ -42,26 +108,29 @@ def registrar_leitura_terminal():
     if not token: return jsonify({'error': 'Token vazio'}), 400
     
     s = URLSafeTimedSerializer(current_app.secret_key)
+    consumido = False
     try:
-        dados = s.loads(token, max_age=35)
+        dados, emitido = s.loads(token, max_age=VALIDADE_TOKEN_SEGUNDOS, return_timestamp=True)
+
+        # Recusas em O(1), antes de qualquer consulta: QR já usado ou batida de segundos atrás
+        if batida_recente(dados['user_id']): return jsonify({'error': 'Aguarde antes de bater o ponto novamente.'}), 400
+        if not consumir_token(token, emitido.timestamp(), VALIDADE_TOKEN_SEGUNDOS): return jsonify({'error': 'QR Code já utilizado.'}), 400
+        consumido = True
+
         user_alvo = User.query.get(dados['user_id'])
         if not user_alvo: return jsonify({'error': 'Usuário inválido'}), 404
         
         tempo_agora = get_brasil_time()
         hoje = tempo_agora.date()
         
-        ultimo = PontoRegistro.query.filter_by(user_id=user_alvo.id, data_registro=hoje).order_by(PontoRegistro.hora_registro.desc()).first()
-        if ultimo:
-            dt_ultimo = datetime.combine(hoje, ultimo.hora_registro)
-            if (tempo_agora - dt_ultimo).total_seconds() < 60:
+        # Uma consulta só: a última batida do dia sai da mesma lista que define o tipo da próxima
+        pontos_hoje = PontoRegistro.query.filter_by(user_id=user_alvo.id, data_registro=hoje).order_by(PontoRegistro.hora_registro).all()
+        if pontos_hoje:
+            dt_ultimo = datetime.combine(hoje, pontos_hoje[-1].hora_registro)
+            if (tempo_agora - dt_ultimo).total_seconds() < INTERVALO_MINIMO_SEGUNDOS:
                  return jsonify({'error': f'Aguarde antes de bater o ponto novamente.'}), 400
 
-        pontos_hoje = PontoRegistro.query.filter_by(user_id=user_alvo.id, data_registro=hoje).order_by(PontoRegistro.hora_registro).all()
-        proxima = "Entrada"
-        if len(pontos_hoje) == 1: proxima = "Ida Almoço"
-        elif len(pontos_hoje) == 2: proxima = "Volta Almoço"
-        elif len(pontos_hoje) == 3: proxima = "Saída"
-        elif len(pontos_hoje) >= 4: proxima = "Extra"
+        proxima = proximo_tipo(len(pontos_hoje))
         
         novo = PontoRegistro(
             user_id=user_alvo.id, 
@@ -71,8 +140,11 @@ def registrar_leitura_terminal():
             latitude='QR-Code', 
             longitude='Presencial'
         )
-        db.session.add(novo); db.session.commit()
-        calcular_dia(user_alvo.id, hoje)
+        db.session.add(novo)
+        aplicar_batida(user_alvo, hoje, [p.hora_registro for p in pontos_hoje] + [novo.hora_registro])
+        db.session.commit()
+        marcar_batida(user_alvo.id, INTERVALO_MINIMO_SEGUNDOS)
+        publicar_batida(user_alvo.id, proxima, novo.hora_registro.strftime('%H:%M'))
         return jsonify({
             'success': True, 
             'message': f'Ponto registrado: {proxima}', 
@@ -82,7 +154,36 @@ def registrar_leitura_terminal():
         })
     except SignatureExpired: return jsonify({'error': 'QR Code expirado.'}), 400
     except BadSignature: return jsonify({'error': 'QR Code inválido.'}), 400
-    except Exception as e: return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+    except Exception as e:
+        db.session.rollback()
+        if consumido: liberar_token(token)
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@ponto_bp.route('/api/registrar-leituras', methods=['POST'])
+@login_required
+@csrf.exempt
+def registrar_leituras_lote():
+    """Recebe várias leituras do terminal num único pedido e devolve o resultado de cada uma."""
+    if current_user.role != 'Terminal' and current_user.role != 'Master': return jsonify({'error': 'Acesso negado.'}), 403
+    leituras = (request.get_json(silent=True) or {}).get('leituras')
+    if not isinstance(leituras, list) or not leituras: return jsonify({'error': 'Nenhuma leitura enviada.'}), 400
+    if len(leituras) > MAX_LEITURAS_POR_LOTE: return jsonify({'error': f'Máximo de {MAX_LEITURAS_POR_LOTE} leituras por lote.'}), 413
+
+    try:
+        try:
+            resultados = processar_leituras(leituras, current_app.secret_key, get_brasil_time())
+        except IntegrityError:
+            # Outra sincronização gravou as mesmas chaves ao mesmo tempo: refaz e elas voltam como duplicadas
+            db.session.rollback()
+            resultados = processar_leituras(leituras, current_app.secret_key, get_brasil_time())
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Falha ao gravar lote de leituras do terminal: {e}")
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+    for r in resultados:
+        if r.get('success') and not r.get('duplicado'): publicar_batida(r['user_id'], r['tipo'], r['hora'])
+    return jsonify({'success': True, 'resultados': resultados})
 
 @ponto_bp.route('/scanner')
 @login_required
@@ -100,17 +201,12 @@ def registrar_ponto():
     hoje_extenso = data_por_extenso(hoje)
     bloqueado, motivo = False, ""
     
-    ausencia = SolicitacaoAusencia.query.filter(
-        SolicitacaoAusencia.user_id == current_user.id, 
-        SolicitacaoAusencia.status == 'Aprovado', 
-        SolicitacaoAusencia.data_inicio <= hoje, 
-        SolicitacaoAusencia.data_fim >= hoje
-    ).first()
+    ausencia = indice_do_usuario(current_user.id).ausencia_em(current_user.id, hoje)
     
     if ausencia: bloqueado = True; motivo = f"Afastamento programado: {ausencia.tipo_ausencia}"
-    elif current_user.escala == '5x2' and hoje.weekday() >= 5: bloqueado = True; motivo = "Fim de semana (Escala 5x2)."
-    elif current_user.escala == '12x36' and current_user.data_inicio_escala:
-        if (hoje - current_user.data_inicio_escala).days % 2 != 0: bloqueado = True; motivo = "Dia de folga (Escala 12x36)."
+    else:
+        motivo = motivo_folga(current_user, hoje) or ""
+        bloqueado = bool(motivo)
 
     pontos = PontoRegistro.query.filter_by(user_id=current_user.id, data_registro=hoje).order_by(PontoRegistro.hora_registro).all()
     prox = "Entrada"
@@ -130,8 +226,8 @@ def registrar_ponto():
             longitude=request.form.get('longitude')
         )
         db.session.add(novo_registro)
+        aplicar_batida(current_user, hoje, [p.hora_registro for p in pontos] + [novo_registro.hora_registro])
         db.session.commit()
-        calcular_dia(current_user.id, hoje)
         return redirect(url_for('main.dashboard'))
     return render_template('ponto/registro.html', proxima_acao=prox, hoje_extenso=hoje_extenso, pontos=pontos, bloqueado=bloqueado, motivo=motivo, hoje=hoje)
 
@@ -145,22 +241,18 @@ def espelho_ponto():
     agora_br = get_brasil_time()
     mes_ref = request.args.get('mes_ref') or agora_br.strftime('%Y-%m')
     
-    try: ano, mes = map(int, mes_ref.split('-'))
-    except: ano, mes = agora_br.year, agora_br.month; mes_ref = agora_br.strftime('%Y-%m')
-    
-    resumos = PontoResumo.query.filter(
-        PontoResumo.user_id == target_user_id, 
-        func.extract('year', PontoResumo.data_referencia) == ano, 
-        func.extract('month', PontoResumo.data_referencia) == mes
-    ).order_by(PontoResumo.data_referencia).all()
+    try:
+        mes_dt = datetime.strptime(mes_ref, '%Y-%m')
+        ano, mes = mes_dt.year, mes_dt.month
+    except ValueError:
+        ano, mes = agora_br.year, agora_br.month; mes_ref = agora_br.strftime('%Y-%m')
     
-    detalhes = {}
-    for r in resumos:
-        batidas = PontoRegistro.query.filter_by(user_id=target_user_id, data_registro=r.data_referencia).order_by(PontoRegistro.hora_registro).all()
-        detalhes[r.id] = [b.hora_registro.strftime('%H:%M') for b in batidas]
+    resumos, apuracao = carregar_espelho_mes(user, ano, mes)
+    detalhes = {r.id: apuracao.horarios(0, apuracao.coluna(r.data_referencia)) for r in resumos}
+    totais = {chave: int(valor[0]) for chave, valor in apuracao.totais().items()}
     
     dias_semana = {0: 'Seg', 1: 'Ter', 2: 'Qua', 3: 'Qui', 4: 'Sex', 5: 'Sáb', 6: 'Dom'}
-    return render_template('ponto/ponto_espelho.html', resumos=resumos, user=user, detalhes=detalhes, format_hm=format_minutes_to_hm, mes_ref=mes_ref, dias_semana=dias_semana)
+    return render_template('ponto/ponto_espelho.html', resumos=resumos, user=user, detalhes=detalhes, totais=totais, format_hm=format_minutes_to_hm, mes_ref=mes_ref, dias_semana=dias_semana)
 
 @ponto_bp.route('/solicitar-ajuste', methods=['GET', 'POST'])
 @login_required
@@ -211,25 +303,18 @@ def minha_escala():
     hoje = get_brasil_time().date()
     ano = request.args.get('ano', hoje.year, type=int)
     mes = request.args.get('mes', hoje.month, type=int)
-    _, num_dias = calendar.monthrange(ano, mes)
+    calendario = calendario_mes(current_user, ano, mes)
+    ausencias = indice_do_usuario(current_user.id)
     dias_mes = []
     
-    for dia in range(1, num_dias + 1):
-        dt_atual = date(ano, mes, dia)
+    for i, trabalho in enumerate(calendario.trabalho):
+        dt_atual = date(ano, mes, i + 1)
         tipo_dia = 'Trabalho'
         
-        ausencia = SolicitacaoAusencia.query.filter(
-            SolicitacaoAusencia.user_id == current_user.id,
-            SolicitacaoAusencia.status == 'Aprovado',
-            SolicitacaoAusencia.data_inicio <= dt_atual,
-            SolicitacaoAusencia.data_fim >= dt_atual
-        ).first()
+        ausencia = ausencias.ausencia_em(current_user.id, dt_atual)
         
         if ausencia: tipo_dia = ausencia.tipo_ausencia
-        else:
-            if current_user.escala == '5x2' and dt_atual.weekday() >= 5: tipo_dia = 'Folga'
-            elif current_user.escala == '12x36' and current_user.data_inicio_escala:
-                if (dt_atual - current_user.data_inicio_escala).days % 2 != 0: tipo_dia = 'Folga'
+        elif not trabalho: tipo_dia = 'Folga'
         
         dia_semana_layout = (dt_atual.weekday() + 1) % 7 
         dias_mes.append({'data': dt_atual, 'tipo': tipo_dia, 'dia_semana': dia_semana_layout})
@@ -242,33 +327,12 @@ def solicitar_ferias():
     if not current_user.data_admissao:
         flash("Sua data de admissão não está cadastrada. Solicite ao RH para regularizar.", "warning")
 
-    dias_direito = 30
-    faltas = 0
-    saldo = 0
-    dias_usados = 0
-
-    if current_user.data_admissao:
-        hoje = get_brasil_time().date()
-        um_ano_atras = hoje - timedelta(days=365)
-        faltas = PontoResumo.query.filter(
-            PontoResumo.user_id == current_user.id, 
-            PontoResumo.data_referencia >= um_ano_atras, 
-            PontoResumo.status_dia == 'Falta'
-        ).count()
-
-        if faltas <= 5: dias_direito = 30
-        elif faltas <= 14: dias_direito = 24
-        elif faltas <= 23: dias_direito = 18
-        elif faltas <= 32: dias_direito = 12
-        else: dias_direito = 0
-
-        ausencias_ano = SolicitacaoAusencia.query.filter(
-            SolicitacaoAusencia.user_id == current_user.id, 
-            SolicitacaoAusencia.tipo_ausencia == 'Férias', 
-            SolicitacaoAusencia.status.in_(['Aprovado', 'Pendente'])
-        ).all()
-        dias_usados = sum(a.quantidade_dias + a.dias_abono for a in ausencias_ano)
-        saldo = dias_direito - dias_usados
+    # Pedido novo: o período que fechou hoje ainda pode não estar no ledger (o fechamento é noturno)
+    if request.method == 'POST' and garantir_periodos([current_user]): db.session.commit()
+
+    # Saldo lido do ledger de férias (períodos aquisitivos já adquiridos)
+    saldo_atual = saldo_ferias(current_user)
+    dias_direito, faltas, saldo, dias_usados = saldo_atual.dias_direito, saldo_atual.faltas, saldo_atual.saldo, saldo_atual.dias_usados
 
     if request.method == 'POST':
         tipo = request.form.get('tipo_ausencia')
@@ -291,8 +355,8 @@ def solicitar_ferias():
 
             if vender_ferias:
                 dias_abono = qtd_dias // 2 
-                if dias_abono > (dias_direito / 3):
-                    flash(f"A CLT permite vender no máximo 1/3 das férias (Max: {int(dias_direito/3)} dias).", "error")
+                if dias_abono > (saldo_atual.direito_referencia / 3):
+                    flash(f"A CLT permite vender no máximo 1/3 das férias (Max: {int(saldo_atual.direito_referencia/3)} dias).", "error")
                     return redirect(url_for('ponto.solicitar_ferias'))
                 total_descontado = qtd_dias + dias_abono
                 if total_descontado > saldo:
@@ -321,7 +385,9 @@ def solicitar_ferias():
             dias_abono=dias_abono, 
             observacao=obs
         )
-        db.session.add(nova_solicitacao); db.session.commit()
+        db.session.add(nova_solicitacao)
+        registrar_pedido_ferias(nova_solicitacao)
+        db.session.commit()
         
         # GATILHO NOTIFICAÇÃO MASTER
         master = User.query.filter_by(username='50097952800').first()
@@ -343,19 +409,13 @@ def gestao_ausencias():
         solic_id = request.form.get('solicitacao_id')
         acao = request.form.get('acao')
         solicitacao = SolicitacaoAusencia.query.get_or_404(solic_id)
+        status_anterior = solicitacao.status
         
+        fim_ausencia = solicitacao.data_inicio + timedelta(days=solicitacao.quantidade_dias - 1)
+
         if acao == 'aprovar':
             solicitacao.status = 'Aprovado'
-            for i in range(solicitacao.quantidade_dias):
-                dia_atual = solicitacao.data_inicio + timedelta(days=i)
-                ponto = PontoResumo.query.filter_by(user_id=solicitacao.user_id, data_referencia=dia_atual).first()
-                if ponto:
-                    ponto.status_dia = solicitacao.tipo_ausencia
-                    ponto.minutos_esperados = 0
-                    ponto.minutos_saldo = ponto.minutos_trabalhados
-                else:
-                    novo_ponto = PontoResumo(user_id=solicitacao.user_id, data_referencia=dia_atual, minutos_trabalhados=0, minutos_esperados=0, minutos_saldo=0, status_dia=solicitacao.tipo_ausencia)
-                    db.session.add(novo_ponto)
+            marcar_ausencia([solicitacao.user_id], solicitacao.data_inicio, fim_ausencia, solicitacao.tipo_ausencia)
             
             # GATILHO NOTIFICAÇÃO COLABORADOR
             enviar_notificacao(solicitacao.user_id, f"A sua solicitação de {solicitacao.tipo_ausencia} foi APROVADA.", "/ponto/solicitar-ferias")
@@ -369,59 +429,42 @@ def gestao_ausencias():
             
         elif acao == 'remover':
             if solicitacao.status == 'Aprovado':
-                user = solicitacao.user
-                for i in range(solicitacao.quantidade_dias):
-                    dia_atual = solicitacao.data_inicio + timedelta(days=i)
-                    ponto = PontoResumo.query.filter_by(user_id=solicitacao.user_id, data_referencia=dia_atual).first()
-                    if ponto and ponto.status_dia == solicitacao.tipo_ausencia:
-                        meta = user.carga_horaria or 528
-                        if user.escala == '5x2' and dia_atual.weekday() >= 5: meta = 0
-                        elif user.escala == '12x36' and user.data_inicio_escala:
-                            if (dia_atual - user.data_inicio_escala).days % 2 != 0: meta = 0
-                            else: meta = 720
-                        ponto.status_dia = 'OK'
-                        ponto.minutos_esperados = meta
-                        ponto.minutos_saldo = ponto.minutos_trabalhados - meta
+                reverter_ausencia([solicitacao.user_id], solicitacao.data_inicio, fim_ausencia, solicitacao.tipo_ausencia)
             solicitacao.status = 'Cancelado'
             enviar_notificacao(solicitacao.user_id, f"O seu período de {solicitacao.tipo_ausencia} foi CANCELADO pela empresa.", "/ponto/solicitar-ferias")
             flash("Férias revogadas com sucesso. O espelho de ponto foi restaurado.", "success")
             
+        if solicitacao.status != status_anterior: registrar_pedido_ferias(solicitacao)
         db.session.commit()
+        invalidar_ausencias(solicitacao.user_id)
         return redirect(url_for('ponto.gestao_ausencias'))
 
-    alertas_vencimento = []
-    hoje = get_brasil_time().date()
-    usuarios_clt = User.query.filter(User.username != '12345678900', User.data_admissao.isnot(None)).all()
-    
-    for u in usuarios_clt:
-        dias_trabalhados = (hoje - u.data_admissao).days
-        anos_completos = dias_trabalhados // 365
-        
-        if anos_completos >= 1:
-            ausencias = SolicitacaoAusencia.query.filter_by(user_id=u.id, tipo_ausencia='Férias', status='Aprovado').all()
-            dias_usados = sum(a.quantidade_dias + a.dias_abono for a in ausencias)
-            
-            saldo_teorico = (anos_completos * 30) - dias_usados
-            
-            if saldo_teorico > 0:
-                ciclos_pendentes = saldo_teorico / 30.0
-                ciclo_critico = anos_completos - int(ciclos_pendentes) + 1
-                anos_para_somar = ciclo_critico + 1
-                
-                try:
-                    data_limite = u.data_admissao.replace(year=u.data_admissao.year + anos_para_somar)
-                except ValueError:
-                    data_limite = u.data_admissao + timedelta(days=365 * anos_para_somar)
-                    
-                dias_vencimento = (data_limite - hoje).days
-                
-                if dias_vencimento < 0:
-                    alertas_vencimento.append({'user': u, 'status': 'Vencidas', 'dias': abs(dias_vencimento), 'msg': 'Prazo concessivo estourado. Risco alto de multa/dobro!'})
-                elif dias_vencimento <= 90:
-                    alertas_vencimento.append({'user': u, 'status': 'A Vencer', 'dias': dias_vencimento, 'msg': f'Vence em {dias_vencimento} dias (Data limite: {data_limite.strftime("%d/%m/%Y")}).'})
-
-    todas_solicitacoes = SolicitacaoAusencia.query.order_by(SolicitacaoAusencia.data_solicitacao.desc()).all()
-    return render_template('ponto/gestao_ausencias.html', solicitacoes=todas_solicitacoes, alertas=alertas_vencimento)
+    # Alertas de vencimento já calculados (fechamento noturno e mudanças no ledger de férias)
+    alertas = AlertaFerias.query.filter(AlertaFerias.empresa_id == current_user.empresa_id).options(
+        joinedload(AlertaFerias.user)
+    ).order_by(AlertaFerias.data_limite, AlertaFerias.id).paginate(
+        page=request.args.get('pagina_alertas', 1, type=int), per_page=ALERTAS_POR_PAGINA, error_out=False
+    )
+
+    # Histórico por keyset (data do pedido, id): o custo de cada página não cresce com o histórico
+    query = SolicitacaoAusencia.query.join(SolicitacaoAusencia.user).filter(
+        User.empresa_id == current_user.empresa_id
+    ).options(contains_eager(SolicitacaoAusencia.user))
+    cursor = request.args.get('apos')
+    if cursor:
+        try:
+            data_cursor, id_cursor = cursor.rsplit('_', 1)
+            query = query.filter(tuple_(SolicitacaoAusencia.data_solicitacao, SolicitacaoAusencia.id) < (datetime.fromisoformat(data_cursor), int(id_cursor)))
+        except ValueError:
+            return redirect(url_for('ponto.gestao_ausencias'))
+    solicitacoes = query.order_by(SolicitacaoAusencia.data_solicitacao.desc(), SolicitacaoAusencia.id.desc()).limit(SOLICITACOES_POR_PAGINA + 1).all()
+
+    proximo_cursor = None
+    if len(solicitacoes) > SOLICITACOES_POR_PAGINA:
+        solicitacoes = solicitacoes[:SOLICITACOES_POR_PAGINA]
+        ultima = solicitacoes[-1]
+        proximo_cursor = f"{ultima.data_solicitacao.isoformat()}_{ultima.id}"
+    return render_template('ponto/gestao_ausencias.html', solicitacoes=solicitacoes, alertas=alertas, proximo_cursor=proximo_cursor, cursor_atual=cursor)
 
 @ponto_bp.route('/admin/controle-escala', methods=['GET'])
 @login_required
@@ -431,30 +474,66 @@ def controle_escala():
     if data_str: data_ref = datetime.strptime(data_str, '%Y-%m-%d').date()
     else: data_ref = get_brasil_time().date()
     
-    usuarios = User.query.filter(User.username != '12345678900').order_by(User.real_name).all()
-    trabalhando, folga = [], []
-    
-    for u in usuarios:
-        ausencia = SolicitacaoAusencia.query.filter(
-            SolicitacaoAusencia.user_id == u.id, 
-            SolicitacaoAusencia.status == 'Aprovado', 
-            SolicitacaoAusencia.data_inicio <= data_ref, 
-            SolicitacaoAusencia.data_fim >= data_ref
-        ).first()
-        
-        escala_trabalho = True
-        if u.escala == '5x2' and data_ref.weekday() >= 5: escala_trabalho = False
-        elif u.escala == '12x36' and u.data_inicio_escala:
-            if (data_ref - u.data_inicio_escala).days % 2 != 0: escala_trabalho = False
-        
-        pontos = PontoRegistro.query.filter_by(user_id=u.id, data_registro=data_ref).order_by(PontoRegistro.hora_registro).all()
-        status_batida = f"{len(pontos)} marcações" if pontos else "Sem marcação"
-        info = {'user': u, 'ausencia': ausencia, 'batidas': status_batida}
-        
-        if ausencia: info['motivo'] = ausencia.tipo_ausencia; folga.append(info)
-        elif not escala_trabalho: info['motivo'] = 'Folga Escala'; folga.append(info)
-        else: trabalhando.append(info)
-            
+    trabalhando, folga = montar_escala_dia(current_user.empresa_id, data_ref)
     return render_template('ponto/controle_escala.html', trabalhando=trabalhando, folga=folga, data_ref=data_ref)
 
-
+@ponto_bp.route('/api/roster', methods=['GET'])
+@login_required
+def api_roster():
+    """Escala do dia paginada em JSON (tablets dos supervisores)."""
+    if current_user.role != 'Master' and current_user.username != '50097952800': return jsonify({'error': 'Acesso negado.'}), 403
+    data_str = request.args.get('data_ref')
+    try: data_ref = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else get_brasil_time().date()
+    except ValueError: return jsonify({'error': 'data_ref inválida (use AAAA-MM-DD).'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    situacao = request.args.get('situacao')
+
+    trabalhando, folga = montar_escala_dia(current_user.empresa_id, data_ref)
+    itens = []
+    if situacao in (None, '', 'Trabalho'): itens += [escala_dia_json(i, 'Trabalho') for i in trabalhando]
+    if situacao in (None, '', 'Folga'): itens += [escala_dia_json(i, 'Folga') for i in folga]
+
+    inicio = (page - 1) * per_page
+    return jsonify({
+        'data_ref': data_ref.strftime('%Y-%m-%d'),
+        'resumo': {'trabalhando': len(trabalhando), 'folga': len(folga),
+                   'sem_marcacao': sum(1 for i in trabalhando if not i['qtd_batidas'])},
+        'page': page, 'per_page': per_page, 'total': len(itens),
+        'pages': (len(itens) + per_page - 1) // per_page,
+        'itens': itens[inicio:inicio + per_page]
+    })
+
+
+
+# ==============================================================================
+# 🌙 COMANDOS AGENDADOS (CRON / CLOUD SCHEDULER): flask ponto <comando>
+# ==============================================================================
+@ponto_bp.cli.command('fechar-dia')
+@click.option('--data', 'data_str', default=None, help='Último dia a fechar (AAAA-MM-DD). Padrão: ontem.')
+@click.option('--desde', 'desde_str', default=None, help='Reprocessa a partir deste dia, ignorando o checkpoint.')
+@click.option('--empresa', 'slug', default=None, help='Slug de uma empresa específica.')
+def comando_fechar_dia(data_str, desde_str, slug):
+    """Materializa Falta/Folga/Ausência para os dias sem PontoResumo."""
+    from app.ponto.fechamento import fechar_dias
+    data_fim = datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else None
+    data_inicio = datetime.strptime(desde_str, '%Y-%m-%d').date() if desde_str else None
+    for empresa, total in fechar_dias(data_fim, data_inicio, slug).items():
+        click.echo(f"{empresa}: " + ("ERRO (ver log)" if total is None else f"{total} dias verificados"))
+
+@ponto_bp.cli.command('recalcular-ferias')
+@click.option('--empresa', 'slug', default=None, help='Slug de uma empresa específica.')
+def comando_recalcular_ferias(slug):
+    """Refaz do zero o ledger de férias (períodos aquisitivos, faltas e dias usados)."""
+    from app.models import Empresa
+    query = Empresa.query.filter(Empresa.deleted_at.is_(None))
+    if slug: query = query.filter(Empresa.slug == slug)
+    for empresa in query.order_by(Empresa.id).all():
+        usuarios = User.query.filter(User.empresa_id == empresa.id, User.username != '12345678900', User.data_admissao.isnot(None)).all()
+        try:
+            reconstruir_ferias(usuarios)
+            db.session.commit()
+            click.echo(f"{empresa.slug}: {len(usuarios)} colaboradores")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"{empresa.slug}: ERRO ({e})")
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import func
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from app.extensions import db
+from app.models import User, PontoRegistro
+from app.ponto.resumo import recalcular_intervalo
+from app.ponto.tokens import consumir_token, liberar_token, marcar_batida
+
+# ==============================================================================
+# 📟 INGESTÃO EM LOTE DO TERMINAL DE QR-CODE
+# O terminal envia N leituras de uma vez. Tudo é validado em memória, os
+# colaboradores são resolvidos num único IN, os tipos de batida saem de uma única
+# consulta agrupada e todas as batidas entram numa única transação.
+# Cada leitura traz uma chave gerada no terminal: reenviar a fila offline é seguro.
+# ==============================================================================
+
+FUSO_BR = pytz.timezone('America/Sao_Paulo')
+
+# Mesma validade do QR-Code da leitura unitária, medida entre a emissão e a captura
+VALIDADE_TOKEN_SEGUNDOS = 35
+# Tolerância para relógios de terminal ligeiramente adiantados
+TOLERANCIA_RELOGIO_SEGUNDOS = 60
+# Leituras capturadas há mais tempo que isto são recusadas
+JANELA_MAXIMA_CAPTURA = timedelta(hours=12)
+# Intervalo mínimo entre duas batidas do mesmo colaborador
+INTERVALO_MINIMO_SEGUNDOS = 60
+# Até quando um QR lido offline ainda pode chegar num lote (e, portanto, ser reaproveitado)
+JANELA_TOKEN_LOTE_SEGUNDOS = VALIDADE_TOKEN_SEGUNDOS + int(JANELA_MAXIMA_CAPTURA.total_seconds())
+
+MAX_LEITURAS_POR_LOTE = 200
+TAMANHO_MAXIMO_CHAVE = 64
+
+SEQUENCIA_TIPOS = ["Entrada", "Ida Almoço", "Volta Almoço", "Saída"]
+
+def proximo_tipo(qtd_batidas):
+    return SEQUENCIA_TIPOS[qtd_batidas] if qtd_batidas < len(SEQUENCIA_TIPOS) else "Extra"
+
+def _para_horario_brasil(valor):
+    """Aceita epoch em milissegundos (Date.now() do navegador) ou ISO 8601."""
+    if isinstance(valor, (int, float)):
+        dt = datetime.fromtimestamp(valor / 1000, tz=pytz.utc)
+    else:
+        dt = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+        if dt.tzinfo is None: return dt
+    return dt.astimezone(FUSO_BR).replace(tzinfo=None)
+
+def _validar(serializer, leitura, agora):
+    """Retorna (user_id, capturado_em, emitido_em epoch) ou lança ValueError com a mensagem para o terminal."""
+    token = (leitura or {}).get('token')
+    if not token: raise ValueError('Token vazio')
+    try:
+        dados, emitido_utc = serializer.loads(token, return_timestamp=True)
+    except BadSignature:
+        raise ValueError('QR Code inválido.')
+
+    capturado_em = agora
+    if leitura.get('capturado_em') is not None:
+        try: capturado_em = _para_horario_brasil(leitura['capturado_em'])
+        except (ValueError, TypeError, OverflowError): raise ValueError('Horário de captura inválido.')
+
+    if (capturado_em - agora).total_seconds() > TOLERANCIA_RELOGIO_SEGUNDOS:
+        raise ValueError('Horário de captura no futuro.')
+    if agora - capturado_em > JANELA_MAXIMA_CAPTURA:
+        raise ValueError('Leitura antiga demais para sincronizar.')
+
+    emitido_em = emitido_utc.astimezone(FUSO_BR).replace(tzinfo=None)
+    idade = (capturado_em - emitido_em).total_seconds()
+    if idade > VALIDADE_TOKEN_SEGUNDOS or idade < -TOLERANCIA_RELOGIO_SEGUNDOS:
+        raise ValueError('QR Code expirado.')
+    return int(dados['user_id']), capturado_em.replace(microsecond=0), emitido_utc.timestamp()
+
+def _chave(leitura):
+    chave = leitura.get('chave') if isinstance(leitura, dict) else None
+    if chave is None: return None
+    chave = str(chave).strip()
+    if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE: raise ValueError('Chave de idempotência inválida.')
+    return chave
+
+def _ja_registradas(chaves):
+    """Batidas já gravadas para as chaves informadas (uma consulta), indexadas pela chave."""
+    if not chaves: return {}
+    linhas = db.session.query(
+        PontoRegistro.chave_idempotencia, PontoRegistro.user_id, PontoRegistro.tipo,
+        PontoRegistro.hora_registro, User.real_name
+    ).join(User, User.id == PontoRegistro.user_id).filter(
+        PontoRegistro.chave_idempotencia.in_(chaves)
+    ).all()
+    return {l.chave_idempotencia: l for l in linhas}
+
+def _resultado_duplicado(original):
+    return {'success': True, 'duplicado': True, 'message': f'Ponto já registrado: {original.tipo}',
+            'funcionario': original.real_name, 'hora': original.hora_registro.strftime('%H:%M'),
+            'tipo': original.tipo, 'user_id': original.user_id}
+
+def processar_leituras(leituras, secret_key, agora):
+    """
+    Processa um lote de leituras [{'chave': ..., 'token': ..., 'capturado_em': ...}, ...].
+    Retorna a lista de resultados na mesma ordem da entrada. Faz o commit do lote.
+    Uma leitura reenviada com a mesma `chave` não gera nova batida: volta como
+    `duplicado`, com os dados da batida original, para o terminal tirá-la da fila.
+    """
+    serializer = URLSafeTimedSerializer(secret_key)
+    resultados = [None] * len(leituras)
+    validas = []
+
+    chaves = [None] * len(leituras)
+    for i, leitura in enumerate(leituras):
+        try: chaves[i] = _chave(leitura)
+        except ValueError as e: resultados[i] = {'success': False, 'error': str(e)}
+    registradas = _ja_registradas({c for c in chaves if c})
+
+    primeira, repetidas, consumidos = {}, [], {}
+    for i, leitura in enumerate(leituras):
+        if resultados[i]: continue
+        chave = chaves[i]
+        if chave in registradas:
+            resultados[i] = _resultado_duplicado(registradas[chave])
+            continue
+        if chave in primeira:
+            repetidas.append((i, primeira[chave]))
+            continue
+        if chave: primeira[chave] = i
+        try:
+            user_id, capturado_em, emitido_em = _validar(serializer, leitura, agora)
+            # Um QR vale uma batida: replays (outro terminal, ou a mesma leitura com outra chave) param aqui
+            if not consumir_token(leitura['token'], emitido_em, JANELA_TOKEN_LOTE_SEGUNDOS, dono=chave):
+                raise ValueError('QR Code já utilizado.')
+            consumidos[i] = leitura['token']
+            validas.append((i, user_id, capturado_em))
+        except ValueError as e:
+            resultados[i] = {'success': False, 'error': str(e)}
+        except (KeyError, TypeError):
+            resultados[i] = {'success': False, 'error': 'QR Code inválido.'}
+
+    if validas:
+        user_ids = {v[1] for v in validas}
+        datas = {v[2].date() for v in validas}
+        usuarios = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()}
+
+        # Situação atual de cada (colaborador, dia): quantidade de batidas e a última hora
+        situacao = {}
+        for user_id, dia, qtd, ultima in db.session.query(
+            PontoRegistro.user_id, PontoRegistro.data_registro,
+            func.count(PontoRegistro.id), func.max(PontoRegistro.hora_registro)
+        ).filter(
+            PontoRegistro.user_id.in_(user_ids),
+            PontoRegistro.data_registro.in_(datas)
+        ).group_by(PontoRegistro.user_id, PontoRegistro.data_registro).all():
+            situacao[(user_id, dia)] = [qtd, datetime.combine(dia, ultima)]
+
+        novas, afetados = [], {}
+        for i, user_id, capturado_em in sorted(validas, key=lambda v: v[2]):
+            user = usuarios.get(user_id)
+            if not user:
+                resultados[i] = {'success': False, 'error': 'Usuário inválido'}
+                liberar_token(consumidos.pop(i))
+                continue
+
+            dia = capturado_em.date()
+            qtd, ultima = situacao.get((user_id, dia), [0, None])
+            if ultima and abs((capturado_em - ultima).total_seconds()) < INTERVALO_MINIMO_SEGUNDOS:
+                resultados[i] = {'success': False, 'error': 'Aguarde antes de bater o ponto novamente.', 'funcionario': user.real_name}
+                # Recusada sem gravar: o QR volta a valer para uma nova tentativa dentro da janela
+                liberar_token(consumidos.pop(i))
+                continue
+
+            tipo = proximo_tipo(qtd)
+            novas.append({
+                'user_id': user_id, 'empresa_id': user.empresa_id, 'data_registro': dia,
+                'hora_registro': capturado_em.time(), 'tipo': tipo,
+                'latitude': 'QR-Code', 'longitude': 'Presencial',
+                'chave_idempotencia': chaves[i]
+            })
+            situacao[(user_id, dia)] = [qtd + 1, max(ultima, capturado_em) if ultima else capturado_em]
+            afetados.setdefault(dia, set()).add(user_id)
+            resultados[i] = {'success': True, 'message': f'Ponto registrado: {tipo}', 'funcionario': user.real_name,
+                             'hora': capturado_em.strftime('%H:%M'), 'tipo': tipo, 'user_id': user_id}
+
+        if novas:
+            try:
+                db.session.execute(PontoRegistro.__table__.insert(), novas)
+                for dia, ids in afetados.items():
+                    recalcular_intervalo(ids, dia, dia)
+                db.session.commit()
+            except Exception:
+                # Nada foi gravado: os QR-Codes voltam a valer para o reenvio do lote
+                for token in consumidos.values(): liberar_token(token)
+                raise
+            for i, user_id, capturado_em in validas:
+                if resultados[i].get('success'):
+                    marcar_batida(user_id, INTERVALO_MINIMO_SEGUNDOS - (agora - capturado_em).total_seconds())
+
+    # A mesma chave repetida dentro do lote recebe o resultado da primeira ocorrência
+    for i, origem in repetidas:
+        resultados[i] = dict(resultados[origem], duplicado=True) if resultados[origem].get('success') else resultados[origem]
+
+    return resultados
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import threading
+import time
+
+# Backend opcional entre instâncias (se não estiver instalado, o índice fica só no processo)
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# 🎟️ ÍNDICE DE QR-CODES JÁ CONSUMIDOS (USO ÚNICO)
+# Cada token aceito é gravado pelo seu SHA-256 até o fim da validade. Uma segunda
+# leitura do mesmo QR (no mesmo terminal ou em outro) é recusada em O(1), antes de
+# qualquer consulta ao banco. O mesmo índice guarda "bateu ponto há menos de 60s"
+# por colaborador, para o "Aguarde" não precisar do banco na maioria dos casos.
+# Sem REDIS_URL vale por processo; com REDIS_URL, para todas as instâncias.
+# ==============================================================================
+
+PREFIXO = 'ponto:qr:'
+# Teto de itens em memória: ao passar disto, os mais antigos saem primeiro
+MAX_ITENS = 100_000
+# Margem para relógios ligeiramente diferentes entre emissão e leitura
+MARGEM_SEGUNDOS = 60
+
+class IndiceLocal:
+    """Dicionário ordenado por inserção com expiração por item e tamanho limitado."""
+    def __init__(self, max_itens=MAX_ITENS):
+        self._itens = OrderedDict()  # chave -> (expira_em, dono)
+        self._max = max_itens
+        self._lock = threading.Lock()
+
+    def _expurgar(self, agora):
+        while self._itens:
+            chave, (expira_em, _) = next(iter(self._itens.items()))
+            if expira_em > agora and len(self._itens) <= self._max: break
+            self._itens.popitem(last=False)
+
+    def reservar(self, chave, ttl, dono=None):
+        """True se a chave era nova (ou já pertencia ao mesmo `dono`); False se já estava consumida."""
+        agora = time.time()
+        with self._lock:
+            atual = self._itens.get(chave)
+            if atual and atual[0] > agora:
+                return dono is not None and atual[1] == dono
+            self._itens[chave] = (agora + ttl, dono)
+            self._itens.move_to_end(chave)
+            self._expurgar(agora)
+            return True
+
+    def existe(self, chave):
+        with self._lock:
+            atual = self._itens.get(chave)
+            return bool(atual and atual[0] > time.time())
+
+    def liberar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+class IndiceRedis:
+    """Mesma interface, com SET NX EX: a reserva é atômica entre instâncias."""
+    def __init__(self, url):
+        self._redis = redis.Redis.from_url(url)
+
+    def reservar(self, chave, ttl, dono=None):
+        valor = dono or '-'
+        if self._redis.set(PREFIXO + chave, valor, nx=True, ex=max(1, int(ttl))): return True
+        atual = self._redis.get(PREFIXO + chave)
+        return dono is not None and atual is not None and atual.decode() == dono
+
+    def existe(self, chave):
+        return bool(self._redis.exists(PREFIXO + chave))
+
+    def liberar(self, chave):
+        self._redis.delete(PREFIXO + chave)
+
+_indice = None
+_indice_lock = threading.Lock()
+
+def obter_indice():
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                url = os.environ.get('REDIS_URL')
+                _indice = IndiceRedis(url) if url and redis is not None else IndiceLocal()
+    return _indice
+
+def _com_fallback(operacao, padrao):
+    # Se o Redis cair, o ponto continua funcionando: a proteção do banco (intervalo de 60s) segue valendo
+    try:
+        return operacao()
+    except Exception as e:
+        logger.error(f"Índice de QR-Codes indisponível: {e}")
+        return padrao
+
+def digest_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def consumir_token(token, emitido_em, janela_segundos, dono=None):
+    """
+    Marca o token como usado até `emitido_em` (epoch) + `janela_segundos`.
+    Retorna False se ele já tinha sido usado. `dono` (ex.: a chave de idempotência da
+    leitura) permite que o reenvio da MESMA leitura passe sem ser tratado como replay.
+    """
+    ttl = emitido_em + janela_segundos + MARGEM_SEGUNDOS - time.time()
+    return _com_fallback(lambda: obter_indice().reservar('t:' + digest_token(token), max(ttl, 1), dono), True)
+
+def liberar_token(token):
+    """Devolve o token (a gravação falhou e o colaborador pode tentar de novo com o mesmo QR)."""
+    _com_fallback(lambda: obter_indice().liberar('t:' + digest_token(token)), None)
+
+def marcar_batida(user_id, segundos_restantes):
+    """Bloqueia novas batidas do colaborador pelos próximos `segundos_restantes` (se ainda houver)."""
+    if segundos_restantes <= 0: return
+    _com_fallback(lambda: obter_indice().reservar(f'u:{user_id}', segundos_restantes), None)
+
+def batida_recente(user_id):
+    return _com_fallback(lambda: obter_indice().existe(f'u:{user_id}'), False)
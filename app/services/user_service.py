@@ -2,10 +2,12 @@ import random
 import string
 from datetime import datetime
 from app.models import (AssinaturaDigital, Atestado, Notificacao, PushSubscription, 
-                        PontoAjuste, PeriodoAquisitivo, SolicitacaoAusencia, 
+                        PontoAjuste, PeriodoAquisitivo, AlertaFerias, SolicitacaoAusencia, 
                         SolicitacaoUniforme, PontoRegistro, PontoResumo, Holerite, Recibo, PreCadastro)
 from app.repositories.user_repository import UserRepository, PreCadastroRepository
 from app.utils import time_to_minutes
+from app.ponto.ferias import reconstruir_ferias
+from app.documentos.matcher import invalidar_indice_nomes
 
 class UserService:
     def __init__(self):
@@ -58,6 +60,7 @@ class UserService:
             Notificacao.query.filter_by(user_id=user.id).delete()
             PushSubscription.query.filter_by(user_id=user.id).delete()
             PontoAjuste.query.filter_by(user_id=user.id).delete()
+            AlertaFerias.query.filter_by(user_id=user.id).delete()
             PeriodoAquisitivo.query.filter_by(user_id=user.id).delete()
             SolicitacaoAusencia.query.filter_by(user_id=user.id).delete()
             SolicitacaoUniforme.query.filter_by(user_id=user.id).delete()
@@ -67,8 +70,10 @@ class UserService:
             Recibo.query.filter_by(user_id=user.id).delete()
             
             # 3. Exclui o utilizador e faz o commit
+            empresa_id = user.empresa_id
             self.user_repo.delete(user)
             self.user_repo.commit()
+            invalidar_indice_nomes(empresa_id)
         except Exception as e:
             self.user_repo.rollback()
             raise e
@@ -86,8 +91,11 @@ class UserService:
         user.cnpj_empregador = form_data.get('cnpj')
         
         dt_adm_str = form_data.get('data_admissao')
+        admissao_alterada = False
         if dt_adm_str: 
-            user.data_admissao = datetime.strptime(dt_adm_str, '%Y-%m-%d').date()
+            nova_admissao = datetime.strptime(dt_adm_str, '%Y-%m-%d').date()
+            admissao_alterada = nova_admissao != user.data_admissao
+            user.data_admissao = nova_admissao
         
         user.carga_horaria = time_to_minutes(form_data.get('carga_horaria'))
         user.tempo_intervalo = int(form_data.get('tempo_intervalo') or 60)
@@ -99,8 +107,13 @@ class UserService:
         if user.username != '50097952800' and user.username != 'Thaynara':
             lista_perms = form_data.getlist('perm_keys')
             user.permissions = ",".join(lista_perms)
+
+        # Os períodos aquisitivos de férias contam a partir da admissão
+        if admissao_alterada: reconstruir_ferias([user])
         
         self.user_repo.commit()
+        # O nome (e o cargo, que tira o Terminal da busca) alimentam a identificação dos holerites
+        invalidar_indice_nomes(user.empresa_id)
 
     def resetar_senha(self, user):
         senha_temporaria = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
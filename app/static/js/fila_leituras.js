@@ -0,0 +1,92 @@
+// ============================================================================
+// FILA OFFLINE DO TERMINAL DE PONTO (IndexedDB)
+// Cada leitura é guardada no aparelho ANTES de ir para o servidor, com uma chave
+// única e o horário da captura. A sincronização envia a fila em lotes para
+// /ponto/api/registrar-leituras; o servidor ignora chaves já gravadas, então
+// reenviar depois de uma queda de conexão nunca duplica nem perde batidas.
+// Usado pela página do terminal e pelo service worker (Background Sync).
+// ============================================================================
+(function (escopo) {
+    const BANCO = 'shahin-terminal';
+    const LOJA = 'leituras_pendentes';
+    const ENDPOINT = '/ponto/api/registrar-leituras';
+    const TAMANHO_LOTE = 200; // Igual ao MAX_LEITURAS_POR_LOTE do servidor
+
+    function abrir() {
+        return new Promise((resolve, reject) => {
+            const pedido = indexedDB.open(BANCO, 1);
+            pedido.onupgradeneeded = () => {
+                const loja = pedido.result.createObjectStore(LOJA, { keyPath: 'chave' });
+                loja.createIndex('capturado_em', 'capturado_em');
+            };
+            pedido.onsuccess = () => resolve(pedido.result);
+            pedido.onerror = () => reject(pedido.error);
+        });
+    }
+
+    function transacao(modo, operacao) {
+        return abrir().then(banco => new Promise((resolve, reject) => {
+            const tx = banco.transaction(LOJA, modo);
+            const resultado = operacao(tx.objectStore(LOJA));
+            tx.oncomplete = () => { banco.close(); resolve(resultado && resultado.result); };
+            tx.onerror = () => { banco.close(); reject(tx.error); };
+        }));
+    }
+
+    function novaChave() {
+        if (escopo.crypto && crypto.randomUUID) return crypto.randomUUID();
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    function adicionar(token) {
+        const leitura = { chave: novaChave(), token: token, capturado_em: Date.now() };
+        return transacao('readwrite', loja => loja.put(leitura)).then(() => leitura);
+    }
+
+    function pendentes(limite) {
+        // Mais antigas primeiro: a ordem de captura define Entrada/Saída no servidor
+        return transacao('readonly', loja => loja.index('capturado_em').getAll(null, limite));
+    }
+
+    function remover(chaves) {
+        return transacao('readwrite', loja => { chaves.forEach(c => loja.delete(c)); });
+    }
+
+    function contar() {
+        return transacao('readonly', loja => loja.count());
+    }
+
+    async function enviarFila() {
+        const entregues = {};
+        while (true) {
+            const lote = await pendentes(TAMANHO_LOTE);
+            if (!lote.length) break;
+
+            const resposta = await fetch(ENDPOINT, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ leituras: lote })
+            });
+            // Falha de rede, sessão expirada (redireciona para o login) ou erro 5xx: a fila fica intacta
+            if (!resposta.ok) throw new Error('HTTP ' + resposta.status);
+            const dados = await resposta.json();
+
+            // O servidor respondeu leitura a leitura (sucesso, duplicada ou recusada): todas saem da fila
+            lote.forEach((leitura, i) => { entregues[leitura.chave] = dados.resultados[i]; });
+            await remover(lote.map(l => l.chave));
+            if (lote.length < TAMANHO_LOTE) break;
+        }
+        return entregues;
+    }
+
+    // Uma única sincronização por vez, mesmo com vários disparos (nova leitura, 'online', timer)
+    let emAndamento = null;
+    function sincronizar() {
+        if (!emAndamento) emAndamento = enviarFila().finally(() => { emAndamento = null; });
+        return emAndamento;
+    }
+
+    escopo.FilaLeituras = { adicionar, sincronizar, contar, TAG_SYNC: 'sincronizar-leituras' };
+})(self);
@@ -1,11 +1,18 @@
-const CACHE_NAME = 'shahin-app-v1';
+const CACHE_NAME = 'shahin-app-v2';
+
+// Fila offline das leituras do terminal de ponto (compartilhada com a página)
+importScripts('/static/js/fila_leituras.js');
 
 // Recursos mínimos para o aplicativo iniciar mais rápido
 const ASSETS_TO_CACHE = [
     '/',
-    '/static/manifest.json'
+    '/static/manifest.json',
+    '/static/js/fila_leituras.js'
 ];
 
+// Páginas que precisam abrir mesmo sem internet (o terminal continua lendo e guardando)
+const CACHE_OFFLINE = ['/ponto/scanner', '/static/js/fila_leituras.js', 'https://unpkg.com/html5-qrcode'];
+
 // Instalação do Motor no telemóvel
 self.addEventListener('install', (event) => {
     event.waitUntil(
@@ -38,14 +45,31 @@ self.addEventListener('fetch', (event) => {
     // Ignora requisições que não sejam GET (como envio de atestados ou ponto)
     if (event.request.method !== 'GET') return;
 
+    const guardarOffline = CACHE_OFFLINE.some((url) => event.request.url.endsWith(url) || event.request.url.startsWith(url));
+
     event.respondWith(
-        fetch(event.request).catch(() => {
+        fetch(event.request).then((response) => {
+            // Guarda a última versão das páginas do terminal para abrirem offline
+            if (guardarOffline && (response.ok || response.type === 'opaque')) {
+                const copia = response.clone();
+                caches.open(CACHE_NAME).then((cache) => cache.put(event.request, copia));
+            }
+            return response;
+        }).catch(() => {
             // Se o telemóvel estiver sem internet (offline), tenta carregar a página do cache
             return caches.match(event.request);
         })
     );
 });
 
+// Background Sync: o navegador dispara quando a conexão volta, mesmo com a página do terminal fechada.
+// Se o envio falhar, a promessa rejeitada faz o navegador tentar de novo mais tarde (com o próprio backoff).
+self.addEventListener('sync', (event) => {
+    if (event.tag === FilaLeituras.TAG_SYNC) {
+        event.waitUntil(FilaLeituras.sincronizar());
+    }
+});
+
 // ============================================================================
 // FASE 2: O CARTEIRO INVISÍVEL (MOTOR DE NOTIFICAÇÕES PUSH)
 // ============================================================================
@@ -5,6 +5,8 @@ import re
 import hashlib
 import os
 import json
+import threading
+from time import monotonic
 from functools import wraps
 from flask import abort, redirect, url_for, flash, request
 from flask_login import current_user
@@ -68,52 +70,11 @@ def format_minutes_to_hm(total_minutes):
     return f"{sinal}{h:02d}:{m:02d}"
 
 def calcular_dia(user_id, data_ref):
-    """Calcula o saldo de horas e status do dia para o módulo de Ponto."""
+    """Recalcula o saldo de horas e status do dia para o módulo de Ponto (ajustes manuais)."""
     from app.extensions import db
-    from app.models import User, PontoRegistro, PontoResumo
-    
-    user = User.query.get(user_id)
-    if not user: return
+    from app.ponto.resumo import recalcular_intervalo
 
-    registros = PontoRegistro.query.filter_by(user_id=user_id, data_registro=data_ref).order_by(PontoRegistro.hora_registro).all()
-    
-    meta = user.carga_horaria if user.carga_horaria else 528
-    
-    if user.escala == '5x2' and data_ref.weekday() >= 5: meta = 0
-    elif user.escala == '12x36' and user.data_inicio_escala:
-        dias_diff = (data_ref - user.data_inicio_escala).days
-        if dias_diff % 2 != 0: meta = 0
-        else: meta = 720
-            
-    trab = 0
-    for i in range(0, len(registros), 2):
-        if i + 1 < len(registros):
-            entrada = time_to_minutes(registros[i].hora_registro)
-            saida = time_to_minutes(registros[i+1].hora_registro)
-            trab += (saida - entrada)
-            
-    saldo = trab - meta
-    
-    status = "OK"
-    if not registros:
-        status = "Falta" if meta > 0 else "Folga"
-    elif len(registros) % 2 != 0:
-        status = "Incompleto"
-    elif saldo > 10:
-        status = "Hora Extra"
-    elif saldo < -10:
-        status = "Débito" if meta > 0 else "Extra" 
-        
-    resumo = PontoResumo.query.filter_by(user_id=user_id, data_referencia=data_ref).first()
-    if not resumo:
-        resumo = PontoResumo(user_id=user_id, data_referencia=data_ref)
-        db.session.add(resumo)
-    
-    resumo.minutos_trabalhados = trab
-    resumo.minutos_esperados = meta
-    resumo.minutos_saldo = saldo
-    resumo.status_dia = status
-    
+    recalcular_intervalo([user_id], data_ref, data_ref)
     try: db.session.commit()
     except: db.session.rollback()
 
@@ -230,3 +191,36 @@ def enviar_notificacao(user_id, mensagem, link=None):
 
     return True
 
+# ============================================================================
+# CACHE EM MEMÓRIA COM VALIDADE (ÍNDICES POR EMPRESA)
+# Para objetos caros de montar e lidos em todo pedido (índice de nomes, índice de
+# ausências). A invalidação explícita só vale neste processo: o TTL é a rede de
+# segurança para as outras instâncias do Cloud Run.
+# ============================================================================
+TTL_CACHE_SEGUNDOS = 300
+
+class CacheTTL:
+    """Valores por chave (ex.: id da empresa), recarregados depois de `ttl_segundos`."""
+    def __init__(self, ttl_segundos=TTL_CACHE_SEGUNDOS):
+        self.ttl_segundos = ttl_segundos
+        self._itens = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, carregar):
+        """O valor guardado ainda válido, ou o resultado de `carregar()` (fora do lock)."""
+        agora = monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item and item[0] > agora: return item[1]
+        valor = carregar()
+        with self._lock:
+            self._itens[chave] = (agora + self.ttl_segundos, valor)
+        return valor
+
+    def descartar(self, chave=None, filtro=None):
+        """Descarta a `chave`, as chaves em que `filtro(chave)` é verdadeiro ou, sem argumentos, tudo."""
+        with self._lock:
+            if chave is None and filtro is None: self._itens.clear()
+            if chave is not None: self._itens.pop(chave, None)
+            if filtro is not None:
+                for k in [k for k in self._itens if filtro(k)]: self._itens.pop(k, None)
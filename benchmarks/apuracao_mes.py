@@ -0,0 +1,174 @@
+"""
+Benchmark da apuração mensal de uma empresa inteira (colaboradores × dias).
+
+Compara o caminho antigo, um colaborador por vez (duas consultas por colaborador e
+um laço dia a dia em Python, como faziam o PDF do espelho e a exportação da folha),
+com a apuração vetorizada de app/ponto/apuracao.py (duas consultas para a empresa
+toda e operações NumPy sobre a matriz). Confere que os dois chegam aos mesmos
+minutos trabalhados e saldos antes de reportar o ganho.
+
+Uso:
+    python benchmarks/apuracao_mes.py                       # SQLite temporário, 2000 colaboradores
+    python benchmarks/apuracao_mes.py --colaboradores 500 --repeticoes 5
+    DATABASE_URL=postgresql://localhost/shahin_bench python benchmarks/apuracao_mes.py --json resultado.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta, time as hora
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from carga_ponto import preparar_app, limpar, ESCALAS
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Benchmark da apuração mensal vetorizada.')
+    p.add_argument('--colaboradores', type=int, default=2000, help='Colaboradores da empresa sintética')
+    p.add_argument('--repeticoes', type=int, default=3, help='Execuções de cada caminho (vale a mediana)')
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--json', default=None, help='Grava o relatório neste arquivo')
+    p.add_argument('--manter', action='store_true', help='Não apaga a empresa sintética no fim')
+    return p.parse_args()
+
+def semear(app, args, rotulo):
+    """Empresa com N colaboradores e o mês anterior completo de batidas, faltas e alguns abonos."""
+    from app.extensions import db
+    from app.models import Empresa, User, PontoRegistro, PontoResumo
+    from app.utils import get_brasil_time
+    from app.ponto.escala import meta_do_dia
+    from app.ponto.espelho import intervalo_do_mes
+
+    rnd = random.Random(args.seed)
+    hoje = get_brasil_time().date()
+    ultimo_mes = hoje.replace(day=1) - timedelta(days=1)
+    inicio, fim = intervalo_do_mes(ultimo_mes.year, ultimo_mes.month)
+    agora = get_brasil_time()
+
+    with app.app_context():
+        empresa = Empresa(nome=f'Apuração {rotulo}', slug=f'apuracao-{rotulo}', plano='Benchmark')
+        db.session.add(empresa)
+        db.session.flush()
+        usuarios = [User(username=f'apur-{rotulo}-{i:05d}', real_name=f'Colaborador {i:05d}', role='Funcionario',
+                         password_hash='!', empresa_id=empresa.id, is_first_access=False,
+                         escala=rnd.choice(ESCALAS), data_inicio_escala=inicio - timedelta(days=rnd.randint(0, 6)),
+                         data_admissao=inicio - timedelta(days=400)) for i in range(args.colaboradores)]
+        db.session.add_all(usuarios)
+        db.session.flush()
+
+        batidas, resumos = [], []
+        for u in usuarios:
+            for d in range((fim - inicio).days + 1):
+                dia = inicio + timedelta(days=d)
+                if meta_do_dia(u, dia) == 0: continue
+                sorteio = rnd.random()
+                if sorteio < 0.03:  # Falta
+                    continue
+                if sorteio < 0.05:  # Abono do RH
+                    resumos.append({'user_id': u.id, 'empresa_id': empresa.id, 'data_referencia': dia, 'minutos_trabalhados': 0,
+                                    'minutos_esperados': 0, 'minutos_saldo': 0, 'status_dia': rnd.choice(['Férias', 'Atestado']),
+                                    'created_at': agora, 'updated_at': agora})
+                    continue
+                entrada = rnd.randint(6 * 60, 9 * 60)
+                marcas = [entrada, entrada + 240 + rnd.randint(-20, 20), entrada + 300, entrada + 540 + rnd.randint(-40, 60)]
+                if rnd.random() < 0.05: marcas = marcas[:3]  # Esqueceu a saída
+                for m in marcas:
+                    m = min(m, 23 * 60 + 59)
+                    batidas.append({'user_id': u.id, 'empresa_id': empresa.id, 'data_registro': dia,
+                                    'hora_registro': hora(m // 60, m % 60), 'tipo': 'Benchmark'})
+
+        for lote in range(0, len(batidas), 5000):
+            db.session.execute(PontoRegistro.__table__.insert(), batidas[lote:lote + 5000])
+        if resumos: db.session.execute(PontoResumo.__table__.insert(), resumos)
+        db.session.commit()
+        return empresa.id, inicio, fim, len(batidas)
+
+def apuracao_legada(empresa_id, inicio, fim):
+    """O caminho antigo: por colaborador, lê batidas e resumos e apura dia a dia."""
+    from app.models import User, PontoRegistro, PontoResumo
+    from app.utils import time_to_minutes
+    from app.ponto.escala import calendario_mes
+
+    usuarios = User.query.filter(User.empresa_id == empresa_id).order_by(User.real_name, User.id).all()
+    resultado = {}
+    for u in usuarios:
+        resumos = PontoResumo.query.filter(PontoResumo.user_id == u.id, PontoResumo.data_referencia >= inicio, PontoResumo.data_referencia <= fim).all()
+        batidas = PontoRegistro.query.filter(PontoRegistro.user_id == u.id, PontoRegistro.data_registro >= inicio,
+                                             PontoRegistro.data_registro <= fim).order_by(PontoRegistro.data_registro, PontoRegistro.hora_registro).all()
+        resumo_por_dia = {r.data_referencia: r for r in resumos}
+        batidas_por_dia = {}
+        for b in batidas:
+            batidas_por_dia.setdefault(b.data_registro, []).append(b)
+
+        total_trab, total_saldo = 0, 0
+        for i, meta in enumerate(calendario_mes(u, inicio.year, inicio.month).minutos):
+            dia = inicio + timedelta(days=i)
+            pontos = batidas_por_dia.get(dia, [])
+            trabalhado = 0
+            for k in range(0, len(pontos) - 1, 2):
+                trabalhado += time_to_minutes(pontos[k + 1].hora_registro) - time_to_minutes(pontos[k].hora_registro)
+            resumo = resumo_por_dia.get(dia)
+            if resumo and resumo.status_dia in ('Férias', 'Atestado', 'Licença', 'Folga Prêmio'):
+                meta = 0
+            total_trab += trabalhado
+            total_saldo += trabalhado - meta
+        resultado[u.id] = (total_trab, total_saldo)
+    return resultado
+
+def apuracao_vetorizada(empresa_id, inicio, fim):
+    from app.ponto.apuracao import apurar_empresa
+    apuracao = apurar_empresa(empresa_id, inicio, fim, hoje=fim)
+    totais = apuracao.totais()
+    return {u.id: (int(totais['trabalhado'][i]), int(totais['saldo'][i])) for i, u in enumerate(apuracao.usuarios)}
+
+def medir(app, funcao, args, *params):
+    from sqlalchemy import event
+    from app.extensions import db
+    tempos, consultas, resultado = [], [0], None
+    with app.app_context():
+        contar = lambda *a, **k: consultas.__setitem__(0, consultas[0] + 1)
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        try:
+            for _ in range(args.repeticoes):
+                db.session.expunge_all()
+                consultas[0] = 0
+                inicio = time.perf_counter()
+                resultado = funcao(*params)
+                tempos.append(time.perf_counter() - inicio)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', contar)
+    tempos.sort()
+    return tempos[len(tempos) // 2], consultas[0], resultado
+
+def main():
+    args = parse_args()
+    app = preparar_app()
+    rotulo = time.strftime('%Y%m%d%H%M%S')
+    print(f"Semeando {args.colaboradores} colaboradores...")
+    empresa_id, inicio, fim, total_batidas = semear(app, args, rotulo)
+    try:
+        t_legado, q_legado, r_legado = medir(app, apuracao_legada, args, empresa_id, inicio, fim)
+        t_vetor, q_vetor, r_vetor = medir(app, apuracao_vetorizada, args, empresa_id, inicio, fim)
+    finally:
+        if not args.manter: limpar(app, empresa_id)
+
+    divergencias = [uid for uid in r_legado if r_legado[uid] != r_vetor.get(uid)]
+    relatorio = {
+        'colaboradores': args.colaboradores, 'dias': (fim - inicio).days + 1, 'batidas': total_batidas,
+        'legado': {'segundos': round(t_legado, 3), 'consultas': q_legado},
+        'vetorizado': {'segundos': round(t_vetor, 3), 'consultas': q_vetor},
+        'ganho': round(t_legado / t_vetor, 1) if t_vetor else None,
+        'divergencias': len(divergencias),
+    }
+    print(f"\n{relatorio['colaboradores']} colaboradores × {relatorio['dias']} dias, {total_batidas} batidas")
+    print(f"  Um colaborador por vez : {t_legado:8.3f}s  {q_legado:>6} consultas")
+    print(f"  Apuração vetorizada    : {t_vetor:8.3f}s  {q_vetor:>6} consultas")
+    print(f"  Ganho                  : {relatorio['ganho']}x")
+    print(f"  Totais divergentes     : {len(divergencias)}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if divergencias else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+Benchmark de carga da troca de turno (ponto eletrônico).
+
+Simula centenas de vigilantes batendo ponto numa janela curta contra
+/ponto/api/registrar-leitura (terminal de QR-Code), /ponto/registrar (autoatendimento)
+e /ponto/api/check-status (polling da tela do QR), com a mesma concorrência do
+`gunicorn --workers 1 --threads 8` de produção: um único processo e N threads
+atendendo requisições, cada uma com a sua sessão do banco.
+
+Uso:
+    python benchmarks/carga_ponto.py                      # SQLite temporário, 500 vigilantes em 60s
+    python benchmarks/carga_ponto.py --vigilantes 800 --janela 300 --threads 8
+    DATABASE_URL=postgresql://localhost/shahin_bench python benchmarks/carga_ponto.py --json resultado.json
+
+Com DATABASE_URL, a empresa sintética é criada nesse banco e apagada no fim (a não ser
+com --manter). Sai com código 1 se alguma batida confirmada se perder, se o p95 passar
+de --limite-p95-ms ou, com --estrito, se houver batidas duplicadas.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ESCALAS = ['5x2', '6x1', '12x36', '12x36 Noturno', '24x48', 'Livre']
+INTERVALO_POLLING = 2  # Igual ao setInterval da tela ponto/registro.html
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Benchmark de carga da troca de turno do ponto.')
+    p.add_argument('--vigilantes', type=int, default=500, help='Colaboradores que batem ponto na janela')
+    p.add_argument('--janela', type=float, default=60, help='Segundos em que as chegadas se espalham (300 = troca de turno real)')
+    p.add_argument('--threads', type=int, default=8, help='Threads do servidor (gunicorn --threads)')
+    p.add_argument('--fracao-terminal', type=float, default=0.7, help='Fração que bate no terminal de QR (o resto usa /ponto/registrar)')
+    p.add_argument('--repeticoes', type=float, default=0.05, help='Fração com leitura/toque duplo (o segundo chega até 1s depois)')
+    p.add_argument('--polls', type=int, default=3, help='Chamadas a check-status por vigilante do terminal')
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--json', help='Grava o relatório neste arquivo')
+    p.add_argument('--limite-p95-ms', type=float, help='Falha se o p95 de algum endpoint de batida passar disto')
+    p.add_argument('--estrito', action='store_true', help='Falha também com batidas duplicadas')
+    p.add_argument('--manter', action='store_true', help='Não apaga a empresa sintética no fim')
+    return p.parse_args()
+
+# ==============================================================================
+# 🧪 PREPARAÇÃO
+# ==============================================================================
+
+def preparar_app():
+    if not os.environ.get('DATABASE_URL'):
+        arquivo = os.path.join(tempfile.mkdtemp(prefix='shahin-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{arquivo}'
+
+    from app import app
+    from app.extensions import db
+    app.config['WTF_CSRF_ENABLED'] = False  # O formulário de /ponto/registrar vem sem token
+    with app.app_context():
+        db.create_all()
+    return app
+
+def semear(app, args, rotulo):
+    """Cria a empresa sintética, o terminal e os vigilantes com escalas variadas."""
+    from app.extensions import db
+    from app.models import Empresa, User
+    from app.utils import get_brasil_time
+    from app.ponto.escala import motivo_folga
+
+    rnd = random.Random(args.seed)
+    hoje = get_brasil_time().date()
+    with app.app_context():
+        empresa = Empresa(nome=f'Benchmark {rotulo}', slug=f'bench-{rotulo}', plano='Benchmark')
+        db.session.add(empresa)
+        db.session.flush()
+
+        terminal = User(username=f'bench-{rotulo}-terminal', real_name='Terminal Benchmark', role='Terminal',
+                        password_hash='!', empresa_id=empresa.id, is_first_access=False)
+        vigilantes = []
+        for i in range(args.vigilantes):
+            escala = ESCALAS[i % len(ESCALAS)]
+            vigilantes.append(User(
+                username=f'bench-{rotulo}-{i:05d}', real_name=f'Vigilante {i:05d}', role='Funcionario',
+                password_hash='!', empresa_id=empresa.id, is_first_access=False, escala=escala,
+                data_admissao=hoje - timedelta(days=400),
+                data_inicio_escala=hoje - timedelta(days=rnd.randint(0, 3)),
+            ))
+        db.session.add_all([terminal] + vigilantes)
+        db.session.commit()
+
+        # No autoatendimento, quem está de folga hoje é bloqueado (não gera batida)
+        perfis = [{'id': u.id, 'folga_hoje': bool(motivo_folga(u, hoje))} for u in vigilantes]
+        return empresa.id, terminal.id, perfis
+
+def limpar(app, empresa_id):
+    """Apaga a empresa sintética e tudo que pertence a ela (ou aos seus usuários), filhas primeiro."""
+    from sqlalchemy import or_
+    from app.extensions import db
+    from app.models import Empresa, User
+    with app.app_context():
+        ids = [i for (i,) in db.session.query(User.id).filter(User.empresa_id == empresa_id)]
+        for tabela in reversed(db.metadata.sorted_tables):
+            if tabela.name in ('users', 'empresas') or 'empresa_id' not in tabela.c: continue
+            filtro = tabela.c.empresa_id == empresa_id
+            if 'user_id' in tabela.c and ids: filtro = or_(filtro, tabela.c.user_id.in_(ids))
+            db.session.execute(tabela.delete().where(filtro))
+        User.query.filter(User.empresa_id == empresa_id).delete(synchronize_session=False)
+        Empresa.query.filter_by(id=empresa_id).delete(synchronize_session=False)
+        db.session.commit()
+
+# ==============================================================================
+# 🚦 GERAÇÃO DE TRÁFEGO
+# ==============================================================================
+
+def planejar(args, perfis):
+    """Lista de eventos (instante, endpoint, user_id) ordenada pelo instante de chegada."""
+    rnd = random.Random(args.seed)
+    eventos = []
+    for perfil in perfis:
+        chegada = rnd.uniform(0, args.janela)
+        repete = rnd.random() < args.repeticoes
+        if rnd.random() < args.fracao_terminal:
+            perfil['canal'] = 'terminal'
+            # A tela do QR fica aberta fazendo polling até a batida aparecer
+            for k in range(args.polls):
+                eventos.append((max(0.0, chegada - INTERVALO_POLLING * (args.polls - 1 - k)), 'check-status', perfil['id']))
+            eventos.append((chegada, 'registrar-leitura', perfil['id']))
+            if repete: eventos.append((chegada + rnd.uniform(0, 1), 'registrar-leitura', perfil['id']))
+        else:
+            perfil['canal'] = 'registrar'
+            eventos.append((chegada, 'registrar', perfil['id']))
+            if repete: eventos.append((chegada + rnd.uniform(0, 1), 'registrar', perfil['id']))
+    eventos.sort(key=lambda e: e[0])
+    return eventos
+
+class Medidor:
+    """Latências e contagem de consultas SQL por requisição (por thread)."""
+    def __init__(self, engine):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.amostras = defaultdict(list)  # endpoint -> [(latencia_s, servico_s, consultas, status)]
+        self.confirmadas = defaultdict(int)  # user_id -> batidas que o servidor disse ter gravado
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *a, **k):
+        if getattr(self.local, 'ativo', False): self.local.consultas += 1
+
+    def registrar(self, endpoint, latencia, servico, consultas, status, user_id=None, confirmada=False):
+        with self.lock:
+            self.amostras[endpoint].append((latencia, servico, consultas, status))
+            if confirmada: self.confirmadas[user_id] += 1
+
+def executar(app, args, terminal_id, perfis, eventos):
+    from itsdangerous import URLSafeTimedSerializer
+    from app.extensions import db
+
+    with app.app_context():
+        medidor = Medidor(db.engine)
+    serializer = URLSafeTimedSerializer(app.secret_key)
+    sessoes = app.session_interface.get_signing_serializer(app)
+    nome_cookie = app.config.get('SESSION_COOKIE_NAME', 'session')
+    cookies = {uid: f"{nome_cookie}={sessoes.dumps({'_user_id': str(uid), '_fresh': True})}"
+               for uid in [terminal_id] + [p['id'] for p in perfis]}
+    folga_hoje = {p['id']: p['folga_hoje'] for p in perfis}
+    clientes = threading.local()
+
+    def atender(instante_chegada, endpoint, user_id):
+        cliente = getattr(clientes, 'c', None) or app.test_client(use_cookies=False)
+        clientes.c = cliente
+        medidor.local.ativo, medidor.local.consultas = True, 0
+        inicio = time.perf_counter()
+        confirmada = False
+        if endpoint == 'registrar-leitura':
+            # O QR é gerado na tela do vigilante alguns segundos antes da leitura
+            token = serializer.dumps({'user_id': user_id, 'timestamp': time.time()})
+            r = cliente.post('/ponto/api/registrar-leitura', json={'token': token}, headers={'Cookie': cookies[terminal_id]})
+            confirmada = r.status_code == 200 and (r.get_json(silent=True) or {}).get('success', False)
+        elif endpoint == 'registrar':
+            r = cliente.post('/ponto/registrar', data={'latitude': '-23.55', 'longitude': '-46.63'}, headers={'Cookie': cookies[user_id]})
+            # Quem está de folga também é redirecionado, mas sem batida gravada
+            confirmada = r.status_code == 302 and not folga_hoje[user_id]
+        else:
+            r = cliente.get('/ponto/api/check-status', headers={'Cookie': cookies[user_id]})
+        fim = time.perf_counter()
+        medidor.local.ativo = False
+        medidor.registrar(endpoint, fim - instante_chegada, fim - inicio, medidor.local.consultas, r.status_code, user_id, confirmada)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for instante, endpoint, user_id in eventos:
+            espera = t0 + instante - time.perf_counter()
+            if espera > 0: time.sleep(espera)
+            pool.submit(atender, t0 + instante, endpoint, user_id)
+    return medidor, time.perf_counter() - t0
+
+# ==============================================================================
+# 📊 RELATÓRIO
+# ==============================================================================
+
+def percentil(valores, p):
+    if not valores: return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados) + 0.5)) - 1))]
+
+def verificar_batidas(app, perfis, medidor):
+    """Confere no banco: batidas duplicadas (>1 por vigilante) e batidas confirmadas que não existem."""
+    from sqlalchemy import func
+    from app.extensions import db
+    from app.models import PontoRegistro, PontoResumo
+
+    ids = [p['id'] for p in perfis]
+    with app.app_context():
+        batidas = dict(db.session.query(PontoRegistro.user_id, func.count(PontoRegistro.id)).filter(
+            PontoRegistro.user_id.in_(ids)).group_by(PontoRegistro.user_id).all())
+        com_resumo = {uid for (uid,) in db.session.query(PontoResumo.user_id).filter(PontoResumo.user_id.in_(ids))}
+
+    duplicadas = {uid: n for uid, n in batidas.items() if n > 1}
+    perdidas = {uid: n for uid, n in medidor.confirmadas.items() if batidas.get(uid, 0) < n}
+    sem_resumo = [uid for uid in batidas if uid not in com_resumo]
+    esperados = sum(1 for p in perfis if p['canal'] == 'terminal' or not p['folga_hoje'])
+    return {
+        'vigilantes_esperados': esperados,
+        'vigilantes_com_batida': len(batidas),
+        'batidas_gravadas': sum(batidas.values()),
+        'batidas_confirmadas': sum(medidor.confirmadas.values()),
+        'vigilantes_com_duplicidade': len(duplicadas),
+        'batidas_duplicadas': sum(n - 1 for n in duplicadas.values()),
+        'batidas_perdidas': sum(n - batidas.get(uid, 0) for uid, n in perdidas.items()),
+        'vigilantes_sem_resumo': len(sem_resumo),
+    }
+
+def montar_relatorio(args, medidor, duracao, integridade):
+    endpoints = {}
+    for endpoint, amostras in sorted(medidor.amostras.items()):
+        latencias = [a[0] * 1000 for a in amostras]
+        servicos = [a[1] * 1000 for a in amostras]
+        consultas = [a[2] for a in amostras]
+        endpoints[endpoint] = {
+            'requisicoes': len(amostras),
+            'erros_5xx': sum(1 for a in amostras if a[3] >= 500),
+            'p50_ms': round(percentil(latencias, 50), 1),
+            'p95_ms': round(percentil(latencias, 95), 1),
+            'p99_ms': round(percentil(latencias, 99), 1),
+            'servico_p50_ms': round(percentil(servicos, 50), 1),
+            'consultas_media': round(sum(consultas) / len(consultas), 2),
+            'consultas_max': max(consultas),
+            'req_por_s': round(len(amostras) / duracao, 1),
+        }
+    total = sum(e['requisicoes'] for e in endpoints.values())
+    return {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'banco': os.environ['DATABASE_URL'].split('://')[0],
+        'duracao_s': round(duracao, 2),
+        'throughput_req_s': round(total / duracao, 1),
+        'endpoints': endpoints,
+        'integridade': integridade,
+    }
+
+def imprimir(relatorio):
+    print(f"\n📊 Banco: {relatorio['banco']} | duração {relatorio['duracao_s']}s | {relatorio['throughput_req_s']} req/s")
+    cab = f"{'endpoint':<20}{'reqs':>7}{'5xx':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'serv p50':>10}{'SQL/req':>9}{'SQL max':>9}"
+    print(cab)
+    print('-' * len(cab))
+    for nome, e in relatorio['endpoints'].items():
+        print(f"{nome:<20}{e['requisicoes']:>7}{e['erros_5xx']:>6}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}"
+              f"{e['servico_p50_ms']:>10}{e['consultas_media']:>9}{e['consultas_max']:>9}")
+    print("\n🔎 Integridade das batidas")
+    for chave, valor in relatorio['integridade'].items():
+        print(f"  {chave:<28}{valor}")
+
+def main():
+    args = parse_args()
+    app = preparar_app()
+    rotulo = time.strftime('%Y%m%d%H%M%S')
+    empresa_id, terminal_id, perfis = semear(app, args, rotulo)
+    try:
+        eventos = planejar(args, perfis)
+        print(f"⏳ {len(eventos)} requisições de {args.vigilantes} vigilantes em {args.janela}s com {args.threads} threads...")
+        medidor, duracao = executar(app, args, terminal_id, perfis, eventos)
+        relatorio = montar_relatorio(args, medidor, duracao, verificar_batidas(app, perfis, medidor))
+    finally:
+        if not args.manter: limpar(app, empresa_id)
+
+    imprimir(relatorio)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+    integ = relatorio['integridade']
+    falhou = integ['batidas_perdidas'] > 0 or (args.estrito and integ['batidas_duplicadas'] > 0)
+    if args.limite_p95_ms:
+        falhou = falhou or any(e['p95_ms'] > args.limite_p95_ms for nome, e in relatorio['endpoints'].items() if nome != 'check-status')
+    sys.exit(1 if falhou else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark da identificação do colaborador nas páginas de holerite.
+
+Compara a busca antiga (ordenar todos os nomes por tamanho e testar um por um
+com `in` em cada página) com o índice Aho-Corasick por palavra de
+app/documentos/matcher.py (montado uma vez, uma varredura por página). Confere
+que os dois escolhem o mesmo nome em todas as páginas antes de reportar o ganho.
+
+Uso:
+    python benchmarks/casamento_nomes.py
+    python benchmarks/casamento_nomes.py --colaboradores 5000 --paginas 1000 --json resultado.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRENOMES = ['JOAO', 'MARIA', 'ANA', 'JULIANA', 'PEDRO', 'MARCOS', 'LUCAS', 'PAULA', 'CARLOS', 'FERNANDA', 'JOSE', 'ANTONIO']
+SOBRENOMES = ['SILVA', 'SOUZA', 'SANTOS', 'OLIVEIRA', 'LIMA', 'COSTA', 'PEREIRA', 'ALVES', 'RODRIGUES', 'GOMES', 'MARTINS', 'ROCHA']
+RUIDO = ['EMPRESA', 'SALARIO', 'INSS', 'FGTS', 'IRRF', 'VENCIMENTOS', 'DESCONTOS', 'LIQUIDO']
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Benchmark da identificação de nomes nos holerites.')
+    p.add_argument('--colaboradores', type=int, default=2000)
+    p.add_argument('--paginas', type=int, default=600)
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--json', default=None, help='Grava o relatório neste arquivo')
+    return p.parse_args()
+
+def busca_antiga(texto, nomes):
+    for nome in sorted(nomes, key=len, reverse=True):
+        if f" {nome} " in f" {texto} ": return nome
+    return ''
+
+def main():
+    args = parse_args()
+    from app.documentos.matcher import IndiceNomes
+
+    rnd = random.Random(args.seed)
+    nomes = list(dict.fromkeys(
+        ' '.join([rnd.choice(PRENOMES)] + [rnd.choice(SOBRENOMES) for _ in range(rnd.randint(1, 4))])
+        for _ in range(args.colaboradores)
+    ))
+    textos = []
+    for _ in range(args.paginas):
+        palavras = [rnd.choice(RUIDO) for _ in range(rnd.randint(40, 120))]
+        palavras[rnd.randrange(len(palavras)):0] = rnd.choice(nomes).split()
+        textos.append(' '.join(palavras))
+
+    inicio = time.perf_counter()
+    antigos = [busca_antiga(t, nomes) for t in textos]
+    t_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice = IndiceNomes({n: i for i, n in enumerate(nomes)})
+    t_montagem = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    novos = [indice.buscar(t) for t in textos]
+    t_indice = time.perf_counter() - inicio
+
+    divergencias = sum(a != b for a, b in zip(antigos, novos))
+    relatorio = {
+        'colaboradores': len(nomes), 'paginas': len(textos),
+        'busca_antiga_segundos': round(t_antigo, 3),
+        'indice_montagem_segundos': round(t_montagem, 3), 'indice_busca_segundos': round(t_indice, 3),
+        'ganho': round(t_antigo / (t_montagem + t_indice), 1) if t_indice else None,
+        'divergencias': divergencias,
+    }
+    print(f"\n{len(nomes)} nomes × {len(textos)} páginas")
+    print(f"  Nome por nome          : {t_antigo:8.3f}s")
+    print(f"  Aho-Corasick (montagem): {t_montagem:8.3f}s")
+    print(f"  Aho-Corasick (busca)   : {t_indice:8.3f}s")
+    print(f"  Ganho                  : {relatorio['ganho']}x")
+    print(f"  Páginas divergentes    : {divergencias}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if divergencias else 0)
+
+if __name__ == '__main__':
+    main()
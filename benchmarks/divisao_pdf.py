@@ -0,0 +1,106 @@
+"""
+Benchmark da leitura do PDF da folha (um holerite por página).
+
+Compara o caminho antigo (PDF inteiro em bytes, um PdfWriter por página, cada
+página reserializada e relida por um novo PdfReader só para extrair o texto)
+com a leitura de app/documentos/leitor_pdf.py (arquivo temporário em mmap e o
+texto tirado direto do leitor original). Reporta tempo e pico de memória
+alocada pelo Python (tracemalloc) e confere que os textos são os mesmos.
+
+Uso:
+    python benchmarks/divisao_pdf.py                  # PDF sintético de 600 páginas
+    python benchmarks/divisao_pdf.py --paginas 1500 --json resultado.json
+    python benchmarks/divisao_pdf.py --pdf folha.pdf  # um PDF real
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Benchmark da leitura do PDF de holerites.')
+    p.add_argument('--paginas', type=int, default=600, help='Páginas do PDF sintético')
+    p.add_argument('--pdf', default=None, help='Usa este PDF em vez do sintético')
+    p.add_argument('--json', default=None, help='Grava o relatório neste arquivo')
+    return p.parse_args()
+
+def gerar_pdf(caminho, paginas):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(caminho, pagesize=A4)
+    for i in range(paginas):
+        c.setFont('Helvetica', 10)
+        c.drawString(50, 800, 'DEMONSTRATIVO DE PAGAMENTO 03/2026')
+        c.drawString(50, 780, f'FUNCIONARIO: COLABORADOR {i:05d} DA SILVA')
+        for linha in range(40):
+            c.drawString(50, 750 - linha * 15, f'{linha:03d} VERBA {linha * 7 % 13:02d}  REFERENCIA {linha}  VALOR {linha * 123.45:10.2f}')
+        c.showPage()
+    c.save()
+
+def caminho_antigo(caminho):
+    from pypdf import PdfReader, PdfWriter
+    with open(caminho, 'rb') as f:
+        pdf_bytes = f.read()
+    textos = []
+    for page in PdfReader(io.BytesIO(pdf_bytes)).pages:
+        writer = PdfWriter(); writer.add_page(page); buffer = io.BytesIO(); writer.write(buffer)
+        pagina_bytes = buffer.getvalue()
+        textos.append(PdfReader(io.BytesIO(pagina_bytes)).pages[0].extract_text())
+    return textos
+
+def caminho_mmap(caminho):
+    from app.documentos.leitor_pdf import abrir_pdf, textos_das_paginas
+    with abrir_pdf(caminho) as leitor:
+        return [texto for _, texto in textos_das_paginas(leitor)]
+
+def medir(funcao, caminho):
+    """Tempo numa execução limpa; o pico de memória numa segunda, com tracemalloc (que deixa tudo mais lento)."""
+    inicio = time.perf_counter()
+    resultado = funcao(caminho)
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao(caminho)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico, resultado
+
+def main():
+    args = parse_args()
+    # Importar o pacote `app` monta a aplicação inteira: fora da medição
+    import app.documentos.leitor_pdf  # noqa: F401
+    caminho = args.pdf
+    if not caminho:
+        caminho = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False).name
+        gerar_pdf(caminho, args.paginas)
+    tamanho = os.path.getsize(caminho)
+    try:
+        t_antigo, m_antigo, r_antigo = medir(caminho_antigo, caminho)
+        t_novo, m_novo, r_novo = medir(caminho_mmap, caminho)
+    finally:
+        if not args.pdf: os.unlink(caminho)
+
+    divergencias = sum(a != b for a, b in zip(r_antigo, r_novo)) + abs(len(r_antigo) - len(r_novo))
+    relatorio = {
+        'paginas': len(r_novo), 'tamanho_mb': round(tamanho / 2**20, 1),
+        'antigo': {'segundos': round(t_antigo, 3), 'pico_mb': round(m_antigo / 2**20, 1)},
+        'mmap': {'segundos': round(t_novo, 3), 'pico_mb': round(m_novo / 2**20, 1)},
+        'ganho': round(t_antigo / t_novo, 1) if t_novo else None,
+        'divergencias': divergencias,
+    }
+    print(f"\n{relatorio['paginas']} páginas, {relatorio['tamanho_mb']} MB")
+    print(f"  Reserializando páginas : {t_antigo:8.3f}s  pico {relatorio['antigo']['pico_mb']:7.1f} MB")
+    print(f"  Leitor original (mmap) : {t_novo:8.3f}s  pico {relatorio['mmap']['pico_mb']:7.1f} MB")
+    print(f"  Ganho                  : {relatorio['ganho']}x")
+    print(f"  Textos divergentes     : {divergencias}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    sys.exit(1 if divergencias else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Verificação de planos de consulta dos caminhos quentes.
+
+Executa as rotas mais acessadas (ponto, espelho, documentos, notificações, analytics)
+com uma empresa sintética, captura todo SELECT que elas disparam e roda EXPLAIN em
+cada um com os mesmos parâmetros. Falha (código 1) se alguma consulta com WHERE cair
+em varredura sequencial de uma tabela quente, ou seja, se um índice deixou de servir.
+
+No PostgreSQL o EXPLAIN roda com `enable_seqscan = off`: se ainda assim aparecer
+"Seq Scan", não existe índice utilizável para o filtro. No SQLite usa EXPLAIN QUERY PLAN
+("SCAN tabela" sem índice).
+
+Uso:
+    python benchmarks/plano_consultas.py
+    DATABASE_URL=postgresql://localhost/shahin_bench python benchmarks/plano_consultas.py
+"""
+import os
+import re
+import sys
+import time
+from datetime import timedelta, time as hora
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from carga_ponto import preparar_app, limpar
+
+TABELAS_QUENTES = {
+    'ponto_registros', 'ponto_resumos', 'notificacoes', 'solicitacoes_ausencia', 'holerites',
+    'recibos', 'atestados', 'ponto_ajustes', 'assinaturas_digitais', 'users', 'periodos_aquisitivos',
+}
+
+# (perfil, método, url)
+ROTAS = [
+    ('vigilante', 'GET', '/'),
+    ('vigilante', 'GET', '/api/notificacoes'),
+    ('vigilante', 'GET', '/ponto/registrar'),
+    ('vigilante', 'GET', '/ponto/api/check-status'),
+    ('vigilante', 'GET', '/ponto/espelho?mes_ref={mes}'),
+    ('vigilante', 'GET', '/ponto/escala'),
+    ('vigilante', 'GET', '/ponto/solicitar-ferias'),
+    ('vigilante', 'GET', '/ponto/solicitar-ajuste'),
+    ('vigilante', 'GET', '/documentos/meus-documentos'),
+    ('vigilante', 'GET', '/documentos/atestados/meus'),
+    ('master', 'GET', '/documentos/admin?mes={mes}'),
+    ('master', 'GET', '/api/analytics'),
+    ('master', 'GET', '/ponto/admin/controle-escala'),
+    ('master', 'GET', '/ponto/api/roster'),
+    ('master', 'GET', '/ponto/admin/ausencias'),
+    ('terminal', 'POST', '/ponto/api/registrar-leitura'),
+]
+
+def semear(app, rotulo):
+    """Empresa com master, terminal e alguns vigilantes com um mês de histórico em cada tabela quente."""
+    from app.extensions import db
+    from app.models import (Empresa, User, PontoRegistro, PontoResumo, Notificacao, Holerite, Recibo,
+                            SolicitacaoAusencia, Atestado, PontoAjuste)
+    from app.utils import get_brasil_time
+
+    agora = get_brasil_time()
+    hoje = agora.date()
+    with app.app_context():
+        empresa = Empresa(nome=f'Plano {rotulo}', slug=f'plano-{rotulo}', plano='Benchmark')
+        db.session.add(empresa)
+        db.session.flush()
+
+        def usuario(sufixo, role, **extra):
+            u = User(username=f'plano-{rotulo}-{sufixo}', real_name=f'Plano {sufixo}', role=role, password_hash='!',
+                     empresa_id=empresa.id, is_first_access=False, permissions='DOCUMENTOS,PONTO,USUARIOS,AUDITORIA', **extra)
+            db.session.add(u)
+            return u
+
+        master = usuario('master', 'Master')
+        terminal = usuario('terminal', 'Terminal')
+        vigilantes = [usuario(f'{i:03d}', 'Funcionario', escala='5x2', data_admissao=hoje - timedelta(days=500))
+                      for i in range(20)]
+        db.session.flush()
+
+        for u in vigilantes:
+            for d in range(1, 31):
+                dia = hoje - timedelta(days=d)
+                db.session.add(PontoRegistro(user_id=u.id, empresa_id=empresa.id, data_registro=dia, hora_registro=hora(8), tipo='Entrada'))
+                db.session.add(PontoRegistro(user_id=u.id, empresa_id=empresa.id, data_registro=dia, hora_registro=hora(17), tipo='Saída'))
+                db.session.add(PontoResumo(user_id=u.id, empresa_id=empresa.id, data_referencia=dia, minutos_trabalhados=540,
+                                           minutos_esperados=528, minutos_saldo=12, status_dia='OK'))
+            for n in range(5):
+                db.session.add(Notificacao(user_id=u.id, empresa_id=empresa.id, mensagem=f'Aviso {n}', lida=n % 2 == 0))
+            db.session.add(Holerite(user_id=u.id, empresa_id=empresa.id, mes_referencia=hoje.strftime('%Y-%m'), status='Enviado'))
+            db.session.add(Recibo(user_id=u.id, empresa_id=empresa.id, valor=100.0, data_pagamento=hoje))
+            db.session.add(SolicitacaoAusencia(user_id=u.id, empresa_id=empresa.id, tipo_ausencia='Férias', data_inicio=hoje + timedelta(days=40),
+                                               data_fim=hoje + timedelta(days=49), quantidade_dias=10, status='Aprovado'))
+            db.session.add(Atestado(user_id=u.id, empresa_id=empresa.id, data_envio=agora, url_arquivo='x', status='Aprovado',
+                                    data_inicio_afastamento=hoje - timedelta(days=60), quantidade_dias=2))
+            db.session.add(PontoAjuste(user_id=u.id, empresa_id=empresa.id, data_referencia=hoje, status='Pendente'))
+        db.session.commit()
+        return empresa.id, {'master': master.id, 'terminal': terminal.id, 'vigilante': vigilantes[0].id}
+
+def capturar(app, ids):
+    """Executa as rotas e devolve {rota: [(sql, parametros), ...]} só com os SELECTs."""
+    from sqlalchemy import event
+    from itsdangerous import URLSafeTimedSerializer
+    from app.extensions import db
+    from app.utils import get_brasil_time
+
+    capturadas, atual = {}, [None]
+    def ouvir(conn, cursor, statement, parameters, context, executemany):
+        if atual[0] and statement.lstrip().upper().startswith('SELECT'):
+            capturadas[atual[0]].append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', ouvir)
+
+    sessoes = app.session_interface.get_signing_serializer(app)
+    nome_cookie = app.config.get('SESSION_COOKIE_NAME', 'session')
+    mes = get_brasil_time().strftime('%Y-%m')
+    cliente = app.test_client(use_cookies=False)
+    try:
+        for perfil, metodo, url in ROTAS:
+            url = url.format(mes=mes)
+            cookie = f"{nome_cookie}={sessoes.dumps({'_user_id': str(ids[perfil]), '_fresh': True})}"
+            atual[0] = f'{metodo} {url}'
+            capturadas[atual[0]] = []
+            if metodo == 'POST':
+                token = URLSafeTimedSerializer(app.secret_key).dumps({'user_id': ids['vigilante'], 'timestamp': time.time()})
+                r = cliente.post(url, json={'token': token}, headers={'Cookie': cookie})
+            else:
+                r = cliente.get(url, headers={'Cookie': cookie})
+            if r.status_code >= 400: print(f"⚠️  {atual[0]} respondeu {r.status_code}")
+            atual[0] = None
+    finally:
+        event.remove(engine, 'before_cursor_execute', ouvir)
+    return capturadas, engine
+
+def varreduras(engine, statement, parameters):
+    """Tabelas quentes lidas por varredura sequencial no plano desta consulta."""
+    encontradas = set()
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.exec_driver_sql('SET enable_seqscan = off')
+            linhas = [l[0] for l in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+            for linha in linhas:
+                m = re.search(r'Seq Scan on (\w+)', linha)
+                if m: encontradas.add(m.group(1))
+            conn.rollback()
+        else:
+            for linha in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                detalhe = linha[-1]
+                m = re.match(r'SCAN (\w+)(?: AS \w+)?$', detalhe)
+                if m: encontradas.add(m.group(1))
+    return encontradas & TABELAS_QUENTES
+
+def main():
+    app = preparar_app()
+    rotulo = time.strftime('%Y%m%d%H%M%S')
+    empresa_id, ids = semear(app, rotulo)
+    try:
+        capturadas, engine = capturar(app, ids)
+        falhas = []
+        for rota, consultas in capturadas.items():
+            problemas = []
+            for statement, parameters in consultas:
+                if ' WHERE ' not in statement.upper(): continue  # Listagens completas varrem por natureza
+                tabelas = varreduras(engine, statement, parameters)
+                if tabelas: problemas.append((tabelas, statement))
+            print(f"{'❌' if problemas else '✅'} {rota:<45} {len(consultas):>3} SELECTs")
+            for tabelas, statement in problemas:
+                print(f"     varredura em {', '.join(sorted(tabelas))}: {' '.join(statement.split())[:160]}")
+            falhas += problemas
+    finally:
+        limpar(app, empresa_id)
+
+    print(f"\n{len(falhas)} consulta(s) sem índice utilizável ({engine.dialect.name}).")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import pytest
+
+# O app é criado na importação de `app`: o banco de teste precisa estar no ambiente antes
+_BANCO = os.path.join(tempfile.mkdtemp(), 'teste.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_BANCO}'
+
+from app import app as _app
+from app.extensions import db as _db
+from app.models import Empresa, User
+
+@pytest.fixture
+def app():
+    _app.config['TESTING'] = True
+    with _app.app_context():
+        _db.create_all()
+        yield _app
+        _db.session.remove()
+        _db.drop_all()
+
+@pytest.fixture
+def empresa(app):
+    empresa = Empresa(nome='Empresa Teste', slug='teste')
+    _db.session.add(empresa)
+    _db.session.commit()
+    return empresa
+
+@pytest.fixture
+def criar_usuario(empresa):
+    def _criar(username, nome, escala='Livre', role='Funcionario', **campos):
+        u = User(username=username, real_name=nome, role=role, escala=escala, empresa_id=empresa.id,
+                 password_hash='x', is_first_access=False, **campos)
+        _db.session.add(u)
+        _db.session.commit()
+        return u
+    return _criar
@@ -0,0 +1,23 @@
+from datetime import date
+from app.ponto.apuracao import apurar_empresa
+
+SEXTA, DOMINGO = date(2026, 3, 6), date(2026, 3, 8)
+
+def test_folha_sem_administradores_e_sem_falta_para_livre(empresa, criar_usuario):
+    livre = criar_usuario('111', 'Ana (Livre)', escala='Livre')
+    fixo = criar_usuario('222', 'Bruno (5x2)', escala='5x2')
+    criar_usuario('333', 'Administrador', escala='5x2', role='Master')
+
+    apuracao = apurar_empresa(empresa.id, SEXTA, DOMINGO, hoje=DOMINGO)
+
+    assert [u.id for u in apuracao.usuarios] == [livre.id, fixo.id]
+    assert apuracao.totais()['faltas'].tolist() == [0, 1]
+    assert apuracao.meta[apuracao.indice(livre.id)].tolist() == [0, 0, 0]
+
+def test_espelhos_incluem_administradores(empresa, criar_usuario):
+    admin = criar_usuario('333', 'Administrador', escala='5x2', role='Master')
+
+    apuracao = apurar_empresa(empresa.id, SEXTA, DOMINGO, hoje=DOMINGO, somente_ponto=False)
+
+    assert [u.id for u in apuracao.usuarios] == [admin.id]
+    assert apuracao.totais()['faltas'].tolist() == [0]
@@ -0,0 +1,56 @@
+import hashlib
+from types import SimpleNamespace
+import pytest
+from app.documentos import storage
+from app.documentos.entrega import responder_documento
+
+CONTEUDO = b'%PDF-1.4 ' + bytes(range(256)) * 8
+HASH = hashlib.sha256(CONTEUDO).hexdigest()
+
+@pytest.fixture
+def doc(app, tmp_path, monkeypatch):
+    local = storage.ArmazenamentoLocal(str(tmp_path))
+    local.salvar(CONTEUDO, f'holerites/{HASH}.pdf', 'application/pdf')
+    monkeypatch.setattr(storage, '_backend', local)
+    return SimpleNamespace(url_arquivo=f'holerites/{HASH}.pdf', hash_arquivo=HASH, tamanho_arquivo=len(CONTEUDO))
+
+def _responder(app, doc, **cabecalhos):
+    with app.test_request_context(headers=cabecalhos):
+        return responder_documento(doc, 'application/pdf', 'holerite.pdf', redirecionar=False)
+
+def _corpo(resposta):
+    # Resposta em streaming (direct_passthrough): lê os pedaços como o servidor faria
+    return b''.join(resposta.response)
+
+def test_download_inteiro_com_etag(app, doc):
+    resposta = _responder(app, doc)
+
+    assert resposta.status_code == 200
+    assert _corpo(resposta) == CONTEUDO
+    assert resposta.headers['ETag'] == f'"{HASH}"'
+    assert resposta.headers['Accept-Ranges'] == 'bytes'
+
+def test_if_none_match_responde_304_sem_corpo(app, doc):
+    resposta = _responder(app, doc, **{'If-None-Match': f'"{HASH}"'})
+
+    assert resposta.status_code == 304
+    assert resposta.get_data() == b''
+
+def test_range_devolve_so_o_intervalo(app, doc):
+    resposta = _responder(app, doc, Range='bytes=10-19')
+
+    assert resposta.status_code == 206
+    assert _corpo(resposta) == CONTEUDO[10:20]
+    assert resposta.headers['Content-Range'] == f'bytes 10-19/{len(CONTEUDO)}'
+
+def test_if_range_com_outro_etag_ignora_o_range(app, doc):
+    resposta = _responder(app, doc, Range='bytes=10-19', **{'If-Range': '"outro"'})
+
+    assert resposta.status_code == 200
+    assert _corpo(resposta) == CONTEUDO
+
+def test_range_fora_do_arquivo_responde_416(app, doc):
+    resposta = _responder(app, doc, Range=f'bytes={len(CONTEUDO) + 10}-')
+
+    assert resposta.status_code == 416
+    assert resposta.headers['Content-Range'] == f'bytes */{len(CONTEUDO)}'
@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+from app.ponto.escala import meta_do_dia, motivo_folga
+
+SEGUNDA = date(2026, 3, 9)
+SEMANA = [SEGUNDA + timedelta(days=i) for i in range(7)]
+
+def test_livre_tem_meta_so_de_segunda_a_sexta(empresa, criar_usuario):
+    u = criar_usuario('111', 'Colaborador Livre', escala='Livre', carga_horaria=480)
+
+    assert [meta_do_dia(u, d) for d in SEMANA] == [480] * 5 + [0, 0]
+    assert all(motivo_folga(u, d) is None for d in SEMANA)
+
+def test_12x36_alterna_a_partir_da_data_de_referencia(empresa, criar_usuario):
+    u = criar_usuario('111', 'Plantonista', escala='12x36', carga_horaria=480, data_inicio_escala=SEGUNDA)
+
+    assert [meta_do_dia(u, d) for d in SEMANA] == [720, 0, 720, 0, 720, 0, 720]
+
+def test_12x36_sem_data_de_referencia_vale_a_carga_todo_dia(empresa, criar_usuario):
+    u = criar_usuario('111', 'Plantonista', escala='12x36', carga_horaria=480)
+
+    assert [meta_do_dia(u, d) for d in SEMANA] == [480] * 7
+    assert all(motivo_folga(u, d) is None for d in SEMANA)
@@ -0,0 +1,27 @@
+from datetime import date
+from app.extensions import db
+from app.models import PontoResumo
+from app.ponto.fechamento import fechar_dias_empresa
+
+SABADO, DOMINGO, SEGUNDA = date(2026, 3, 7), date(2026, 3, 8), date(2026, 3, 9)
+
+def _status(user):
+    return {r.data_referencia: r.status_dia for r in PontoResumo.query.filter_by(user_id=user.id)}
+
+def test_fim_de_semana_nao_gera_falta_para_livre_nem_admin(empresa, criar_usuario):
+    livre = criar_usuario('111', 'Colaborador Livre', escala='Livre')
+    admin = criar_usuario('222', 'Administrador', escala='5x2', role='Master')
+
+    fechar_dias_empresa(empresa, DOMINGO, data_inicio=SABADO)
+    db.session.commit()
+
+    assert PontoResumo.query.filter_by(status_dia='Falta').count() == 0
+    assert _status(livre) == {} and _status(admin) == {}
+
+def test_escala_fixa_ganha_folga_no_fim_de_semana_e_falta_no_dia_util(empresa, criar_usuario):
+    fixo = criar_usuario('333', 'Colaborador 5x2', escala='5x2')
+
+    fechar_dias_empresa(empresa, SEGUNDA, data_inicio=SABADO)
+    db.session.commit()
+
+    assert _status(fixo) == {SABADO: 'Folga', DOMINGO: 'Folga', SEGUNDA: 'Falta'}
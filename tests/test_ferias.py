@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+from app.extensions import db
+from app.models import PontoResumo, PeriodoAquisitivo
+from app.ponto.ferias import garantir_periodos, atualizar_faltas, saldo_ferias
+
+HOJE = date(2026, 3, 9)
+
+def _faltas(user, inicio, dias, meta=528):
+    for i in range(dias):
+        db.session.add(PontoResumo(user_id=user.id, empresa_id=user.empresa_id, data_referencia=inicio + timedelta(days=i),
+                                   minutos_trabalhados=0, minutos_esperados=meta, minutos_saldo=-meta, status_dia='Falta'))
+    db.session.commit()
+
+def test_saldo_ferias_nao_grava_no_banco(empresa, criar_usuario):
+    u = criar_usuario('111', 'Colaborador 5x2', escala='5x2', data_admissao=date(2024, 1, 2))
+
+    saldo_ferias(u, HOJE)
+
+    assert not db.session.new and not db.session.dirty
+    assert PeriodoAquisitivo.query.count() == 0
+
+def test_faltas_sem_escala_fixa_nao_reduzem_o_direito(empresa, criar_usuario):
+    fixo = criar_usuario('111', 'Colaborador 5x2', escala='5x2', data_admissao=date(2024, 1, 2))
+    livre = criar_usuario('222', 'Colaborador Livre', escala='Livre', data_admissao=date(2024, 1, 2))
+    admin = criar_usuario('333', 'Administrador', escala='5x2', role='Master', data_admissao=date(2024, 1, 2))
+    for u in (fixo, livre, admin): _faltas(u, date(2024, 3, 4), 40)
+    _faltas(fixo, date(2025, 3, 3), 40, meta=0)
+
+    garantir_periodos([fixo, livre, admin], HOJE)
+    atualizar_faltas([fixo.id, livre.id, admin.id], date(2024, 1, 2), HOJE)
+    db.session.commit()
+
+    # Dois períodos adquiridos: as 40 faltas zeram só o primeiro do colaborador em escala fixa
+    # (as do segundo caíram em dia sem meta)
+    assert saldo_ferias(fixo, HOJE).dias_direito == 30
+    assert saldo_ferias(livre, HOJE).dias_direito == 60
+    assert saldo_ferias(admin, HOJE).dias_direito == 60
@@ -0,0 +1,25 @@
+from app.documentos.matcher import IndiceNomes
+from app.utils import limpar_nome
+
+def _indice(*nomes):
+    return IndiceNomes({limpar_nome(nome): user_id for user_id, nome in enumerate(nomes, start=1)})
+
+def test_vale_o_nome_mais_longo_presente_no_texto():
+    indice = _indice('Maria Silva', 'Maria Silva Santos', 'Silva Santos')
+    texto = limpar_nome('Holerite de MARIA DA SILVA SANTOS - competência 03/2026')
+
+    assert indice.buscar(texto) == 'MARIA SILVA SANTOS'
+    assert indice.user_id(indice.buscar(texto)) == 2
+    assert indice.buscar(limpar_nome('Recibo: Maria Silva')) == 'MARIA SILVA'
+
+def test_nome_curto_nao_casa_dentro_de_outra_palavra():
+    indice = _indice('Ana')
+
+    assert indice.buscar(limpar_nome('Funcionária: JULIANA PEREIRA')) == ''
+    assert indice.buscar(limpar_nome('Funcionária: ANA PEREIRA')) == 'ANA'
+
+def test_link_de_falha_acha_nome_que_comeca_no_meio_de_outro():
+    indice = _indice('Joao Pedro Alves', 'Pedro Costa')
+
+    # "JOAO PEDRO" começa o nome mais longo, mas o texto segue com "COSTA"
+    assert indice.buscar(limpar_nome('JOAO PEDRO COSTA')) == 'PEDRO COSTA'
@@ -0,0 +1,63 @@
+from datetime import date, time
+from app.extensions import db
+from app.models import PontoRegistro, PontoResumo
+from app.ponto.resumo import aplicar_batida, recalcular_intervalo, marcar_ausencia, reverter_ausencia
+
+SEGUNDA, TERCA = date(2026, 3, 9), date(2026, 3, 10)
+
+def _resumo(user, dia):
+    return db.session.query(PontoResumo.status_dia, PontoResumo.minutos_esperados, PontoResumo.minutos_trabalhados).filter_by(
+        user_id=user.id, data_referencia=dia).one()
+
+def _bater(user, dia, *horas):
+    for h in horas:
+        db.session.add(PontoRegistro(user_id=user.id, empresa_id=user.empresa_id, data_registro=dia, hora_registro=h))
+    db.session.commit()
+
+def test_batida_atualiza_o_mesmo_resumo_do_dia(empresa, criar_usuario):
+    u = criar_usuario('111', 'Colaborador 5x2', escala='5x2', carga_horaria=480)
+
+    aplicar_batida(u, SEGUNDA, [time(8, 0)])
+    assert _resumo(u, SEGUNDA) == ('Incompleto', 480, 0)
+
+    aplicar_batida(u, SEGUNDA, [time(17, 0), time(8, 0)])
+    db.session.commit()
+    assert _resumo(u, SEGUNDA) == ('Hora Extra', 480, 540)
+    assert PontoResumo.query.count() == 1
+
+def test_recalculo_nao_sobrescreve_abono(empresa, criar_usuario):
+    u = criar_usuario('111', 'Colaborador 5x2', escala='5x2', carga_horaria=480)
+    _bater(u, SEGUNDA, time(8, 0), time(12, 0))
+    marcar_ausencia([u.id], SEGUNDA, SEGUNDA, 'Atestado')
+
+    recalcular_intervalo([u.id], SEGUNDA, SEGUNDA)
+    db.session.commit()
+
+    assert _resumo(u, SEGUNDA) == ('Atestado', 0, 240)
+
+def test_recalculo_sem_batida_so_gera_falta_com_escala_fixa(empresa, criar_usuario):
+    fixo = criar_usuario('111', 'Colaborador 5x2', escala='5x2', carga_horaria=480)
+    livre = criar_usuario('222', 'Colaborador Livre', escala='Livre')
+    admin = criar_usuario('333', 'Administrador', escala='5x2', role='Master')
+
+    recalcular_intervalo([fixo.id, livre.id, admin.id], SEGUNDA, TERCA)
+    db.session.commit()
+
+    assert _resumo(fixo, SEGUNDA) == ('Falta', 480, 0)
+    assert _resumo(livre, SEGUNDA) == ('Folga', 0, 0)
+    assert _resumo(admin, TERCA) == ('Folga', 0, 0)
+    assert PontoResumo.query.filter_by(status_dia='Falta').count() == 2
+
+def test_reverter_ausencia_sem_escala_fixa_nao_gera_falta(empresa, criar_usuario):
+    livre = criar_usuario('111', 'Colaborador Livre', escala='Livre')
+    admin = criar_usuario('222', 'Administrador', escala='5x2', role='Master')
+    ids = [livre.id, admin.id]
+
+    marcar_ausencia(ids, SEGUNDA, TERCA, 'Férias')
+    db.session.commit()
+    reverter_ausencia(ids, SEGUNDA, TERCA, 'Férias')
+    db.session.commit()
+
+    assert PontoResumo.query.filter_by(status_dia='Falta').count() == 0
+    assert _resumo(livre, SEGUNDA) == ('Folga', 0, 0)
+    assert _resumo(admin, TERCA) == ('Folga', 0, 0)
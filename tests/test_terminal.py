@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+from app.extensions import db
+from app.models import PontoRegistro
+from app.ponto import tokens
+from app.ponto.terminal import processar_leituras, FUSO_BR
+
+SEGREDO = 'segredo-de-teste'
+
+@pytest.fixture(autouse=True)
+def indice_limpo(monkeypatch):
+    # O índice de QR-Codes consumidos é do processo: cada teste começa com um vazio
+    monkeypatch.setattr(tokens, '_indice', tokens.IndiceLocal())
+
+def _agora():
+    return datetime.now(FUSO_BR).replace(tzinfo=None, microsecond=0)
+
+def _leitura(user_id, chave, capturado_em=None):
+    leitura = {'chave': chave, 'token': URLSafeTimedSerializer(SEGREDO).dumps({'user_id': user_id})}
+    if capturado_em: leitura['capturado_em'] = capturado_em.isoformat()
+    return leitura
+
+def test_lote_grava_as_batidas_e_reenvio_nao_duplica(empresa, criar_usuario):
+    ana = criar_usuario('111', 'Ana')
+    bruno = criar_usuario('222', 'Bruno')
+    agora = _agora()
+    lote = [_leitura(ana.id, 'a-1'), _leitura(bruno.id, 'b-1'), _leitura(ana.id, 'a-1')]
+
+    resultados = processar_leituras(lote, SEGREDO, agora)
+
+    assert [r['success'] for r in resultados] == [True, True, True]
+    assert [r.get('tipo') for r in resultados] == ['Entrada', 'Entrada', 'Entrada']
+    assert resultados[2]['duplicado']
+    assert PontoRegistro.query.count() == 2
+
+    # Fila offline reenviada inteira: nada novo é gravado
+    resultados = processar_leituras(lote, SEGREDO, agora + timedelta(minutes=5))
+
+    assert all(r['success'] and r['duplicado'] for r in resultados)
+    assert PontoRegistro.query.count() == 2
+
+def test_leitura_recusada_apos_consumir_devolve_o_qr(empresa, criar_usuario):
+    ana = criar_usuario('111', 'Ana')
+    agora = _agora()
+    batida = agora - timedelta(seconds=30)
+    db.session.add(PontoRegistro(user_id=ana.id, empresa_id=empresa.id, data_registro=batida.date(), hora_registro=batida.time()))
+    db.session.commit()
+
+    recusada = _leitura(ana.id, 'a-2', agora)
+    inexistente = _leitura(99999, 'x-1', agora)
+    resultados = processar_leituras([recusada, inexistente], SEGREDO, agora)
+
+    assert resultados[0]['error'] == 'Aguarde antes de bater o ponto novamente.'
+    assert resultados[1]['error'] == 'Usuário inválido'
+    # Nada foi gravado para elas: o mesmo QR continua valendo para outra leitura
+    assert tokens.consumir_token(recusada['token'], agora.timestamp(), 60)
+    assert tokens.consumir_token(inexistente['token'], agora.timestamp(), 60)
+    assert PontoRegistro.query.count() == 1